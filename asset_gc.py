@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Asset Garbage Collector
+Finds the images, fonts and documents no deployable page, stylesheet, script,
+web app manifest or configuration value leads to, and moves them (and backups
+beyond the newest few) into a quarantine folder. Quarantined files are deleted
+once their grace period has passed and can be restored until then; a file that
+is referenced again is restored automatically. Also reports where the
+template's disk space goes.
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import fnmatch
+import posixpath
+from typing import Dict, List, Optional, Set, Tuple
+
+from file_index import CACHE_DIR_NAME, get_file_index, file_type
+from image_optimize import SIDECAR_DIR_NAME, webp_sibling
+from link_check import MANIFEST_NAMES, css_references, html_references, manifest_references, resolve_local
+from site_export import DEPLOY_PROFILES, DEFAULT_PROFILE, deployable_files
+from site_graph import flatten_config
+
+TRASH_DIR_NAME = ".editor_trash"
+TRASH_MANIFEST = "quarantine.json"
+BACKUP_DIR_NAME = "backups"
+GRACE_DAYS = 14
+KEEP_BACKUPS = 10
+# Only these file types are ever collected; pages, code and data stay put
+COLLECTED_TYPES = ("image", "font", "document")
+# Quoted paths in scripts and JSON, e.g. img.src = 'images/photo.jpg'
+QUOTED_ASSET = re.compile(r'''["'`]([^"'`\s<>]+\.(?:png|jpe?g|gif|svg|webp|avif|ico|woff2?|ttf|otf|pdf))["'`]''',
+                          re.IGNORECASE)
+
+
+def _read(index, rel_path: str) -> str:
+    try:
+        with open(index.abspath(rel_path), 'r', encoding='utf-8', errors='replace') as f:
+            return f.read()
+    except OSError:
+        return ""
+
+
+def _references(index, rel_path: str) -> Set[str]:
+    """Template files rel_path points at"""
+    text = _read(index, rel_path)
+    kind = file_type(rel_path)
+    found = set()
+    if kind in ("js", "json") and posixpath.basename(rel_path).lower() not in MANIFEST_NAMES:
+        # Scripts resolve paths against the page; try the template root and the script's folder
+        for reference in QUOTED_ASSET.findall(text):
+            for source in ("index.html", rel_path):
+                resolved = resolve_local(source, reference)
+                if resolved:
+                    found.add(resolved[0])
+        return found
+    try:
+        if kind == "html":
+            references = html_references(text)
+        elif kind == "css":
+            references = css_references(text)
+        elif posixpath.basename(rel_path).lower() in MANIFEST_NAMES:
+            references = manifest_references(text)
+        else:
+            return found
+    except ValueError:
+        return found
+    for _, reference in references:
+        resolved = resolve_local(rel_path, reference)
+        if resolved:
+            found.add(resolved[0])
+    return found
+
+
+def _config_roots(config: Optional[Dict]) -> Set[str]:
+    """Template paths named by configuration values (logo, tile and section images, ...)"""
+    roots = set()
+    for value in flatten_config(config or {}).values():
+        if isinstance(value, str) and value and not value.startswith('#'):
+            resolved = resolve_local("index.html", value)
+            if resolved:
+                roots.add(resolved[0])
+    return roots
+
+
+def reachable_files(template_path: str, config: Optional[Dict] = None,
+                    profile: str = DEFAULT_PROFILE) -> Tuple[Set[str], Set[str]]:
+    """(reachable, referenced): the indexed files reachable from the deployable pages,
+    manifests, the deploy profile's always-kept files and the configuration, and every
+    path those refer to, whether it exists or not"""
+    from icon_set import raster_fallback
+
+    index = get_file_index(template_path)
+    deployable = deployable_files(index, profile)
+    keep = DEPLOY_PROFILES[profile]["keep"]
+    referenced = _config_roots(config)
+    pending = [p for p in deployable if file_type(p) == "html" or posixpath.basename(p).lower() in MANIFEST_NAMES
+               or any(fnmatch.fnmatchcase(posixpath.basename(p), pattern) for pattern in keep)]
+    pending += sorted(referenced)
+    seen: Set[str] = set()
+    while pending:
+        rel_path = pending.pop()
+        if rel_path in seen or rel_path not in index.files:
+            continue
+        seen.add(rel_path)
+        targets = _references(index, rel_path)
+        referenced |= targets
+        pending.extend(targets - seen)
+        # Derived files travel with the file they were made from
+        if webp_sibling(rel_path) in index.files:
+            pending.append(webp_sibling(rel_path))
+        if rel_path.lower().endswith('.svg'):
+            fallback = raster_fallback(template_path, rel_path)
+            if fallback:
+                pending.append(fallback)
+    return seen, referenced
+
+
+def find_unused(template_path: str, config: Optional[Dict] = None, profile: str = DEFAULT_PROFILE,
+                keep: Optional[List[str]] = None, reachable: Optional[Set[str]] = None) -> List[str]:
+    """Images, fonts and documents nothing reachable refers to (minus the keep globs)"""
+    index = get_file_index(template_path)
+    if reachable is None:
+        reachable = reachable_files(template_path, config, profile)[0]
+    return [p for p in index.paths() if index.files[p]["type"] in COLLECTED_TYPES and p not in reachable
+            and not any(fnmatch.fnmatchcase(p, pattern) for pattern in keep or [])]
+
+
+def stale_backups(template_path: str, keep_backups: int = KEEP_BACKUPS) -> List[str]:
+    """Backups beyond the newest keep_backups (their names sort by timestamp)"""
+    backup_dir = os.path.join(template_path, BACKUP_DIR_NAME)
+    try:
+        names = sorted(name for name in os.listdir(backup_dir) if os.path.isfile(os.path.join(backup_dir, name)))
+    except OSError:
+        return []
+    return [f"{BACKUP_DIR_NAME}/{name}" for name in names[:max(0, len(names) - keep_backups)]]
+
+
+# Quarantine
+
+class Quarantine:
+    """Files moved out of the template, with when they were moved"""
+
+    def __init__(self, template_path: str):
+        self.template_path = os.path.abspath(template_path)
+        self.root = os.path.join(self.template_path, TRASH_DIR_NAME)
+        self.manifest_path = os.path.join(self.root, TRASH_MANIFEST)
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.entries: Dict[str, Dict] = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def _stored(self, rel_path: str) -> str:
+        return os.path.join(self.root, "files", *rel_path.split('/'))
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.manifest_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+    def add(self, rel_path: str):
+        source = os.path.join(self.template_path, *rel_path.split('/'))
+        target = self._stored(rel_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        size = os.path.getsize(source)
+        shutil.move(source, target)
+        self.entries[rel_path] = {"quarantined": time.time(), "bytes": size}
+
+    def restore(self, rel_path: str) -> bool:
+        """Move a file back; never overwrites a file that reappeared in the template"""
+        target = os.path.join(self.template_path, *rel_path.split('/'))
+        if rel_path not in self.entries or os.path.exists(target):
+            return False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(self._stored(rel_path), target)
+        del self.entries[rel_path]
+        return True
+
+    def expired(self, grace_days: float) -> List[str]:
+        cutoff = time.time() - grace_days * 86400
+        return sorted(p for p, entry in self.entries.items() if entry["quarantined"] <= cutoff)
+
+    def purge(self, rel_path: str) -> int:
+        size = self.entries.pop(rel_path)["bytes"]
+        try:
+            os.remove(self._stored(rel_path))
+        except OSError:
+            pass
+        return size
+
+
+def collect_garbage(template_path: str, config: Optional[Dict] = None, grace_days: float = GRACE_DAYS,
+                    keep_backups: int = KEEP_BACKUPS, keep: Optional[List[str]] = None,
+                    profile: str = DEFAULT_PROFILE, dry_run: bool = False) -> Dict:
+    """Quarantine unused assets and stale backups, restore quarantined files that are
+    referenced again and delete those past their grace period. Returns a report."""
+    template_path = os.path.abspath(template_path)
+    index = get_file_index(template_path)
+    quarantine = Quarantine(template_path)
+    reachable, referenced = reachable_files(template_path, config, profile)
+    unused = find_unused(template_path, config, profile, keep, reachable)
+    backups = stale_backups(template_path, keep_backups)
+    report = {"quarantined": [], "backups": len(backups), "restored": [], "purged": [], "quarantined_bytes": 0, "freed_bytes": 0,
+              "dry_run": dry_run, "grace_days": grace_days}
+    # A reference to a quarantined file means it is wanted again
+    for rel_path in sorted(referenced & set(quarantine.entries)):
+        if dry_run or quarantine.restore(rel_path):
+            report["restored"].append(rel_path)
+
+    for rel_path in unused + backups:
+        report["quarantined"].append(rel_path)
+        report["quarantined_bytes"] += os.path.getsize(os.path.join(template_path, *rel_path.split('/')))
+        if not dry_run:
+            quarantine.add(rel_path)
+
+    for rel_path in quarantine.expired(grace_days):
+        # Files quarantined just now always get one more run before they go
+        if rel_path in report["restored"] or rel_path in report["quarantined"]:
+            continue
+        report["purged"].append(rel_path)
+        report["freed_bytes"] += quarantine.entries[rel_path]["bytes"] if dry_run else quarantine.purge(rel_path)
+
+    if not dry_run:
+        quarantine.save()
+        index.refresh()
+    report["in_quarantine"] = len(quarantine.entries)
+    return report
+
+
+def restore_quarantined(template_path: str, paths: Optional[List[str]] = None) -> List[str]:
+    """Put quarantined files (all, or the given ones) back into the template"""
+    quarantine = Quarantine(template_path)
+    restored = [p for p in sorted(paths or quarantine.entries) if quarantine.restore(p)]
+    quarantine.save()
+    get_file_index(template_path).refresh()
+    return restored
+
+
+# Disk usage
+
+def _tree_usage(path: str) -> Dict[str, int]:
+    files = size = 0
+    for folder, _, names in os.walk(path):
+        for name in names:
+            try:
+                size += os.path.getsize(os.path.join(folder, name))
+                files += 1
+            except OSError:
+                pass
+    return {"files": files, "bytes": size}
+
+
+def disk_usage(template_path: str, config: Optional[Dict] = None, profile: str = DEFAULT_PROFILE) -> Dict:
+    """Files and bytes per category: what is exported (by type), unused assets, files
+    that are never exported, and the editor's own folders"""
+    template_path = os.path.abspath(template_path)
+    index = get_file_index(template_path)
+    index.refresh()
+    deployable = set(deployable_files(index, profile))
+    unused = set(find_unused(template_path, config, profile))
+    usage: Dict[str, Dict[str, int]] = {}
+
+    def count(category: str, size: int, files: int = 1):
+        entry = usage.setdefault(category, {"files": 0, "bytes": 0})
+        entry["files"] += files
+        entry["bytes"] += size
+
+    for rel_path in index.paths():
+        size = index.files[rel_path]["size"]
+        if rel_path in unused:
+            count("unused assets", size)
+        elif rel_path in deployable:
+            count(f"exported {index.files[rel_path]['type']}", size)
+        else:
+            count("not exported (editor, sources)", size)
+    for category, name in (("backups", BACKUP_DIR_NAME), ("image originals", SIDECAR_DIR_NAME),
+                           ("quarantine", TRASH_DIR_NAME)):
+        tree = _tree_usage(os.path.join(template_path, name))
+        if tree["files"]:
+            count(category, tree["bytes"], tree["files"])
+    cache_dir = os.path.join(template_path, CACHE_DIR_NAME)
+    if os.path.isdir(cache_dir):
+        for name in sorted(os.listdir(cache_dir)):
+            path = os.path.join(cache_dir, name)
+            tree = _tree_usage(path) if os.path.isdir(path) else {"files": 1, "bytes": os.path.getsize(path)}
+            count(f"build cache ({os.path.splitext(name)[0]})", tree["bytes"], tree["files"])
+    return dict(sorted(usage.items(), key=lambda item: -item[1]["bytes"]))
+
+
+def _size(size: int) -> str:
+    return f"{size / 1024 / 1024:.1f} MB" if size >= 1024 * 1024 else f"{size / 1024:.0f} KB"
+
+
+def describe_usage(usage: Dict) -> List[str]:
+    """One line per category, largest first"""
+    total = sum(entry["bytes"] for entry in usage.values())
+    lines = [f"{category}: {_size(entry['bytes'])} in {entry['files']} file{'s' if entry['files'] != 1 else ''}"
+             for category, entry in usage.items()]
+    return lines + [f"Total: {_size(total)}"]
+
+
+def describe_gc(report: Dict) -> List[str]:
+    """Human readable report lines"""
+    verb = "Would move" if report["dry_run"] else "Moved"
+    assets = len(report["quarantined"]) - report["backups"]
+    lines = [f"{verb} {assets} unused asset{'s' if assets != 1 else ''} and {report['backups']} old "
+             f"backup{'s' if report['backups'] != 1 else ''} ({_size(report['quarantined_bytes'])}) to "
+             f"{TRASH_DIR_NAME}/; they are deleted after {report['grace_days']:g} days"]
+    lines += [f"  {path}" for path in report["quarantined"]]
+    if report["restored"]:
+        lines.append(f"{'Would restore' if report['dry_run'] else 'Restored'} {len(report['restored'])} "
+                     f"files that are referenced again: {', '.join(report['restored'])}")
+    if report["purged"]:
+        lines.append(f"{'Would delete' if report['dry_run'] else 'Deleted'} {len(report['purged'])} files past "
+                     f"their grace period ({_size(report['freed_bytes'])})")
+    return lines
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Small-Asset Inlining
+Export stage that inlines small images as data URIs (in <img>, icon links,
+<style> blocks and stylesheets) and small render-blocking stylesheets as
+<style> blocks. An asset is only inlined when its bytes, paid again on every
+view of a page that is not itself cached, cost less than the extra request a
+separately cached file would need.
+"""
+
+import re
+import zlib
+import base64
+import hashlib
+import posixpath
+from urllib.parse import quote, urlsplit
+from typing import Dict, List, Optional, Tuple
+
+from css_minify import rewrite_urls
+from html_tags import HEAD_MARKUP, IMG_TAG, parse_attributes, set_attribute, is_stylesheet
+from site_graph import resolve_reference
+
+DEFAULT_OPTIONS = {
+    "enabled": True,
+    # Assets larger than this are never inlined (bytes)
+    "max_bytes": 4096,
+    # Page views a visitor makes while cached files are still fresh
+    "repeat_views": 3,
+    # Cost of one extra request (headers and round trip) expressed in bytes
+    "request_bytes": 1500,
+    "images": True,
+    "stylesheets": True,
+}
+MIME_TYPES = {
+    ".svg": "image/svg+xml", ".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg",
+    ".gif": "image/gif", ".webp": "image/webp", ".avif": "image/avif", ".ico": "image/x-icon",
+    ".woff2": "font/woff2", ".woff": "font/woff",
+}
+HASHED_NAME = re.compile(r'\.[0-9a-f]{10}\.\w+$')
+STYLE_ELEMENT = re.compile(r'(<style\b[^>]*>)(.*?)(</style\s*>)', re.IGNORECASE | re.DOTALL)
+# Characters left as they are in SVG data URIs; everything else is percent-encoded
+SVG_SAFE = "=:/;,.-_!*~@?&$+"
+# The XML declaration, doctype and comments mean nothing inside a data URI
+SVG_PROLOG = re.compile(r'<\?xml.*?\?>|<!DOCTYPE[^>]*>|<!--.*?-->', re.IGNORECASE | re.DOTALL)
+
+
+def data_uri(rel_path: str, data: bytes) -> str:
+    """data: URI of a file; SVG stays readable text, everything else is base64"""
+    mime = MIME_TYPES[posixpath.splitext(rel_path)[1].lower()]
+    if mime == "image/svg+xml":
+        text = SVG_PROLOG.sub('', data.decode('utf-8'))
+        text = re.sub(r'>\s+<', '><', text.strip())
+        return f"data:{mime},{quote(text, safe=SVG_SAFE)}"
+    return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+class InlinePlanner:
+    """Decides per asset and container whether inlining pays off, and remembers why"""
+
+    def __init__(self, context, options: Dict):
+        self.context = context
+        self.options = options
+        sw_options = context.config.get("build", {}).get("service_worker") or {}
+        # The service worker serves every precached file from cache on repeat views
+        self.service_worker = bool(sw_options.get("enabled"))
+        self.decisions: Dict[Tuple[str, str], Dict] = {}
+
+    def _cached(self, rel_path: str) -> bool:
+        """True if repeat views get the file without asking the server"""
+        return self.service_worker or bool(HASHED_NAME.search(rel_path))
+
+    def decide(self, asset: str, container: str, payload: Optional[str]) -> bool:
+        """Inline payload (the data URI or CSS text of asset) into container?
+        payload is None for assets already known to be over the threshold"""
+        key = (asset, container)
+        if key in self.decisions:
+            return self.decisions[key]["inlined"]
+        decision = {"asset": asset, "into": container, "bytes": self.context.size(asset),
+                    "inline_cost": None, "external_cost": None, "inlined": False}
+        self.decisions[key] = decision
+        if payload is None or decision["bytes"] > self.options["max_bytes"]:
+            decision["reason"] = "over threshold"
+            return False
+        repeat = self.options["repeat_views"]
+        compressed = len(zlib.compress(payload.encode('utf-8'), 9))
+        decision["inline_cost"] = compressed * (1 if self._cached(container) else repeat)
+        decision["external_cost"] = self.options["request_bytes"] * (1 if self._cached(asset) else repeat)
+        decision["inlined"] = decision["inline_cost"] <= decision["external_cost"]
+        decision["reason"] = "inlined" if decision["inlined"] else "cached separately"
+        return decision["inlined"]
+
+    def image_uri(self, source: str, reference: str, container: str) -> Optional[str]:
+        """data: URI replacing reference (made in source) inside container, or None to keep it"""
+        if not reference or urlsplit(reference).fragment:
+            return None
+        target = resolve_reference(source, reference)
+        if (target is None or posixpath.splitext(target)[1].lower() not in MIME_TYPES or
+                not self.context.exists(target)):
+            return None
+        if self.context.size(target) > self.options["max_bytes"]:
+            self.decide(target, container, None)
+            return None
+        try:
+            uri = data_uri(target, self.context.read(target))
+        except UnicodeDecodeError:
+            return None
+        return uri if self.decide(target, container, uri) else None
+
+
+def _inline_in_stylesheets(context, planner: InlinePlanner) -> Dict[str, str]:
+    """Inline small url() assets into every stylesheet; returns renamed sheets"""
+    renamed = {}
+    for sheet in context.files("css"):
+        text = context.read_text(sheet)
+        rewritten = rewrite_urls(text, lambda value: planner.image_uri(sheet, value, sheet) or value)
+        if rewritten == text:
+            continue
+        target = sheet
+        if HASHED_NAME.search(sheet):
+            # A fingerprinted name must follow its content
+            digest = hashlib.sha256(rewritten.encode('utf-8')).hexdigest()[:10]
+            target = HASHED_NAME.sub(f".{digest}{posixpath.splitext(sheet)[1]}", sheet)
+            context.remove(sheet)
+            if context.exists(sheet + ".map"):
+                context.remove(sheet + ".map")
+            renamed[sheet] = target
+        context.write(target, rewritten)
+    return renamed
+
+
+def _rebase(sheet: str, page: str):
+    """url() rewriter for CSS moving from sheet into page"""
+    def rewrite(value: str) -> str:
+        target = resolve_reference(sheet, value)
+        if target is None or value.startswith('/'):
+            return value
+        parts = urlsplit(value)
+        suffix = (f"?{parts.query}" if parts.query else "") + (f"#{parts.fragment}" if parts.fragment else "")
+        return posixpath.relpath(target, posixpath.dirname(page) or ".") + suffix
+    return rewrite
+
+
+def _inline_in_page(page: str, html: str, context, planner: InlinePlanner, options: Dict) -> str:
+    """Inline small images, favicons and render-blocking stylesheets into one page"""
+    edits: List[Tuple[int, int, str]] = []
+    if options["images"]:
+        comments = [m.span() for m in re.finditer(r'<!--.*?-->', html, re.DOTALL)]
+        for match in IMG_TAG.finditer(html):
+            if any(start <= match.start() < end for start, end in comments):
+                continue
+            attributes = parse_attributes(match.group(0))
+            if attributes.get("srcset"):
+                continue
+            uri = planner.image_uri(page, attributes.get("src") or "", page)
+            if uri:
+                edits.append((match.start(), match.end(), set_attribute(match.group(0), "src", uri)))
+
+    for match in HEAD_MARKUP.finditer(html):
+        token = match.group(0)
+        if not token.lower().startswith('<link'):
+            continue
+        attributes = parse_attributes(token)
+        rel = (attributes.get("rel") or "").lower().split()
+        href = attributes.get("href") or ""
+        if options["images"] and "icon" in rel:
+            # apple-touch-icon and mask-icon are fetched outside the page; only favicons qualify
+            uri = planner.image_uri(page, href, page)
+            if uri:
+                edits.append((match.start(), match.end(), set_attribute(token, "href", uri)))
+        elif options["stylesheets"] and is_stylesheet(attributes) and "onload" not in attributes:
+            sheet = resolve_reference(page, href)
+            if sheet is None or not sheet.endswith('.css') or not context.exists(sheet):
+                continue
+            css = context.read_text(sheet)
+            # @import resolves against the sheet's URL and "</style" would end the block early
+            if '@import' in css.lower() or '</style' in css.lower():
+                continue
+            css = rewrite_urls(css, _rebase(sheet, page))
+            if planner.decide(sheet, page, css):
+                media = attributes.get("media")
+                opening = f'<style media="{media}">' if media and media != "all" else '<style>'
+                edits.append((match.start(), match.end(), f'{opening}{css.strip()}</style>'))
+
+    if options["images"]:
+        for match in STYLE_ELEMENT.finditer(html):
+            css = rewrite_urls(match.group(2), lambda value: planner.image_uri(page, value, page) or value)
+            if css != match.group(2):
+                edits.append((match.start(2), match.end(2), css))
+
+    for start, end, replacement in sorted(edits, reverse=True):
+        html = html[:start] + replacement + html[end:]
+    return html
+
+
+def run(context, options: Dict) -> Dict:
+    """Export stage: inline small images and stylesheets where caching does not win"""
+    options = dict(DEFAULT_OPTIONS, **options)
+    planner = InlinePlanner(context, options)
+    renamed = _inline_in_stylesheets(context, planner) if options["images"] else {}
+
+    for page in context.files("html"):
+        html = context.read_text(page)
+        original = html
+        for old, new in renamed.items():
+            directory = posixpath.dirname(page) or "."
+            html = html.replace(posixpath.relpath(old, directory), posixpath.relpath(new, directory))
+        html = _inline_in_page(page, html, context, planner, options)
+        if html != original:
+            context.write(page, html)
+
+    decisions = sorted(planner.decisions.values(), key=lambda d: (d["asset"], d["into"]))
+    inlined = [d for d in decisions if d["inlined"]]
+    kept = [d for d in decisions if d["reason"] == "cached separately"]
+    large = [d for d in decisions if d["reason"] == "over threshold"]
+    stats = {"title": "Asset inlining", "decisions": decisions, "inlined": len(inlined), "kept": len(kept),
+             "over_threshold": len(large), "inlined_bytes": sum(d["bytes"] for d in inlined),
+             "renamed": renamed}
+    assets = sorted({d["asset"] for d in inlined})
+    message = (f"{len(assets)} asset{'s' if len(assets) != 1 else ''} inlined "
+               f"({stats['inlined_bytes'] / 1024:.1f} KB into {len(inlined)} place"
+               f"{'s' if len(inlined) != 1 else ''}){': ' + ', '.join(assets) if assets else ''}")
+    if kept:
+        message += (f"; {len(kept)} kept as files because caching is cheaper: "
+                    f"{', '.join(sorted({d['asset'] for d in kept}))}")
+    if large:
+        message += f"; {len({d['asset'] for d in large})} over {options['max_bytes']} B"
+    stats["message"] = message
+    return stats
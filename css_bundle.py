@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+CSS Bundle
+Export stage that replaces each page's run of local stylesheet links with one
+content-hashed bundle. Sheets are concatenated in cascade order (local @imports
+inlined, media attributes kept as @media blocks, url() paths rebased), minified
+and cascade-safely merged; an optional source map points every rule back to
+its original file and line.
+"""
+
+import re
+import json
+import bisect
+import hashlib
+import posixpath
+from urllib.parse import urlsplit
+from typing import Dict, List, Tuple
+
+from css_minify import (CSSItem, parse, minify_items, minify_prelude, merge_rules, serialize, count_rules,
+                        rewrite_urls, tokens)
+from html_tags import HEAD_MARKUP, parse_attributes, tag_line_span, is_stylesheet
+from site_graph import resolve_reference, extract_references
+
+DEFAULT_OPTIONS = {
+    "enabled": True,
+    "minify": True,
+    "merge_rules": True,
+    "source_map": False,
+    "output_dir": "styles",
+    # Keep the original stylesheets in the export even when no page links them any more
+    "keep_sources": False,
+}
+# Font services only serve @font-face rules, so their links may stay between bundled sheets
+FONT_HOSTS = ("fonts.googleapis.com", "use.typekit.net", "fonts.bunny.net", "fonts.cdnfonts.com")
+IMPORT_TARGET = re.compile(r'''^@import\s+(?:url\(\s*)?(["']?)([^"')\s]+)\1\s*\)?\s*(.*)$''', re.IGNORECASE | re.DOTALL)
+BASE64_DIGITS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+
+
+def _vlq(value: int) -> str:
+    value = (-value << 1) | 1 if value < 0 else value << 1
+    digits = []
+    while True:
+        digit = value & 31
+        value >>= 5
+        digits.append(BASE64_DIGITS[digit | (32 if value else 0)])
+        if not value:
+            return ''.join(digits)
+
+
+def _line_starts(text: str) -> List[int]:
+    return [0] + [m.end() for m in re.finditer('\n', text)]
+
+
+def _position(starts: List[int], offset: int) -> Tuple[int, int]:
+    line = bisect.bisect_right(starts, offset) - 1
+    return line, offset - starts[line]
+
+
+class Bundle:
+    """The stylesheets of one link run, flattened into items in cascade order"""
+
+    def __init__(self, context, output_dir: str):
+        self.context = context
+        self.output_dir = output_dir
+        self.sources: List[Tuple[str, str]] = []
+        self.source_index: Dict[str, int] = {}
+        self.imports: List[CSSItem] = []
+        self.items: List[CSSItem] = []
+
+    def rebase(self, rel_path: str):
+        """url() rewriter for a sheet at rel_path moving into output_dir"""
+        def rewrite(value: str) -> str:
+            target = resolve_reference(rel_path, value)
+            if target is None or value.startswith('/'):
+                return value
+            parts = urlsplit(value)
+            suffix = (f"?{parts.query}" if parts.query else "") + (f"#{parts.fragment}" if parts.fragment else "")
+            return posixpath.relpath(target, self.output_dir) + suffix
+        return rewrite
+
+    def load(self, rel_path: str, media: str = "all", stack: Tuple[str, ...] = ()) -> List[CSSItem]:
+        """Items of a sheet with its local @imports inlined"""
+        if rel_path in stack:
+            return []
+        if rel_path not in self.source_index:
+            self.source_index[rel_path] = len(self.sources)
+            self.sources.append((rel_path, self.context.read_text(rel_path)))
+        index = self.source_index[rel_path]
+        items = []
+        leading = True
+        for item in parse(self.sources[index][1], source=index):
+            name = item.name if item.kind == "statement" else ""
+            if name == "@charset":
+                continue
+            if name == "@import":
+                # @import after other rules is ignored by browsers
+                if leading:
+                    items.extend(self._import(rel_path, item, stack + (rel_path,)))
+                continue
+            if name != "@layer":
+                leading = False
+            items.append(item)
+        return self._wrap(items, media)
+
+    def _import(self, rel_path: str, item: CSSItem, stack: Tuple[str, ...]) -> List[CSSItem]:
+        match = IMPORT_TARGET.match(item.prelude)
+        target = resolve_reference(rel_path, match.group(2)) if match else None
+        condition = match.group(3).strip() if match else ""
+        if (target is None or not self.context.exists(target) or
+                condition.lower().startswith(("layer", "supports"))):
+            # External (or unsupported) imports must stay ahead of every rule
+            if match and target is not None:
+                item.prelude = item.prelude.replace(match.group(2), self.rebase(rel_path)(match.group(2)), 1)
+            self.imports.append(item)
+            return []
+        return self.load(target, condition or "all", stack)
+
+    def _wrap(self, items: List[CSSItem], media: str) -> List[CSSItem]:
+        media = ' '.join(media.split())
+        if not items or media.lower() in ("", "all"):
+            return items
+        group = CSSItem("group", f"@media {media}", children=items, offset=-1)
+        return [group]
+
+    def add(self, rel_path: str, media: str):
+        self.items.extend(self.load(rel_path, media))
+
+    # Output
+
+    def build(self, minify: bool, merge: bool) -> Tuple[str, List[Tuple[int, CSSItem]], int]:
+        """(css, [(output offset, item)], rules merged)"""
+        positions = []
+        merged = 0
+        if minify:
+            # Imports were rebased when they were hoisted
+            minify_items(self.imports)
+            self._minify(self.items)
+            items = self.imports + self.items
+            if merge:
+                items, merged = merge_rules(items)
+            css = serialize(items, lambda item, position: positions.append((position, item)))
+            return css, positions, merged
+
+        out = [f"{item.prelude};\n" for item in self.imports]
+        length = sum(len(text) for text in out)
+        for item in self.items:
+            for text, mapped in self._raw(item):
+                if mapped is not None:
+                    positions.append((length, mapped))
+                out.append(text)
+                length += len(text)
+        return ''.join(out), positions, merged
+
+    def _minify(self, items: List[CSSItem]):
+        for item in items:
+            if item.offset < 0:
+                item.prelude = minify_prelude(item.prelude)
+                self._minify(item.children)
+            else:
+                minify_items([item], self.rebase(self.sources[item.source][0]))
+
+    def _raw(self, item: CSSItem):
+        if item.offset < 0:
+            yield f"{item.prelude} {{\n", None
+            for child in item.children:
+                yield from self._raw(child)
+            yield "}\n", None
+            return
+        rel_path, text = self.sources[item.source]
+        raw = rewrite_urls(text[item.offset:item.end], self.rebase(rel_path))
+        # A block left open at the end of its file must not swallow the next sheet
+        depth = sum(piece.count('{') - piece.count('}') for kind, piece in tokens(raw) if kind == "text")
+        yield raw + '}' * max(depth, 0) + "\n", item
+
+    def source_map(self, css: str, positions: List[Tuple[int, CSSItem]], file_name: str) -> str:
+        """Source map v3 with one segment per rule"""
+        output_starts = _line_starts(css)
+        source_starts = [_line_starts(text) for _, text in self.sources]
+        lines: List[List[str]] = [[] for _ in output_starts]
+        previous_column = {}
+        state = [0, 0, 0]
+        for position, item in positions:
+            if item.offset < 0:
+                continue
+            line, column = _position(output_starts, position)
+            src_line, src_column = _position(source_starts[item.source], item.offset)
+            segment = (_vlq(column - previous_column.get(line, 0)) + _vlq(item.source - state[0]) +
+                       _vlq(src_line - state[1]) + _vlq(src_column - state[2]))
+            previous_column[line] = column
+            state = [item.source, src_line, src_column]
+            lines[line].append(segment)
+        return json.dumps({
+            "version": 3,
+            "file": file_name,
+            "sources": [posixpath.relpath(path, self.output_dir) for path, _ in self.sources],
+            "sourcesContent": [text for _, text in self.sources],
+            "names": [],
+            "mappings": ';'.join(','.join(segments) for segments in lines),
+        }, separators=(',', ':'))
+
+
+def _link_runs(context, page: str, html: str, skip) -> List[List[Tuple[int, int, str, str]]]:
+    """Consecutive bundleable <link rel=stylesheet> tags: [(start, end, target, media)]"""
+    runs = []
+    current = []
+    for match in HEAD_MARKUP.finditer(html):
+        token = match.group(0)
+        lowered = token[:9].lower()
+        if token.startswith('<!--') or lowered.startswith('<noscript'):
+            continue
+        if lowered.startswith('<style'):
+            runs.append(current)
+            current = []
+            continue
+        attributes = parse_attributes(token)
+        if not is_stylesheet(attributes):
+            continue
+        href = attributes["href"]
+        target = resolve_reference(page, href)
+        if target is None and (urlsplit(href if '//' in href else '//' + href).hostname or '') in FONT_HOSTS:
+            continue
+        if (target is None or not target.endswith('.css') or not context.exists(target) or
+                target in skip or "onload" in attributes or "disabled" in attributes):
+            runs.append(current)
+            current = []
+            continue
+        current.append((match.start(), match.end(), target, attributes.get("media") or "all"))
+    runs.append(current)
+    return [run for run in runs if run]
+
+
+def run(context, options: Dict) -> Dict:
+    """Export stage: bundle each page's stylesheet links into one hashed file"""
+    options = dict(DEFAULT_OPTIONS, **options)
+    output_dir = options["output_dir"].strip('/') or "."
+    bundles: Dict[Tuple, str] = {}
+    bundled_sources = set()
+    stats = {"pages": 0, "stylesheets": 0, "bundles": 0, "rules": 0, "merged": 0,
+             "bytes_before": 0, "bytes_after": 0, "removed": 0}
+
+    def make_bundle(key: Tuple) -> str:
+        bundle = Bundle(context, output_dir)
+        for target, media in key:
+            bundle.add(target, media)
+        css, positions, merged = bundle.build(options["minify"], options["merge_rules"])
+        digest = hashlib.sha256(css.encode('utf-8')).hexdigest()[:10]
+        rel_path = posixpath.normpath(posixpath.join(output_dir, f"bundle.{digest}.css"))
+        if options["source_map"]:
+            map_name = posixpath.basename(rel_path) + ".map"
+            context.write(rel_path + ".map", bundle.source_map(css, positions, posixpath.basename(rel_path)))
+            css += f"\n/*# sourceMappingURL={map_name} */"
+        context.write(rel_path, css)
+
+        bundled_sources.update(path for path, _ in bundle.sources)
+        stats["bundles"] += 1
+        stats["rules"] += count_rules(bundle.imports + bundle.items)
+        stats["merged"] += merged
+        stats["bytes_before"] += sum(len(text.encode('utf-8')) for _, text in bundle.sources)
+        stats["bytes_after"] += len(css.encode('utf-8'))
+        return rel_path
+
+    for page in context.files("html"):
+        html = context.read_text(page)
+        runs = _link_runs(context, page, html, set(bundles.values()))
+        stats["pages"] += 1
+        if not runs:
+            continue
+        edits = []
+        for link_run in runs:
+            key = tuple((target, media) for _, _, target, media in link_run)
+            if key not in bundles:
+                bundles[key] = make_bundle(key)
+            href = posixpath.relpath(bundles[key], posixpath.dirname(page) or ".")
+            start, end = link_run[0][:2]
+            closing = " />" if html[start:end].endswith("/>") else ">"
+            edits.append((start, end, f'<link rel="stylesheet" href="{href}"{closing}'))
+            for start, end, _, _ in link_run[1:]:
+                edits.append(tag_line_span(html, start, end) + ("",))
+        for start, end, replacement in sorted(edits, reverse=True):
+            html = html[:start] + replacement + html[end:]
+        context.write(page, html)
+
+    # Drop the original sheets unless something still links them
+    if bundled_sources and not options["keep_sources"]:
+        referenced = set()
+        for rel_path in context.files():
+            if rel_path in bundled_sources or not rel_path.endswith(('.html', '.htm', '.css')):
+                continue
+            for reference in extract_references(rel_path, context.read_text(rel_path)):
+                referenced.add(resolve_reference(rel_path, reference))
+        for rel_path in sorted(bundled_sources - referenced):
+            context.remove(rel_path)
+            stats["removed"] += 1
+
+    stats["stylesheets"] = len(bundled_sources)
+    stats["title"] = "CSS bundle"
+    stats["message"] = (f"{stats['pages']} pages, {stats['stylesheets']} stylesheets -> "
+                        f"{stats['bundles']} bundle{'s' if stats['bundles'] != 1 else ''} "
+                        f"({stats['bytes_before'] / 1024:.1f} KB -> {stats['bytes_after'] / 1024:.1f} KB, "
+                        f"{stats['merged']} rules merged)")
+    return stats
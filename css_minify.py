@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+CSS Minifier
+A small tokenizer and parser for stylesheets (rules, nested at-rule groups and
+at-statements, with their source offsets), a whitespace/comment minifier that
+never touches strings or url() values, and cascade-safe rule merging.
+"""
+
+import re
+from typing import Callable, List, Optional, Tuple
+
+# At-rules whose body is a list of rules rather than declarations
+GROUP_AT_RULES = ("@media", "@supports", "@layer", "@container", "@document", "@-moz-document",
+                  "@scope", "@starting-style", "@keyframes", "@-webkit-keyframes", "@-moz-keyframes")
+KEYFRAMES = re.compile(r'^@(?:-[a-z]+-)?keyframes\s', re.IGNORECASE)
+# Adjacent group at-rules with the same prelude can share one block
+MERGEABLE_GROUPS = ("@media", "@supports")
+# Browsers drop a whole rule when one selector in its list is unknown, so
+# rules using vendor or newer pseudo selectors are never combined with others
+UNSAFE_SELECTOR = re.compile(r':(?::)?-|:(?:has|is|where|focus-visible|user-invalid)\b', re.IGNORECASE)
+
+HOLD = re.compile('\x00(\\d+)\x00')
+
+
+class CSSItem:
+    """One rule ("rule"), at-rule with a body ("group"/"at") or at-statement ("statement")"""
+
+    __slots__ = ("kind", "prelude", "body", "children", "offset", "end", "source", "declarations")
+
+    def __init__(self, kind: str, prelude: str, body: Optional[str] = None,
+                 children: Optional[List["CSSItem"]] = None, offset: int = 0, source: int = 0):
+        self.kind = kind
+        self.prelude = prelude
+        self.body = body
+        self.children = children
+        self.offset = offset
+        self.end = offset
+        self.source = source
+        self.declarations: List[str] = []
+
+    @property
+    def name(self) -> str:
+        """Lower-cased at-keyword ("" for rules)"""
+        if not self.prelude.startswith('@'):
+            return ""
+        return re.match(r'@[-\w]+', self.prelude).group(0).lower()
+
+
+# Tokens
+
+def token_end(text: str, i: int) -> Optional[int]:
+    """End of the string, comment or url() starting at i, or None"""
+    ch = text[i]
+    if ch == '"' or ch == "'":
+        j = i + 1
+        while j < len(text):
+            if text[j] == '\\':
+                j += 2
+                continue
+            if text[j] == ch or text[j] == '\n':
+                return j + 1
+            j += 1
+        return len(text)
+    if ch == '/' and text.startswith('/*', i):
+        j = text.find('*/', i + 2)
+        return len(text) if j == -1 else j + 2
+    if ch in 'uU' and text[i:i + 4].lower() == 'url(' and (i == 0 or not (text[i - 1].isalnum() or text[i - 1] in '-_')):
+        j = i + 4
+        while j < len(text) and text[j] in ' \t\r\n\f':
+            j += 1
+        if j < len(text) and text[j] in '"\'':
+            j = token_end(text, j)
+        k = text.find(')', j)
+        return len(text) if k == -1 else k + 1
+    return None
+
+
+def tokens(text: str) -> List[Tuple[str, str]]:
+    """Split text into ("text" | "string" | "comment" | "url", raw) pieces"""
+    pieces = []
+    start = i = 0
+    while i < len(text):
+        ch = text[i]
+        end = token_end(text, i) if ch in '"\'/uU' else None
+        if end is None:
+            i += 1
+            continue
+        if i > start:
+            pieces.append(("text", text[start:i]))
+        kind = "comment" if ch == '/' else "url" if ch in 'uU' else "string"
+        pieces.append((kind, text[i:end]))
+        i = start = end
+    if start < len(text):
+        pieces.append(("text", text[start:]))
+    return pieces
+
+
+def url_value(token: str) -> Tuple[str, str]:
+    """url("a.png") -> ("a.png", '"')"""
+    inner = token[4:-1].strip()
+    if inner[:1] in ('"', "'"):
+        return inner[1:-1], inner[0]
+    return inner, ""
+
+
+def rewrite_urls(text: str, rewrite: Callable[[str], str]) -> str:
+    """Apply rewrite to every url() value, leaving strings and comments alone"""
+    out = []
+    for kind, piece in tokens(text):
+        if kind == "url":
+            value, quote = url_value(piece)
+            new_value = rewrite(value)
+            if new_value != value:
+                piece = f"url({quote}{new_value}{quote})"
+        out.append(piece)
+    return ''.join(out)
+
+
+# Parsing
+
+def _scan(text: str, i: int, stops: str) -> int:
+    """Index of the first stop character outside strings, comments, url() and parentheses"""
+    depth = 0
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch in '"\'/uU':
+            end = token_end(text, i)
+            if end is not None:
+                i = end
+                continue
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif depth <= 0 and ch in stops:
+            return i
+        i += 1
+    return n
+
+
+def _skip_space(text: str, i: int) -> int:
+    n = len(text)
+    while i < n:
+        if text[i] in ' \t\r\n\f':
+            i += 1
+        elif text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+        elif text.startswith('<!--', i) or text.startswith('-->', i):
+            i += 4 if text[i] == '<' else 3
+        else:
+            break
+    return i
+
+
+def parse(text: str, base: int = 0, source: int = 0) -> List[CSSItem]:
+    """Parse a stylesheet into items; offsets are relative to the original file"""
+    items = []
+    i = 0
+    n = len(text)
+    while True:
+        i = _skip_space(text, i)
+        if i >= n:
+            return items
+        start = i
+        i = _scan(text, i, '{;}')
+        prelude = text[start:i].strip()
+        if i >= n or text[i] == ';':
+            if prelude:
+                items.append(CSSItem("statement", prelude, offset=base + start, source=source))
+                items[-1].end = base + min(i + 1, n)
+            i += 1
+            continue
+        if text[i] == '}':
+            i += 1
+            continue
+
+        # Find the matching closing brace
+        open_brace = i
+        depth = 0
+        while i < n:
+            i = _scan(text, i, '{}')
+            if i >= n:
+                break
+            depth += 1 if text[i] == '{' else -1
+            i += 1
+            if depth == 0:
+                break
+        body = text[open_brace + 1:i - 1 if depth == 0 else n]
+        if not prelude:
+            continue
+        if prelude.startswith('@') and prelude.lower().startswith(GROUP_AT_RULES):
+            children = parse(body, base + open_brace + 1, source)
+            items.append(CSSItem("group", prelude, children=children, offset=base + start, source=source))
+        elif prelude.startswith('@'):
+            items.append(CSSItem("at", prelude, body, offset=base + start, source=source))
+        else:
+            items.append(CSSItem("rule", prelude, body, offset=base + start, source=source))
+        items[-1].end = base + i
+
+
+# Minification
+
+def _hold(text: str, kept: List[str], rewrite_url=None) -> str:
+    """Collapse whitespace, drop comments and hide strings/url() behind placeholders"""
+    parts = []
+    for kind, piece in tokens(text):
+        if kind == "text":
+            parts.append(piece)
+        elif kind == "comment":
+            parts.append(' ')
+        else:
+            if kind == "url" and rewrite_url is not None:
+                value, quote = url_value(piece)
+                piece = f"url({quote}{rewrite_url(value)}{quote})"
+            kept.append(piece)
+            parts.append(f"\x00{len(kept) - 1}\x00")
+    return re.sub(r'\s+', ' ', ''.join(parts)).strip()
+
+
+def _restore(text: str, kept: List[str]) -> str:
+    return HOLD.sub(lambda m: kept[int(m.group(1))], text)
+
+
+def minify_selector(selector: str) -> str:
+    kept = []
+    text = _hold(selector, kept)
+    text = re.sub(r' ?([,>~+]) ?', r'\1', text)
+    text = re.sub(r'\( ', '(', re.sub(r' \)', ')', text))
+    return _restore(text, kept)
+
+
+def minify_prelude(prelude: str) -> str:
+    """At-rule prelude, e.g. '@media (max-width: 768px), print'"""
+    kept = []
+    text = _hold(prelude, kept)
+    text = re.sub(r' ?, ?', ',', text)
+    text = re.sub(r'\( ', '(', re.sub(r' \)', ')', text))
+    text = re.sub(r'(\([-\w]+) ?: ?', r'\1:', text)
+    return _restore(text, kept)
+
+
+def minify_declarations(body: str, rewrite_url=None) -> List[str]:
+    """Declarations of a rule body as minified 'property:value' strings"""
+    kept = []
+    text = _hold(body, kept, rewrite_url)
+    if '{' in text:
+        # Nested rules (CSS nesting, @page margin boxes) are kept as one unit
+        return [_restore(text, kept)]
+    declarations = []
+    depth = 0
+    start = 0
+    for i, ch in enumerate(text + ';'):
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif ch == ';' and depth <= 0:
+            declaration = text[start:i].strip()
+            start = i + 1
+            if not declaration:
+                continue
+            name, colon, value = declaration.partition(':')
+            if colon:
+                value = re.sub(r' ?, ?', ',', value.strip())
+                value = re.sub(r'\( ', '(', re.sub(r' \)', ')', value))
+                value = re.sub(r' ?! ?important$', '!important', value, flags=re.IGNORECASE)
+                declaration = f"{name.strip()}:{value}"
+            declarations.append(_restore(declaration, kept))
+    return declarations
+
+
+def dedupe_declarations(declarations: List[str]) -> List[str]:
+    """Drop exact repeats, keeping the last one (which decides the cascade)"""
+    seen = set()
+    kept = []
+    for declaration in reversed(declarations):
+        if declaration not in seen:
+            seen.add(declaration)
+            kept.append(declaration)
+    kept.reverse()
+    return kept
+
+
+def minify_items(items: List[CSSItem], rewrite_url=None):
+    """Minify preludes and declarations in place"""
+    for item in items:
+        if item.kind == "rule":
+            item.prelude = minify_selector(item.prelude)
+            item.declarations = minify_declarations(item.body, rewrite_url)
+        elif item.kind == "group":
+            item.prelude = minify_prelude(item.prelude)
+            minify_items(item.children, rewrite_url)
+        elif item.kind == "at":
+            item.prelude = minify_prelude(item.prelude)
+            item.declarations = minify_declarations(item.body, rewrite_url)
+        else:
+            kept = []
+            item.prelude = _restore(_hold(item.prelude, kept, rewrite_url), kept)
+
+
+# Merging
+
+def _mergeable(selector: str) -> bool:
+    return not UNSAFE_SELECTOR.search(selector)
+
+
+def merge_rules(items: List[CSSItem]) -> Tuple[List[CSSItem], int]:
+    """Cascade-safe merging of minified items; returns (items, number merged)"""
+    merged = 0
+
+    # An exact duplicate rule (or a same-named @keyframes) is redone by its last copy
+    seen = set()
+    kept = []
+    for item in reversed(items):
+        if item.kind == "rule":
+            key = ("rule", item.prelude, tuple(item.declarations))
+        elif item.kind == "group" and KEYFRAMES.match(item.prelude + ' '):
+            key = ("keyframes", item.prelude.split(None, 1)[-1])
+        else:
+            key = None
+        if key is not None:
+            if key in seen:
+                merged += 1
+                continue
+            seen.add(key)
+        kept.append(item)
+    kept.reverse()
+
+    result = []
+    for item in kept:
+        if item.kind == "group":
+            if item.name in MERGEABLE_GROUPS or KEYFRAMES.match(item.prelude + ' '):
+                item.children, count = merge_rules(item.children)
+                merged += count
+        if item.kind == "at":
+            item.declarations = dedupe_declarations(item.declarations)
+        if item.kind == "rule":
+            item.declarations = dedupe_declarations(item.declarations)
+        previous = result[-1] if result else None
+        if previous is not None and previous.kind == item.kind == "rule":
+            # a{x} a{y} -> a{x;y}
+            if previous.prelude == item.prelude:
+                previous.declarations = dedupe_declarations(previous.declarations + item.declarations)
+                merged += 1
+                continue
+            # a{x} b{x} -> a,b{x}
+            if (previous.declarations == item.declarations and
+                    _mergeable(previous.prelude) and _mergeable(item.prelude)):
+                selectors = previous.prelude.split(',')
+                selectors += [s for s in item.prelude.split(',') if s not in selectors]
+                previous.prelude = ','.join(selectors)
+                merged += 1
+                continue
+        if (previous is not None and previous.kind == item.kind == "group" and
+                previous.prelude == item.prelude and item.name in MERGEABLE_GROUPS):
+            previous.children, count = merge_rules(previous.children + item.children)
+            merged += count + 1
+            continue
+        result.append(item)
+    return result, merged
+
+
+# Output
+
+def serialize(items: List[CSSItem], on_item=None) -> str:
+    """Minified CSS for items; on_item(item, position) is called for each one"""
+    out = []
+    length = [0]
+
+    def emit(text: str):
+        out.append(text)
+        length[0] += len(text)
+
+    def walk(items: List[CSSItem]):
+        for item in items:
+            if on_item is not None:
+                on_item(item, length[0])
+            if item.kind == "group":
+                emit(item.prelude + '{')
+                walk(item.children)
+                emit('}')
+            elif item.kind == "statement":
+                emit(item.prelude + ';')
+            else:
+                emit(item.prelude + '{' + ';'.join(item.declarations) + '}')
+
+    walk(items)
+    return ''.join(out)
+
+
+def count_rules(items: List[CSSItem]) -> int:
+    return sum(count_rules(item.children) if item.kind == "group" else 1 for item in items)
+
+
+def minify(text: str, merge: bool = True) -> str:
+    """Minify a stylesheet in one call"""
+    items = parse(text)
+    minify_items(items)
+    if merge:
+        items, _ = merge_rules(items)
+    return serialize(items)
+
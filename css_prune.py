@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+CSS Pruning and Critical CSS
+Export stage that drops the rules of every linked stylesheet no exported page
+can match (classes, ids and tags that scripts add at runtime are kept), then
+inlines the rules the first screen needs in each page's <head> and loads the
+full sheet without blocking rendering. Results are cached by the hash of all
+inputs, so unchanged exports skip the analysis.
+"""
+
+import os
+import re
+import json
+import zlib
+import hashlib
+import posixpath
+from typing import Dict, List, Set
+
+from css_minify import (CSSItem, KEYFRAMES, UNSAFE_SELECTOR, parse, minify_items, serialize, count_rules)
+from css_select import Matcher, parse_html, script_tokens, split_selectors, above_the_fold
+from html_tags import HEAD_MARKUP, parse_attributes, is_stylesheet
+from site_graph import resolve_reference
+
+PRUNE_DIR_NAME = "css_prune"
+# Bumped whenever the analysis changes, so cached results are recomputed
+PRUNE_VERSION = 1
+DEFAULT_OPTIONS = {
+    "enabled": True,
+    "prune": True,
+    "critical": True,
+    # Top-level blocks of <body> treated as the first screen (e.g. nav + hero)
+    "fold_blocks": 2,
+    # Critical CSS whose compressed size exceeds this is not inlined (first round trip is ~14 KB)
+    "max_inline_kb": 14,
+    # Classes, ids or tags always treated as used
+    "safelist": [],
+}
+HASHED_NAME = re.compile(r'^(.*)\.[0-9a-f]{10}\.css$')
+ANIMATION_PROPERTIES = ("animation", "animation-name", "-webkit-animation", "-webkit-animation-name")
+
+
+def _declaration_words(items: List[CSSItem], properties=None) -> Set[str]:
+    words = set()
+    for item in items:
+        if item.kind == "group":
+            words |= _declaration_words(item.children, properties)
+        for declaration in item.declarations:
+            name, _, value = declaration.partition(':')
+            if properties is None or name.lower() in properties:
+                words.update(re.findall(r'[\w-]+', value))
+    return words
+
+
+def prune_items(items: List[CSSItem], matcher: Matcher) -> List[CSSItem]:
+    """Rules (and their selectors) the matcher can use; empty groups are dropped"""
+    kept = []
+    for item in items:
+        if item.kind == "rule":
+            selectors = split_selectors(item.prelude)
+            used = [s for s in selectors if matcher.used(s)]
+            if not used:
+                continue
+            copy = CSSItem("rule", item.prelude, offset=item.offset, source=item.source)
+            copy.declarations = item.declarations
+            # An unknown selector invalidates its whole list; never make such a list valid
+            if not UNSAFE_SELECTOR.search(item.prelude):
+                copy.prelude = ','.join(used)
+            kept.append(copy)
+        elif item.kind == "group" and not KEYFRAMES.match(item.prelude + ' '):
+            children = prune_items(item.children, matcher)
+            if children:
+                copy = CSSItem("group", item.prelude, children=children, offset=item.offset, source=item.source)
+                kept.append(copy)
+        else:
+            kept.append(item)
+
+    # @keyframes and @font-face only stay when a kept rule refers to them
+    animations = _declaration_words(kept, ANIMATION_PROPERTIES) | matcher.dynamic
+    fonts = _declaration_words(kept, ("font", "font-family"))
+    result = []
+    for item in kept:
+        if item.kind == "group" and KEYFRAMES.match(item.prelude + ' '):
+            if item.prelude.split(None, 1)[-1] not in animations:
+                continue
+        elif item.kind == "at" and item.name == "@font-face":
+            family = next((d.partition(':')[2] for d in item.declarations
+                           if d.lower().startswith("font-family:")), "")
+            if family and not set(re.findall(r'[\w-]+', family)) & fonts:
+                continue
+        result.append(item)
+    return result
+
+
+def _stylesheet_links(page: str, html: str, context) -> List[tuple]:
+    """Local stylesheet links of a page: (start, end, target, attributes)"""
+    links = []
+    for match in HEAD_MARKUP.finditer(html):
+        token = match.group(0)
+        if not token.lower().startswith('<link'):
+            continue
+        attributes = parse_attributes(token)
+        if not is_stylesheet(attributes) or "onload" in attributes:
+            continue
+        target = resolve_reference(page, attributes["href"])
+        if target and target.endswith('.css') and context.exists(target):
+            links.append((match.start(), match.end(), target, attributes))
+    return links
+
+
+def _analyse(stylesheets: Dict[str, str], pages: Dict[str, str], dynamic: Set[str],
+             links: Dict[str, List[tuple]], options: Dict) -> Dict:
+    """Pruned sheets and per-page critical CSS (pure function of its inputs)"""
+    documents = {page: parse_html(html) for page, html in pages.items()}
+    for _, scripts in documents.values():
+        for source in scripts:
+            dynamic = dynamic | script_tokens(source)
+
+    result = {"css": {}, "critical": {}, "rules": {}}
+    pruned_items = {}
+    for sheet, text in stylesheets.items():
+        items = parse(text)
+        minify_items(items)
+        linking = [page for page in pages if any(link[2] == sheet for link in links[page])]
+        if options["prune"]:
+            matcher = Matcher([documents[page][0] for page in linking], dynamic)
+            kept = prune_items(items, matcher)
+        else:
+            kept = items
+        pruned_items[sheet] = kept
+        result["css"][sheet] = serialize(kept)
+        result["rules"][sheet] = [count_rules(items), count_rules(kept)]
+
+    if options["critical"]:
+        for page, (root, _) in documents.items():
+            fold = Matcher([root], set(options["safelist"]), scope=above_the_fold(root, options["fold_blocks"]))
+            critical = ''.join(serialize([item for item in prune_items(pruned_items[link[2]], fold)
+                                          if item.name != "@import"])
+                               for link in links[page])
+            if critical and len(zlib.compress(critical.encode('utf-8'), 9)) <= options["max_inline_kb"] * 1024:
+                result["critical"][page] = critical
+    return result
+
+
+def run(context, options: Dict) -> Dict:
+    """Export stage: prune unused rules and inline critical CSS"""
+    options = dict(DEFAULT_OPTIONS, **options)
+    pages = {page: context.read_text(page) for page in context.files("html")}
+    links = {page: _stylesheet_links(page, html, context) for page, html in pages.items()}
+    sheets = sorted({link[2] for page_links in links.values() for link in page_links})
+    stylesheets = {sheet: context.read_text(sheet) for sheet in sheets}
+    dynamic = set(options["safelist"])
+    for script in context.files("js"):
+        dynamic |= script_tokens(context.read_text(script))
+    stats = {"pages": len(pages), "stylesheets": len(sheets), "rules_before": 0, "rules_after": 0,
+             "bytes_before": 0, "bytes_after": 0, "critical_bytes": 0, "cached": False, "title": "CSS pruning"}
+    if not sheets:
+        stats["message"] = "no local stylesheets"
+        return stats
+
+    # Every input goes into the cache key, so the same export always gives the same output
+    digest = hashlib.sha256(json.dumps([PRUNE_VERSION, options, stylesheets, pages, sorted(dynamic)],
+                                       sort_keys=True).encode('utf-8')).hexdigest()
+    cache_file = os.path.join(context.cache_dir, PRUNE_DIR_NAME, digest[:2], digest + ".json")
+    result = None
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            result = json.load(f)
+        stats["cached"] = True
+    except (OSError, ValueError):
+        pass
+    if result is None:
+        result = _analyse(stylesheets, pages, dynamic, links, options)
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        os.replace(tmp_file, cache_file)
+
+    # Write the pruned sheets; hashed bundles get a new content hash
+    renamed = {}
+    for sheet in sheets:
+        css = result["css"][sheet]
+        target = sheet
+        hashed = HASHED_NAME.match(sheet)
+        if hashed:
+            target = f"{hashed.group(1)}.{hashlib.sha256(css.encode('utf-8')).hexdigest()[:10]}.css"
+            context.remove(sheet)
+            if context.exists(sheet + ".map"):
+                # Rule positions changed; the bundle's map no longer applies
+                context.remove(sheet + ".map")
+        context.write(target, css)
+        renamed[sheet] = target
+        stats["rules_before"] += result["rules"][sheet][0]
+        stats["rules_after"] += result["rules"][sheet][1]
+        stats["bytes_before"] += len(stylesheets[sheet].encode('utf-8'))
+        stats["bytes_after"] += len(css.encode('utf-8'))
+
+    for page, html in pages.items():
+        edits = []
+        critical = result["critical"].get(page)
+        for start, end, target, attributes in links[page]:
+            href = posixpath.relpath(renamed[target], posixpath.dirname(page) or ".")
+            media = attributes.get("media")
+            media_attribute = f' media="{media}"' if media else ""
+            if critical:
+                # Load the full sheet without blocking the first paint
+                tag = (f'<link rel="preload" href="{href}" as="style"{media_attribute} '
+                       f'onload="this.onload=null;this.rel=\'stylesheet\'">'
+                       f'<noscript><link rel="stylesheet" href="{href}"{media_attribute}></noscript>')
+            else:
+                tag = f'<link rel="stylesheet" href="{href}"{media_attribute}>'
+            edits.append((start, end, tag))
+        if critical and edits:
+            start = edits[0][0]
+            edits.insert(0, (start, start, f'<style data-critical>{critical}</style>\n    '))
+            stats["critical_bytes"] += len(critical.encode('utf-8'))
+        for start, end, replacement in reversed(edits):
+            html = html[:start] + replacement + html[end:]
+        if html != pages[page]:
+            context.write(page, html)
+
+    stats["message"] = (f"{stats['rules_before']} -> {stats['rules_after']} rules in {len(sheets)} "
+                        f"stylesheet{'s' if len(sheets) != 1 else ''} "
+                        f"({stats['bytes_before'] / 1024:.1f} KB -> {stats['bytes_after'] / 1024:.1f} KB), "
+                        f"{stats['critical_bytes'] / 1024:.1f} KB critical CSS inlined in "
+                        f"{len(result['critical'])} of {len(pages)} pages"
+                        f"{' (cached)' if stats['cached'] else ''}")
+    return stats
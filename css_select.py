@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+CSS Selector Matching
+A light element tree built with html.parser and a right-to-left matcher for
+the selector subset stylesheets use in practice (type, id, class, attribute,
+combinators). Anything the tree cannot answer statically (dynamic and
+structural pseudo-classes, :not(), :has(), ...) is assumed to match, so
+callers err on the side of keeping CSS.
+"""
+
+import re
+from html.parser import HTMLParser
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+                 "param", "source", "track", "wbr"}
+# Pseudo-elements written with a single colon for CSS2 compatibility
+LEGACY_PSEUDO_ELEMENTS = {"before", "after", "first-line", "first-letter"}
+
+NAME = r'(?:[\w-]|\\.)+'
+SIMPLE = re.compile(r'\*|%s|#%s|\.%s' % (NAME, NAME, NAME))
+WORD = re.compile(r'[A-Za-z_][\w-]*')
+
+
+class Element:
+    """An element of the tree: tag, attributes, parent, children and position"""
+
+    __slots__ = ("tag", "attributes", "parent", "children", "index", "classes")
+
+    def __init__(self, tag: str, attributes: Dict[str, str], parent: Optional["Element"]):
+        self.tag = tag
+        self.attributes = attributes
+        self.parent = parent
+        self.children: List["Element"] = []
+        self.index = 0
+        self.classes = set(attributes.get("class", "").split())
+
+    def previous_siblings(self) -> List["Element"]:
+        if self.parent is None:
+            return []
+        return self.parent.children[:self.index][::-1]
+
+    def iter(self) -> Iterable["Element"]:
+        yield self
+        for child in self.children:
+            yield from child.iter()
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Element("#document", {}, None)
+        self.stack = [self.root]
+        self.scripts: List[str] = []
+        self._in_script = False
+
+    def handle_starttag(self, tag, attrs):
+        parent = self.stack[-1]
+        element = Element(tag, {name: value or "" for name, value in attrs}, parent)
+        element.index = len(parent.children)
+        parent.children.append(element)
+        if tag not in VOID_ELEMENTS:
+            self.stack.append(element)
+        self._in_script = tag == "script"
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS and self.stack[-1].tag == tag:
+            self.stack.pop()
+
+    def handle_endtag(self, tag):
+        self._in_script = False
+        for depth in range(len(self.stack) - 1, 0, -1):
+            if self.stack[depth].tag == tag:
+                del self.stack[depth:]
+                return
+
+    def handle_data(self, data):
+        if self._in_script:
+            self.scripts.append(data)
+
+
+def parse_html(html: str) -> Tuple[Element, List[str]]:
+    """(document root, inline script sources)"""
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root, builder.scripts
+
+
+def script_tokens(source: str) -> Set[str]:
+    """Words inside the string literals of a script: classes, ids, tags and
+    attributes it may add at runtime"""
+    words = set()
+    for match in re.finditer(r'''(["'`])((?:\\.|(?!\1)[^\\])*)\1''', source, re.DOTALL):
+        words.update(WORD.findall(match.group(2)))
+    return words
+
+
+# Selector parsing
+
+def _unescape(name: str) -> str:
+    return re.sub(r'\\(.)', r'\1', name)
+
+
+def _balanced(text: str, i: int) -> int:
+    """Index after the parenthesis group that opens at text[i]"""
+    depth = 0
+    while i < len(text):
+        if text[i] == '(':
+            depth += 1
+        elif text[i] == ')':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        elif text[i] in '"\'':
+            end = text.find(text[i], i + 1)
+            i = len(text) if end == -1 else end
+        i += 1
+    return len(text)
+
+
+def split_selectors(selector_list: str) -> List[str]:
+    """Split a selector list on top-level commas"""
+    parts = []
+    depth = 0
+    start = 0
+    quote = None
+    for i, ch in enumerate(selector_list):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in '"\'':
+            quote = ch
+        elif ch in '([':
+            depth += 1
+        elif ch in ')]':
+            depth -= 1
+        elif ch == ',' and depth == 0:
+            parts.append(selector_list[start:i].strip())
+            start = i + 1
+    parts.append(selector_list[start:].strip())
+    return [part for part in parts if part]
+
+
+class Compound:
+    """One compound selector: tag, ids, classes, attribute tests and a few pseudo-classes"""
+
+    __slots__ = ("tag", "ids", "classes", "attributes", "root")
+
+    def __init__(self):
+        self.tag = None
+        self.ids: List[str] = []
+        self.classes: List[str] = []
+        self.attributes: List[Tuple[str, Optional[str], Optional[str], bool]] = []
+        self.root = False
+
+
+def parse_selector(selector: str) -> List[Tuple[str, Compound]]:
+    """[(combinator, compound)] left to right; the first combinator is ''"""
+    parts = []
+    combinator = ''
+    compound = Compound()
+    empty = True
+    i = 0
+    n = len(selector)
+    while i < n:
+        ch = selector[i]
+        if ch in ' \t\n>+~':
+            j = i
+            while j < n and selector[j] in ' \t\n>+~':
+                j += 1
+            if not empty:
+                parts.append((combinator, compound))
+                compound = Compound()
+                empty = True
+            symbols = selector[i:j].strip()
+            combinator = symbols[:1] or ' '
+            i = j
+            continue
+        if ch == '[':
+            end = selector.find(']', i)
+            end = n if end == -1 else end
+            match = re.match(r'''\s*(%s)\s*(?:([~|^$*]?=)\s*("[^"]*"|'[^']*'|[^\s\]]+)\s*([iIsS])?)?\s*$''' % NAME,
+                             selector[i + 1:end])
+            if match:
+                value = match.group(3)
+                if value and value[0] in '"\'':
+                    value = value[1:-1]
+                compound.attributes.append((_unescape(match.group(1)).lower(), match.group(2), value,
+                                            (match.group(4) or '').lower() == 'i'))
+            i = end + 1
+            empty = False
+            continue
+        if ch == ':':
+            j = i + 1
+            if j < n and selector[j] == ':':
+                j += 1
+            match = re.match(r'-?[\w-]+', selector[j:])
+            name = match.group(0).lower() if match else ''
+            j += len(name)
+            if j < n and selector[j] == '(':
+                j = _balanced(selector, j)
+            if name == 'root':
+                compound.root = True
+            # Every other pseudo-class/element is assumed to match
+            i = j
+            empty = False
+            continue
+        match = SIMPLE.match(selector, i)
+        if not match:
+            i += 1
+            continue
+        token = match.group(0)
+        if token[0] == '#':
+            compound.ids.append(_unescape(token[1:]))
+        elif token[0] == '.':
+            compound.classes.append(_unescape(token[1:]))
+        elif token != '*':
+            compound.tag = _unescape(token).lower().split('|')[-1]
+        i = match.end()
+        empty = False
+    if not empty:
+        parts.append((combinator, compound))
+    return parts
+
+
+# Matching
+
+def _attribute_matches(element: Element, test) -> bool:
+    name, operator, value, ignore_case = test
+    actual = element.attributes.get(name)
+    if actual is None:
+        return False
+    if operator is None:
+        return True
+    if ignore_case:
+        actual, value = actual.lower(), value.lower()
+    if operator == '=':
+        return actual == value
+    if operator == '~=':
+        return value in actual.split()
+    if operator == '|=':
+        return actual == value or actual.startswith(value + '-')
+    if operator == '^=':
+        return bool(value) and actual.startswith(value)
+    if operator == '$=':
+        return bool(value) and actual.endswith(value)
+    return bool(value) and value in actual
+
+
+class Matcher:
+    """Decides whether selectors match any element of a set of documents.
+
+    dynamic holds names scripts may add at runtime; a class, id, tag or
+    attribute in it is treated as present on every element.
+    """
+
+    def __init__(self, roots: List[Element], dynamic: Optional[Set[str]] = None,
+                 scope: Optional[List[Element]] = None):
+        self.dynamic = dynamic or set()
+        self.elements = scope if scope is not None else [e for root in roots for e in root.iter()
+                                                         if e.parent is not None]
+        self.by_class: Dict[str, List[Element]] = {}
+        self.by_id: Dict[str, List[Element]] = {}
+        self.by_tag: Dict[str, List[Element]] = {}
+        for element in self.elements:
+            for name in element.classes:
+                self.by_class.setdefault(name, []).append(element)
+            if "id" in element.attributes:
+                self.by_id.setdefault(element.attributes["id"], []).append(element)
+            self.by_tag.setdefault(element.tag, []).append(element)
+        self._memo: Dict[str, bool] = {}
+
+    def _compound(self, element: Element, compound: Compound) -> bool:
+        dynamic = self.dynamic
+        if compound.root and element.tag != "html":
+            return False
+        if compound.tag and compound.tag != element.tag and compound.tag not in dynamic:
+            return False
+        for name in compound.ids:
+            if element.attributes.get("id") != name and name not in dynamic:
+                return False
+        for name in compound.classes:
+            if name not in element.classes and name not in dynamic:
+                return False
+        for test in compound.attributes:
+            if not _attribute_matches(element, test) and test[0] not in dynamic:
+                return False
+        return True
+
+    def _matches(self, element: Element, parts, i: int) -> bool:
+        if not self._compound(element, parts[i][1]):
+            return False
+        if i == 0:
+            return True
+        combinator = parts[i][0]
+        if combinator == '>':
+            return element.parent is not None and self._matches(element.parent, parts, i - 1)
+        if combinator == ' ':
+            parent = element.parent
+            while parent is not None and parent.parent is not None:
+                if self._matches(parent, parts, i - 1):
+                    return True
+                parent = parent.parent
+            return False
+        siblings = element.previous_siblings()
+        if combinator == '+':
+            return bool(siblings) and self._matches(siblings[0], parts, i - 1)
+        return any(self._matches(sibling, parts, i - 1) for sibling in siblings)
+
+    def _candidates(self, compound: Compound) -> List[Element]:
+        """Elements the rightmost compound could match, via the indexes"""
+        for name in compound.ids:
+            if name not in self.dynamic:
+                return self.by_id.get(name, [])
+        for name in compound.classes:
+            if name not in self.dynamic:
+                return self.by_class.get(name, [])
+        if compound.tag and compound.tag not in self.dynamic:
+            return self.by_tag.get(compound.tag, [])
+        return self.elements
+
+    def used(self, selector: str) -> bool:
+        """True if the selector (not a list) can match an element"""
+        cached = self._memo.get(selector)
+        if cached is not None:
+            return cached
+        parts = parse_selector(selector)
+        if not parts:
+            result = True
+        else:
+            last = len(parts) - 1
+            result = any(self._matches(element, parts, last) for element in self._candidates(parts[last][1]))
+        self._memo[selector] = result
+        return result
+
+
+def above_the_fold(root: Element, blocks: int) -> List[Element]:
+    """Elements of <head> and the first top-level blocks of <body> (with their ancestors)"""
+    body = next((e for e in root.iter() if e.tag == "body"), None)
+    if body is None:
+        return [e for e in root.iter() if e.parent is not None]
+    container = body
+    # Look through single wrapper elements such as <div id="app">
+    while len(container.children) == 1 and container.children[0].children:
+        container = container.children[0]
+    elements = [e for e in root.iter() if e.parent is not None and e.tag != "body" and body not in _ancestors(e)]
+    elements.append(body)
+    ancestor = container
+    while ancestor is not body:
+        elements.append(ancestor)
+        ancestor = ancestor.parent
+    shown = [child for child in container.children if child.tag not in ("script", "style", "template", "noscript")]
+    for child in shown[:blocks]:
+        elements.extend(child.iter())
+    return elements
+
+
+def _ancestors(element: Element) -> List[Element]:
+    ancestors = []
+    while element.parent is not None:
+        element = element.parent
+        ancestors.append(element)
+    return ancestors
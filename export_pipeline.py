@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Export Pipeline
+Runs the optional build stages (responsive images, CSS bundling, ...) between rendering and
+export. Stages read the deployable files through an ExportContext and write
+their results to an ExportOverlay, so the template itself is never modified
+and the same stages serve folder and archive exports.
+"""
+
+import os
+import time
+import hashlib
+import importlib
+from typing import Dict, List, Optional
+
+from file_index import CACHE_DIR_NAME, get_file_index, hash_file
+from site_export import ExportOverlay, deployable_files, DEFAULT_PROFILE
+
+# Stage name -> "module:function", run in this order. Each function takes
+# (context, options) where options is config["build"][name] over the module's DEFAULT_OPTIONS.
+STAGES = [
+    ("responsive_images", "responsive_images:run"),
+    ("css_bundle", "css_bundle:run"),
+    ("css_prune", "css_prune:run"),
+    ("js_optimize", "js_optimize:run"),
+    ("asset_inline", "asset_inline:run"),
+    ("resource_hints", "resource_hints:run"),
+    # After every stage that edits pages: they would otherwise re-add whitespace
+    ("html_minify", "html_minify:run"),
+    # Last to change the output: fingerprints it
+    ("service_worker", "service_worker:run"),
+    # Only measures, so it sees the pages exactly as they are exported
+    ("page_weight", "page_weight:run"),
+]
+
+
+class ExportContext:
+    """Template files as seen by the build stages, plus their overlay and reports"""
+
+    def __init__(self, template_path: str, config: Dict, profile: str = DEFAULT_PROFILE,
+                 overlay: Optional[ExportOverlay] = None, task=None):
+        self.template_path = os.path.abspath(template_path)
+        self.config = config
+        self.profile = profile
+        self.index = get_file_index(self.template_path)
+        # Stages read sizes straight from the index: pick up files edited in place
+        self.index.refresh()
+        self.overlay = overlay or ExportOverlay()
+        self.task = task
+        self.report: Dict[str, Dict] = {}
+        self._files = deployable_files(self.index, profile)
+
+    @property
+    def cache_dir(self) -> str:
+        return os.path.join(self.template_path, CACHE_DIR_NAME)
+
+    def files(self, kind: Optional[str] = None) -> List[str]:
+        """Deployable files after the stages run so far, optionally of one file type"""
+        from file_index import file_type
+        return [p for p in self.overlay.apply(self._files) if kind is None or file_type(p) == kind]
+
+    def exists(self, rel_path: str) -> bool:
+        return rel_path in self.overlay.data or rel_path in self.overlay.files or (
+            rel_path not in self.overlay.removed and rel_path in self.index.files)
+
+    def source_path(self, rel_path: str) -> Optional[str]:
+        """File backing rel_path on disk, None for generated content"""
+        if rel_path in self.overlay.data:
+            return None
+        return self.overlay.files.get(rel_path) or self.index.abspath(rel_path)
+
+    def read(self, rel_path: str) -> bytes:
+        if rel_path in self.overlay.data:
+            return self.overlay.data[rel_path]
+        with open(self.source_path(rel_path), 'rb') as f:
+            return f.read()
+
+    def size(self, rel_path: str) -> int:
+        """Bytes of the file as it will be exported"""
+        if rel_path in self.overlay.data:
+            return len(self.overlay.data[rel_path])
+        if rel_path in self.overlay.files:
+            return os.path.getsize(self.overlay.files[rel_path])
+        return self.index.files[rel_path]["size"]
+
+    def content_hash(self, rel_path: str) -> str:
+        """SHA-256 of the file as it will be exported"""
+        if rel_path in self.overlay.data:
+            return hashlib.sha256(self.overlay.data[rel_path]).hexdigest()
+        if rel_path in self.overlay.files:
+            return hash_file(self.overlay.files[rel_path])
+        return self.index.content_hash(rel_path)
+
+    def read_text(self, rel_path: str) -> str:
+        return self.read(rel_path).decode('utf-8', errors='replace')
+
+    def write(self, rel_path: str, data):
+        """Replace or add a file in the export"""
+        self.overlay.put(rel_path, data.encode('utf-8') if isinstance(data, str) else data)
+
+    def add_file(self, rel_path: str, abs_path: str):
+        """Export a cached file under rel_path"""
+        self.overlay.put_file(rel_path, abs_path)
+
+    def remove(self, rel_path: str):
+        self.overlay.remove(rel_path)
+
+
+def stage_options(config: Dict, name: str) -> Dict:
+    """The stage's DEFAULT_OPTIONS overridden by config["build"][name]"""
+    module_name = dict(STAGES)[name].split(':')[0]
+    defaults = getattr(importlib.import_module(module_name), "DEFAULT_OPTIONS", {})
+    return dict(defaults, **(config.get("build", {}).get(name) or {}))
+
+
+def run_stages(context: ExportContext, names: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """Run the enabled stages (or the given ones) and return their reports"""
+    for name, target in STAGES:
+        options = stage_options(context.config, name)
+        if names is not None:
+            if name not in names:
+                continue
+        elif not options.get("enabled"):
+            continue
+        if context.task is not None:
+            context.task.check_cancelled()
+            context.task.report(0, message=f"Build stage: {name.replace('_', ' ')}")
+        module_name, function_name = target.split(':')
+        started = time.perf_counter()
+        report = getattr(importlib.import_module(module_name), function_name)(context, options) or {}
+        report["elapsed"] = time.perf_counter() - started
+        context.report[name] = report
+    return context.report
+
+
+def describe_stages(report: Dict[str, Dict]) -> List[str]:
+    """One line per stage that ran"""
+    return [f"{stage.get('title') or name.replace('_', ' ').capitalize()}: {stage.get('message', 'done')} "
+            f"({stage['elapsed'] * 1000:.0f} ms)" for name, stage in report.items()]
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Template File Index
+Persistent, incremental index of the files in a website template.
+Directories are only rescanned when their mtime changes, and backups,
+version control data and previous exports are excluded with gitignore-style rules.
+"""
+
+import os
+import json
+import fnmatch
+import hashlib
+import threading
+from typing import Dict, List, Optional
+
+CACHE_DIR_NAME = ".editor_cache"
+INDEX_FILE_NAME = "file_index.json"
+INDEX_VERSION = 1
+
+# Patterns that are never part of a template, in .gitignore syntax
+DEFAULT_EXCLUDES = [
+    ".git/",
+    ".svn/",
+    f"{CACHE_DIR_NAME}/",
+    "__pycache__/",
+    "node_modules/",
+    "backups/",
+    ".image_originals/",
+    ".editor_trash/",
+    "*.pyc",
+    ".DS_Store",
+    "Thumbs.db",
+    # Exports created by the editors: <version>_<YYYYmmdd>_<HHMMSS>
+    "*_[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]_[0-9][0-9][0-9][0-9][0-9][0-9]/",
+]
+
+# Ignore files read from the template root, in order
+IGNORE_FILES = [".gitignore", ".editorignore"]
+
+FILE_TYPES = {
+    ".html": "html",
+    ".htm": "html",
+    ".css": "css",
+    ".js": "js",
+    ".mjs": "js",
+    ".json": "json",
+    ".jpg": "image",
+    ".jpeg": "image",
+    ".png": "image",
+    ".gif": "image",
+    ".svg": "image",
+    ".webp": "image",
+    ".ico": "image",
+    ".avif": "image",
+    ".woff": "font",
+    ".woff2": "font",
+    ".ttf": "font",
+    ".otf": "font",
+    ".pdf": "document",
+    ".txt": "text",
+    ".md": "text",
+    ".xml": "text",
+    ".py": "source",
+    ".sh": "source",
+}
+
+
+def file_type(path: str) -> str:
+    """Classify a file by its extension"""
+    return FILE_TYPES.get(os.path.splitext(path)[1].lower(), "other")
+
+
+def hash_file(path: str) -> str:
+    """Return the SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class IgnoreRules:
+    """Minimal gitignore matcher (globs, anchoring, dir-only and negation)"""
+
+    def __init__(self, patterns: List[str]):
+        self.patterns = []
+        for raw in patterns:
+            line = raw.strip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            # gitignore: a slash at the start or in the middle anchors, a trailing one does not
+            anchored = line.startswith('/') or '/' in line[:-1]
+            dir_only = line.endswith('/')
+            line = line.strip('/')
+            if line.startswith('**/'):
+                line, anchored = line[3:], False
+            if line:
+                self.patterns.append((line, negate, dir_only, anchored))
+
+    def signature(self) -> str:
+        """Stable fingerprint of the rule set, used to invalidate the cache"""
+        return hashlib.sha1(repr(self.patterns).encode('utf-8')).hexdigest()
+
+    def match(self, rel_path: str, is_dir: bool) -> bool:
+        """Return True if rel_path (forward slashes) is excluded"""
+        name = rel_path.rsplit('/', 1)[-1]
+        excluded = False
+        for pattern, negate, dir_only, anchored in self.patterns:
+            if dir_only and not is_dir:
+                continue
+            target = rel_path if anchored else name
+            if fnmatch.fnmatchcase(target, pattern) or (
+                    anchored and pattern.endswith('/**') and
+                    rel_path.startswith(pattern[:-3] + '/')):
+                excluded = not negate
+        return excluded
+
+
+def load_ignore_rules(root: str, extra: Optional[List[str]] = None) -> IgnoreRules:
+    """Build ignore rules from defaults, the template's ignore files and extras"""
+    patterns = list(DEFAULT_EXCLUDES)
+    for name in IGNORE_FILES:
+        path = os.path.join(root, name)
+        if os.path.isfile(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    patterns.extend(f.read().splitlines())
+            except (OSError, UnicodeDecodeError):
+                pass
+    patterns.extend(extra or [])
+    return IgnoreRules(patterns)
+
+
+class FileIndex:
+    """Persistent index of template files: path, size, mtime, type and content hash"""
+
+    def __init__(self, root: str, excludes: Optional[List[str]] = None,
+                 cache_dir: Optional[str] = None):
+        self.root = os.path.abspath(root)
+        self.cache_dir = cache_dir or os.path.join(self.root, CACHE_DIR_NAME)
+        self.cache_file = os.path.join(self.cache_dir, INDEX_FILE_NAME)
+        self.rules = load_ignore_rules(self.root, excludes)
+        self.lock = threading.RLock()
+
+        # rel_dir -> {"mtime_ns", "files": [names], "dirs": [names]}
+        self.dirs: Dict[str, Dict] = {}
+        # rel_path -> {"size", "mtime_ns", "type", "hash"}
+        self.files: Dict[str, Dict] = {}
+        self.dirty = False
+        self.load()
+
+    # Persistence
+
+    def load(self):
+        """Load the cached index from disk, discarding it if stale"""
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (data.get("version") != INDEX_VERSION or
+                data.get("rules") != self.rules.signature()):
+            return
+        self.dirs = data.get("dirs", {})
+        self.files = data.get("files", {})
+
+    def save(self):
+        """Write the index to disk if it changed"""
+        with self.lock:
+            if not self.dirty:
+                return
+            data = {
+                "version": INDEX_VERSION,
+                "rules": self.rules.signature(),
+                "dirs": self.dirs,
+                "files": self.files,
+            }
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_file, self.cache_file)
+            self.dirty = False
+
+    def reload_rules(self):
+        """Re-read the ignore files; a changed rule set starts the index over"""
+        with self.lock:
+            rules = load_ignore_rules(self.root)
+            if rules.signature() != self.rules.signature():
+                self.rules = rules
+                self.dirs, self.files = {}, {}
+                self.dirty = True
+
+    # Scanning
+
+    def abspath(self, rel_path: str) -> str:
+        """Absolute filesystem path of an indexed path"""
+        return os.path.join(self.root, *rel_path.split('/')) if rel_path else self.root
+
+    def is_excluded(self, rel_path: str, is_dir: bool = False) -> bool:
+        """Check a relative path against the ignore rules"""
+        return self.rules.match(rel_path, is_dir)
+
+    def refresh(self, restat: bool = True) -> int:
+        """Bring the index up to date and return the number of rescanned directories.
+
+        Unchanged directories are not listed again. With restat their files are
+        stat'ed too, so in-place edits (which leave the directory mtime alone)
+        are picked up; that costs one stat per file, without it one per directory.
+        """
+        with self.lock:
+            rescanned = self._refresh_dir("", restat)
+            self.save()
+            return rescanned
+
+    def _refresh_dir(self, rel_dir: str, restat: bool) -> int:
+        """Refresh one directory and recurse into its children"""
+        try:
+            mtime_ns = os.stat(self.abspath(rel_dir)).st_mtime_ns
+        except OSError:
+            self._drop_dir(rel_dir)
+            return 1
+
+        cached = self.dirs.get(rel_dir)
+        rescanned = 0
+        if cached is None or cached["mtime_ns"] != mtime_ns:
+            self._scan_dir(rel_dir, mtime_ns)
+            cached = self.dirs[rel_dir]
+            rescanned = 1
+        elif restat:
+            for name in cached["files"]:
+                self._update_file(self._join(rel_dir, name))
+
+        for name in cached["dirs"]:
+            rescanned += self._refresh_dir(self._join(rel_dir, name), restat)
+        return rescanned
+
+    def _scan_dir(self, rel_dir: str, mtime_ns: int):
+        """List a directory and update the entries it contains"""
+        old = self.dirs.get(rel_dir, {"files": [], "dirs": []})
+        files, dirs = [], []
+        try:
+            with os.scandir(self.abspath(rel_dir)) as it:
+                for entry in it:
+                    rel_path = self._join(rel_dir, entry.name)
+                    if entry.is_dir(follow_symlinks=False):
+                        if not self.is_excluded(rel_path, True):
+                            dirs.append(entry.name)
+                    elif entry.is_file():
+                        if not self.is_excluded(rel_path, False):
+                            files.append(entry.name)
+                            self._update_file(rel_path, entry.stat())
+        except OSError:
+            pass
+
+        for name in set(old["files"]) - set(files):
+            self.files.pop(self._join(rel_dir, name), None)
+        for name in set(old["dirs"]) - set(dirs):
+            self._drop_dir(self._join(rel_dir, name))
+
+        self.dirs[rel_dir] = {"mtime_ns": mtime_ns, "files": sorted(files), "dirs": sorted(dirs)}
+        self.dirty = True
+
+    def _update_file(self, rel_path: str, st: Optional[os.stat_result] = None) -> Optional[Dict]:
+        """Refresh a file entry from its stat, keeping the hash if unchanged"""
+        if st is None:
+            try:
+                st = os.stat(self.abspath(rel_path))
+            except OSError:
+                if self.files.pop(rel_path, None) is not None:
+                    self.dirty = True
+                return None
+
+        entry = self.files.get(rel_path)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return entry
+
+        entry = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "type": file_type(rel_path),
+            "hash": None,
+        }
+        self.files[rel_path] = entry
+        self.dirty = True
+        return entry
+
+    def _drop_dir(self, rel_dir: str):
+        """Forget a directory and everything below it"""
+        cached = self.dirs.pop(rel_dir, None)
+        if cached is None:
+            return
+        for name in cached["files"]:
+            self.files.pop(self._join(rel_dir, name), None)
+        for name in cached["dirs"]:
+            self._drop_dir(self._join(rel_dir, name))
+        self.dirty = True
+
+    @staticmethod
+    def _join(rel_dir: str, name: str) -> str:
+        return f"{rel_dir}/{name}" if rel_dir else name
+
+    # Queries
+
+    def get(self, rel_path: str) -> Optional[Dict]:
+        """Return the up-to-date entry for a file, or None if it is not indexed"""
+        with self.lock:
+            if rel_path not in self.files:
+                return None
+            return self._update_file(rel_path)
+
+    def content_hash(self, rel_path: str) -> Optional[str]:
+        """Return the file's content hash, computing it only when the file changed"""
+        with self.lock:
+            entry = self.get(rel_path)
+            if entry is None:
+                return None
+            if entry["hash"] is None:
+                try:
+                    entry["hash"] = hash_file(self.abspath(rel_path))
+                except OSError:
+                    return None
+                self.dirty = True
+            return entry["hash"]
+
+    def paths(self, kind: Optional[str] = None) -> List[str]:
+        """Sorted list of indexed paths, optionally filtered by file type"""
+        with self.lock:
+            return sorted(p for p, e in self.files.items() if kind is None or e["type"] == kind)
+
+    def by_type(self) -> Dict[str, List[str]]:
+        """Group indexed paths by file type"""
+        groups: Dict[str, List[str]] = {}
+        for path in self.paths():
+            groups.setdefault(self.files[path]["type"], []).append(path)
+        return groups
+
+    def total_size(self, kind: Optional[str] = None) -> int:
+        """Sum of file sizes, optionally for a single file type"""
+        with self.lock:
+            return sum(e["size"] for e in self.files.values() if kind is None or e["type"] == kind)
+
+
+_indexes: Dict[str, FileIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_file_index(root: str) -> FileIndex:
+    """Return the shared FileIndex for a template directory, with changed directories rescanned.
+
+    This runs on every use, so it only stats directories: get() and content_hash()
+    always see the current file, but sizes from paths(), by_type() and total_size()
+    can lag behind in-place edits until an explicit refresh().
+    """
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = FileIndex(root)
+    index.refresh(restat=False)
+    return index
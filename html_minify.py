@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+HTML Minifier
+Export stage that strips comments, collapses whitespace and drops redundant
+attributes in one streaming pass over each page. <pre>, <textarea>, inline
+scripts and conditional comments are passed through untouched; inline
+<style> blocks are minified with the CSS minifier.
+"""
+
+import re
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+from css_minify import minify as minify_css
+from html_tags import ATTRIBUTE
+
+DEFAULT_OPTIONS = {
+    "enabled": True,
+    "remove_comments": True,
+    "collapse_whitespace": True,
+    "remove_redundant_attributes": True,
+    "minify_inline_css": True,
+}
+FEED_CHUNK = 64 * 1024
+
+# Whitespace-sensitive elements whose content is copied verbatim
+PRESERVE_ELEMENTS = {"pre", "textarea", "script", "plaintext", "xmp", "listing"}
+# Whitespace next to these tags never renders
+BLOCK_ELEMENTS = {
+    "html", "head", "body", "title", "meta", "link", "base", "style", "noscript",
+    "address", "article", "aside", "blockquote", "details", "dialog", "dd", "div", "dl", "dt",
+    "fieldset", "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6",
+    "header", "hgroup", "hr", "li", "main", "nav", "ol", "p", "section", "summary", "table",
+    "thead", "tbody", "tfoot", "tr", "td", "th", "caption", "colgroup", "col", "ul", "option",
+    "optgroup", "menu", "picture", "source", "template", "br", "pre",
+}
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+                 "param", "source", "track", "wbr"}
+BOOLEAN_ATTRIBUTES = {"allowfullscreen", "async", "autofocus", "autoplay", "checked", "controls",
+                      "default", "defer", "disabled", "formnovalidate", "hidden", "ismap", "loop",
+                      "multiple", "muted", "nomodule", "novalidate", "open", "readonly", "required",
+                      "reversed", "selected"}
+# (element, attribute, value) triples that only restate the default
+REDUNDANT_ATTRIBUTES = {
+    ("script", "type", "text/javascript"),
+    ("script", "language", "javascript"),
+    ("style", "type", "text/css"),
+    ("link", "type", "text/css"),
+    ("form", "method", "get"),
+    ("input", "type", "text"),
+}
+WHITESPACE = re.compile(r'[ \t\n\r\f]+')
+
+
+class HTMLMinifier(HTMLParser):
+    """Streaming minifier: feed() HTML in chunks, read the result from output()"""
+
+    def __init__(self, options: Optional[Dict] = None):
+        super().__init__(convert_charrefs=False)
+        self.options = dict(DEFAULT_OPTIONS, **(options or {}))
+        self.out: List[str] = []
+        self.preserve: List[str] = []     # open whitespace-sensitive elements
+        self.pending: List[str] = []      # text waiting for the next tag
+        self.previous_tag = "html"        # last tag seen (open or close), for trimming
+        self.in_head = False
+        self.in_style = False
+        self.comments_removed = 0
+
+    # Text
+
+    def _flush(self, next_tag: Optional[str]):
+        """Write pending text, trimmed next to block tags"""
+        if not self.pending:
+            return
+        text = ''.join(self.pending)
+        self.pending = []
+        if self.options["collapse_whitespace"] and not self.preserve:
+            text = WHITESPACE.sub(' ', text)
+            if self.in_head or self.previous_tag in BLOCK_ELEMENTS:
+                text = text.lstrip(' ')
+            if self.in_head or next_tag is None or next_tag in BLOCK_ELEMENTS:
+                text = text.rstrip(' ')
+        self.out.append(text)
+
+    def handle_data(self, data):
+        if self.preserve:
+            self.out.append(data)
+        elif self.in_style:
+            if self.options["minify_inline_css"]:
+                data = minify_css(data, merge=False)
+            self.out.append(data)
+        else:
+            self.pending.append(data)
+
+    def handle_entityref(self, name):
+        self._text(f"&{name};")
+
+    def handle_charref(self, name):
+        self._text(f"&#{name};")
+
+    def _text(self, text: str):
+        if self.preserve or self.in_style:
+            self.out.append(text)
+        else:
+            self.pending.append(text)
+
+    # Tags
+
+    def _tag(self, tag: str, raw: str) -> str:
+        """Start tag with tidied attribute whitespace and redundant attributes removed"""
+        match = re.match(r'<([^\s/>]+)', raw)
+        if not match or self.preserve:
+            return raw
+        name = match.group(1)
+        body = raw[match.end():]
+        closing = '/>' if body.rstrip().endswith('/>') else '>'
+        body = body.rstrip()[:-len(closing)]
+        parts = [f"<{name}"]
+        for attribute, value in ATTRIBUTE.findall(body):
+            key = attribute.lower()
+            plain = value[1:-1] if value[:1] in ('"', "'") else value
+            if self.options["remove_redundant_attributes"]:
+                if (tag, key, plain.strip().lower()) in REDUNDANT_ATTRIBUTES:
+                    continue
+                if key in BOOLEAN_ATTRIBUTES and plain.lower() in ("", key):
+                    value = ""
+                if key == "class" and value:
+                    quote = value[0] if value[0] in '"\'' else '"'
+                    value = f"{quote}{' '.join(plain.split())}{quote}"
+            parts.append(f" {attribute}={value}" if value else f" {attribute}")
+        if closing == '/>' and tag not in VOID_ELEMENTS:
+            # Self-closing syntax matters in foreign content (SVG, MathML)
+            parts.append('/')
+        return ''.join(parts) + '>'
+
+    def handle_starttag(self, tag, attrs):
+        raw = self.get_starttag_text()
+        if self.preserve:
+            # Markup inside <pre>/<textarea> is copied as written
+            self.out.append(raw)
+            if tag in PRESERVE_ELEMENTS:
+                self.preserve.append(tag)
+            return
+        self._flush(tag)
+        self.out.append(self._tag(tag, raw))
+        self.previous_tag = tag
+        if tag == "head":
+            self.in_head = True
+        elif tag == "body":
+            self.in_head = False
+        elif tag == "style":
+            self.in_style = True
+        if tag in PRESERVE_ELEMENTS:
+            self.preserve.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if self.preserve:
+            self.out.append(self.get_starttag_text())
+            return
+        self._flush(tag)
+        self.out.append(self._tag(tag, self.get_starttag_text()))
+        self.previous_tag = tag
+
+    def handle_endtag(self, tag):
+        if self.preserve:
+            if tag == self.preserve[-1]:
+                self.preserve.pop()
+            self.out.append(f"</{tag}>")
+            if not self.preserve:
+                self.previous_tag = tag
+            return
+        self._flush(tag)
+        self.out.append(f"</{tag}>")
+        self.previous_tag = tag
+        if tag == "head":
+            self.in_head = False
+        elif tag == "style":
+            self.in_style = False
+
+    # Comments and declarations
+
+    def handle_comment(self, data):
+        if self.preserve:
+            self.out.append(f"<!--{data}-->")
+            return
+        conditional = data.startswith('[if') or data.endswith('<![endif]')
+        if conditional or not self.options["remove_comments"]:
+            self._flush(None)
+            self.out.append(f"<!--{data}-->")
+        else:
+            self.comments_removed += 1
+
+    def handle_decl(self, decl):
+        self._flush(None)
+        self.out.append(f"<!{decl}>")
+
+    def unknown_decl(self, data):
+        # Downlevel-revealed conditionals (<![if !IE]>) and CDATA sections
+        self._flush(None)
+        self.out.append(f"<![{data}]>")
+
+    def handle_pi(self, data):
+        self._flush(None)
+        self.out.append(f"<?{data}>")
+
+    def output(self) -> str:
+        self.close()
+        self._flush(None)
+        return ''.join(self.out)
+
+
+def minify_html(html: str, options: Optional[Dict] = None) -> Tuple[str, int]:
+    """(minified html, comments removed) in one streaming pass"""
+    minifier = HTMLMinifier(options)
+    for start in range(0, len(html), FEED_CHUNK):
+        minifier.feed(html[start:start + FEED_CHUNK])
+    return minifier.output(), minifier.comments_removed
+
+
+def run(context, options: Dict) -> Dict:
+    """Export stage: minify every exported page"""
+    options = dict(DEFAULT_OPTIONS, **options)
+    stats = {"title": "HTML", "pages": {}, "bytes_before": 0, "bytes_after": 0, "comments": 0}
+    for page in context.files("html"):
+        html = context.read_text(page)
+        minified, comments = minify_html(html, options)
+        before, after = len(html.encode('utf-8')), len(minified.encode('utf-8'))
+        stats["pages"][page] = {"before": before, "after": after, "saved": before - after}
+        stats["bytes_before"] += before
+        stats["bytes_after"] += after
+        stats["comments"] += comments
+        if minified != html:
+            context.write(page, minified)
+
+    saved = stats["bytes_before"] - stats["bytes_after"]
+    per_page = ", ".join(f"{page} -{info['saved'] / 1024:.1f} KB" for page, info in stats["pages"].items())
+    stats["message"] = (f"{len(stats['pages'])} pages {stats['bytes_before'] / 1024:.1f} KB -> "
+                        f"{stats['bytes_after'] / 1024:.1f} KB ({saved / 1024:.1f} KB saved, "
+                        f"{stats['comments']} comments removed){': ' + per_page if per_page else ''}")
+    return stats
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+HTML Tag Helpers
+Small regex-based helpers the export stages use to find and edit start tags
+without a full HTML parser: attribute parsing, insertion and replacement,
+and removing a tag together with the line it sat on.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+ATTRIBUTE = re.compile(r'''([^\s=/>]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s>]+))?''')
+
+# Stylesheet-relevant markup in document order; comments and <noscript> are matched
+# so that tags inside them can be skipped
+HEAD_MARKUP = re.compile(r'<!--.*?-->|<noscript\b.*?</noscript>|<style\b.*?</style>|<link\b[^>]*>',
+                         re.IGNORECASE | re.DOTALL)
+IMG_TAG = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+SCRIPT_ELEMENT = re.compile(r'(<script\b[^>]*>)(.*?)</script\s*>', re.IGNORECASE | re.DOTALL)
+# <script type> values that browsers execute as classic or module scripts
+SCRIPT_TYPES = ("", "text/javascript", "application/javascript", "module")
+
+
+def parse_attributes(tag: str) -> Dict[str, Optional[str]]:
+    """Attributes of a start tag (names lower-cased, values unquoted)"""
+    body = re.sub(r'^<[^\s>/]+', '', tag).rstrip('>').rstrip('/')
+    attributes = {}
+    for name, value in ATTRIBUTE.findall(body):
+        if value[:1] in ('"', "'"):
+            value = value[1:-1]
+        attributes[name.lower()] = value if value != '' else None
+    return attributes
+
+
+def add_attributes(tag: str, extra: List[Tuple[str, str]]) -> str:
+    """Append attributes before the end of a start tag"""
+    if not extra:
+        return tag
+    end = '/>' if tag.endswith('/>') else '>'
+    head = tag[:-len(end)].rstrip()
+    added = ''.join(f' {name}="{value}"' if value is not None else f' {name}' for name, value in extra)
+    return f"{head}{added}{' ' if end == '/>' else ''}{end}"
+
+
+def set_attribute(tag: str, name: str, value: str) -> str:
+    """Replace the value of an existing attribute (or append it)"""
+    pattern = re.compile(r'(\s%s\s*=\s*)("[^"]*"|\'[^\']*\'|[^\s>]+)' % re.escape(name), re.IGNORECASE)
+    if pattern.search(tag):
+        return pattern.sub(lambda m: f'{m.group(1)}"{value}"', tag, count=1)
+    return add_attributes(tag, [(name, value)])
+
+
+def tag_line_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    """Widen a tag's span to its whole line when nothing else is on that line"""
+    line_start = text.rfind('\n', 0, start) + 1
+    line_end = text.find('\n', end)
+    line_end = len(text) if line_end == -1 else line_end
+    if text[line_start:start].strip() or text[end:line_end].strip():
+        return start, end
+    return line_start, min(line_end + 1, len(text))
+
+
+def is_script(attributes: Dict[str, Optional[str]]) -> bool:
+    """True for <script> elements the browser executes (not JSON, templates, ...)"""
+    return (attributes.get("type") or "").strip().lower() in SCRIPT_TYPES
+
+
+def is_stylesheet(attributes: Dict[str, Optional[str]]) -> bool:
+    rel = (attributes.get("rel") or "").lower().split()
+    return "stylesheet" in rel and "alternate" not in rel and attributes.get("href") is not None
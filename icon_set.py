@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Icon Set Generator
+Renders every favicon, touch icon and web app manifest icon from one master
+image (SVG needs cairosvg; a raster image with the same name is used
+otherwise), then rewrites manifest.json and the icon <link> tags of the pages.
+Outputs are cached by the hash of the master and the options, so re-running
+on an unchanged logo only relinks the files.
+"""
+
+import os
+import io
+import re
+import json
+import shutil
+import hashlib
+import importlib.util
+import posixpath
+from typing import Dict, List, Optional
+
+from file_index import CACHE_DIR_NAME, get_file_index, hash_file
+from image_optimize import encode_png
+
+ICONS_CACHE_DIR_NAME = "icons"
+# Bumped whenever the rendered set changes, so cached icons are re-rendered
+ICON_VERSION = 2
+ICON_DIR = "images/icons"
+WEB_MANIFEST = "manifest.json"
+FAVICON = "favicon.ico"
+FAVICON_SIZES = [16, 32, 48]
+SVG_RENDER_SIZE = 1024
+# Maskable icons keep the logo inside the central safe zone (a circle of 80% diameter)
+MASKABLE_SCALE = 0.6
+# Icons may become 256-colour palette PNGs when no channel is off by more than this on average
+ICON_MAX_ERROR = 2.0
+
+# name -> (size, purpose, opaque background)
+ICONS = {
+    "favicon-16.png": (16, None, False),
+    "favicon-32.png": (32, None, False),
+    # iOS fills transparency with black
+    "apple-touch-icon.png": (180, None, True),
+    "icon-192.png": (192, "any", False),
+    "icon-512.png": (512, "any", False),
+    "icon-maskable-192.png": (192, "maskable", True),
+    "icon-maskable-512.png": (512, "maskable", True),
+}
+
+ICON_LINK = re.compile(r'[ \t]*<link\b[^>]*\brel\s*=\s*["\']?(?:shortcut icon|alternate icon|icon|apple-touch-icon'
+                       r'|apple-touch-icon-precomposed|mask-icon)["\'\s>][^>]*>[ \t]*\n?', re.IGNORECASE)
+TILE_IMAGE = re.compile(r'(<meta\b[^>]*\bname\s*=\s*["\']msapplication-TileImage["\'][^>]*\bcontent\s*=\s*["\'])'
+                        r'[^"\']*', re.IGNORECASE)
+
+
+def _load_master(path: str):
+    """Master image as RGBA; SVG is rasterized with cairosvg"""
+    from PIL import Image
+
+    if path.lower().endswith('.svg'):
+        import cairosvg
+        png = cairosvg.svg2png(url=path, output_width=SVG_RENDER_SIZE)
+        return Image.open(io.BytesIO(png)).convert("RGBA")
+    with Image.open(path) as image:
+        return image.convert("RGBA")
+
+
+def _svg_rasterizer() -> bool:
+    return importlib.util.find_spec("cairosvg") is not None
+
+
+def raster_fallback(template_path: str, rel_path: str) -> Optional[str]:
+    """A PNG/JPEG/WebP next to an SVG master with the same name (any case)"""
+    folder, name = posixpath.split(rel_path)
+    stem = posixpath.splitext(name)[0].lower()
+    index = get_file_index(template_path)
+    candidates = [p for p in index.paths("image") if posixpath.dirname(p) == folder and
+                  posixpath.splitext(posixpath.basename(p))[0].lower() == stem and
+                  p.lower().endswith((".png", ".jpg", ".jpeg", ".webp"))]
+    return sorted(candidates, key=lambda p: (not p.lower().endswith(".png"), p))[0] if candidates else None
+
+
+def _square(master, size: int, scale: float, background: Optional[str]):
+    """Master fitted into a size x size square, centred, on background or transparency"""
+    from PIL import Image
+
+    canvas = Image.new("RGBA", (size, size), background or (0, 0, 0, 0))
+    box = max(1, round(size * scale))
+    ratio = min(box / master.width, box / master.height)
+    width, height = max(1, round(master.width * ratio)), max(1, round(master.height * ratio))
+    logo = master.resize((width, height), Image.LANCZOS)
+    canvas.alpha_composite(logo, ((size - width) // 2, (size - height) // 2))
+    return canvas if background is None else canvas.convert("RGB")
+
+
+def _render(master_path: str, target_dir: str, background: str, padding: float):
+    """Render the whole set into target_dir (written atomically as a directory)"""
+    master = _load_master(master_path)
+    temp_dir = f"{target_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    for name, (size, purpose, opaque) in ICONS.items():
+        scale = MASKABLE_SCALE if purpose == "maskable" else 1 - 2 * padding
+        image = _square(master, size, scale, background if opaque else None)
+        with open(os.path.join(temp_dir, name), 'wb') as f:
+            f.write(encode_png(image, ICON_MAX_ERROR))
+    largest = _square(master, max(FAVICON_SIZES), 1 - 2 * padding, None)
+    largest.save(os.path.join(temp_dir, FAVICON), "ICO", sizes=[(s, s) for s in FAVICON_SIZES])
+    shutil.rmtree(target_dir, ignore_errors=True)
+    os.replace(temp_dir, target_dir)
+
+
+def _install(source: str, target: str) -> bool:
+    """Copy a cached icon into the template unless it is already identical"""
+    if os.path.isfile(target) and hash_file(target) == hash_file(source):
+        return False
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temp_path = f"{target}.{os.getpid()}.tmp"
+    shutil.copy2(source, temp_path)
+    os.replace(temp_path, target)
+    return True
+
+
+def _write_text(path: str, text: str) -> bool:
+    """Atomically replace path with text unless it already has it"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == text:
+                return False
+    except OSError:
+        pass
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
+    return True
+
+
+def _manifest_icons(version: str) -> List[Dict]:
+    icons = []
+    for name, (size, purpose, _) in ICONS.items():
+        if purpose:
+            icons.append({"src": f"{ICON_DIR}/{name}?v={version}", "sizes": f"{size}x{size}",
+                          "type": "image/png", "purpose": purpose})
+    return icons
+
+
+def _link_tags(page: str, master: str, version: str, mask_color: str) -> List[str]:
+    def href(rel_path: str) -> str:
+        return f"{posixpath.relpath(rel_path, posixpath.dirname(page) or '.')}?v={version}"
+
+    # sizes on the .ico keeps browsers that understand SVG from preferring it
+    tags = [f'<link rel="icon" href="{href(FAVICON)}" sizes="32x32">']
+    if master.lower().endswith('.svg'):
+        tags.append(f'<link rel="icon" type="image/svg+xml" href="{href(master)}">')
+    tags += [f'<link rel="icon" type="image/png" sizes="32x32" href="{href(ICON_DIR + "/favicon-32.png")}">',
+             f'<link rel="icon" type="image/png" sizes="16x16" href="{href(ICON_DIR + "/favicon-16.png")}">',
+             f'<link rel="apple-touch-icon" sizes="180x180" href="{href(ICON_DIR + "/apple-touch-icon.png")}">']
+    if master.lower().endswith('.svg'):
+        # Safari pinned tabs use the SVG as a mask filled with this colour
+        tags.append(f'<link rel="mask-icon" href="{href(master)}" color="{mask_color}">')
+    return tags
+
+
+def _rewrite_page(html: str, tags: List[str], tile_image: str) -> str:
+    """Replace the page's icon links with tags, at the position of the first one"""
+    matches = list(ICON_LINK.finditer(html))
+    if not matches:
+        return html
+    indent = re.match(r'[ \t]*', matches[0].group(0)).group(0)
+    block = ''.join(f"{indent}{tag}\n" for tag in tags)
+    for match in reversed(matches[1:]):
+        html = html[:match.start()] + html[match.end():]
+    first = matches[0]
+    html = html[:first.start()] + block + html[first.end():]
+    return TILE_IMAGE.sub(lambda m: m.group(1) + tile_image, html)
+
+
+def generate_icons(template_path: str, source: str, background: Optional[str] = None,
+                   padding: float = 0.0, pages: Optional[List[str]] = None, task=None) -> Dict:
+    """Render the icon set from the master image source (template-relative) and
+    point manifest.json and the pages' icon links at it.
+
+    background fills the opaque icons (default: the manifest's background_color).
+    Returns a report dict; raises ValueError when the master cannot be used.
+    """
+    template_path = os.path.abspath(template_path)
+    index = get_file_index(template_path)
+    index.refresh()
+    master = source
+    notes = []
+    if not os.path.isfile(os.path.join(template_path, master)):
+        raise ValueError(f"Master image not found: {source}")
+    if master.lower().endswith('.svg') and not _svg_rasterizer():
+        fallback = raster_fallback(template_path, master)
+        if fallback is None:
+            raise ValueError(f"Rendering {source} needs cairosvg (pip install cairosvg); "
+                             f"or choose a PNG master image")
+        notes.append(f"cairosvg is not installed; rendered from {fallback}")
+        master = fallback
+
+    manifest_path = os.path.join(template_path, WEB_MANIFEST)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    background = background or manifest.get("background_color") or "#FFFFFF"
+    mask_color = manifest.get("theme_color") or "#000000"
+
+    options = [ICON_VERSION, background, padding, sorted(ICONS.items()), FAVICON_SIZES]
+    digest = hashlib.sha256((hash_file(os.path.join(template_path, master)) +
+                             json.dumps(options)).encode('utf-8')).hexdigest()
+    cache_dir = os.path.join(template_path, CACHE_DIR_NAME, ICONS_CACHE_DIR_NAME, digest[:2], digest)
+    cached = os.path.isdir(cache_dir)
+    if not cached:
+        if task is not None:
+            task.report(0, message=f"Rendering icons from {master}")
+        _render(os.path.join(template_path, master), cache_dir, background, padding)
+    try:
+        from PIL import Image
+        with Image.open(os.path.join(template_path, master)) as image:
+            if min(image.size) < max(size for size, _, _ in ICONS.values()):
+                notes.append(f"{master} is {image.width}x{image.height}; larger icons are upscaled")
+    except (ImportError, OSError):
+        pass
+
+    version = digest[:8]
+    written = []
+    for name in list(ICONS) + [FAVICON]:
+        rel_path = FAVICON if name == FAVICON else f"{ICON_DIR}/{name}"
+        if _install(os.path.join(cache_dir, name), os.path.join(template_path, *rel_path.split('/'))):
+            written.append(rel_path)
+
+    manifest["icons"] = _manifest_icons(version)
+    text = json.dumps(manifest, indent=2, ensure_ascii=False) + "\n"
+    updated = []
+    if _write_text(manifest_path, text):
+        updated.append(WEB_MANIFEST)
+
+    if pages is None:
+        from site_export import deployable_files
+        pages = [p for p in deployable_files(index) if p.endswith(('.html', '.htm'))]
+    for page in pages:
+        path = os.path.join(template_path, *page.split('/'))
+        with open(path, 'r', encoding='utf-8') as f:
+            html = f.read()
+        tile_image = posixpath.relpath(f"{ICON_DIR}/icon-192.png", posixpath.dirname(page) or '.')
+        rewritten = _rewrite_page(html, _link_tags(page, source, version, mask_color), tile_image)
+        if _write_text(path, rewritten):
+            updated.append(page)
+
+    return {"source": source, "rendered_from": master, "cached": cached, "version": version,
+            "icons": len(ICONS) + 1, "written": written, "updated": updated, "notes": notes}
+
+
+def describe_icons(report: Dict) -> List[str]:
+    """Human readable report lines"""
+    lines = [f"{report['icons']} icons from {report['rendered_from']}"
+             f"{' (cached)' if report['cached'] else ''}: {len(report['written'])} written, "
+             f"{len(report['updated'])} files updated"
+             + (f" ({', '.join(report['updated'])})" if report['updated'] else "")]
+    lines += [f"Note: {note}" for note in report["notes"]]
+    return lines
+
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Image Cache
+Two-level thumbnail cache (in-memory LRU plus on-disk) and an image metadata
+index for the editors' image gallery. Entries are keyed by path, mtime and size,
+so edited files are picked up automatically.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from file_index import CACHE_DIR_NAME
+from image_probe import probe_image
+
+THUMBNAIL_SIZE = (200, 200)
+MEMORY_CACHE_ITEMS = 64
+META_FILE_NAME = "image_meta.json"
+THUMBS_DIR_NAME = "thumbs"
+# Bumped when the metadata source changes so old entries are probed again
+META_VERSION = 2
+
+# Formats PIL cannot rasterise; they get metadata but no thumbnail
+VECTOR_EXTENSIONS = ('.svg',)
+
+
+def _load_pil():
+    """Import Pillow lazily so the cache works (metadata only) without it"""
+    try:
+        from PIL import Image
+        return Image
+    except ImportError:
+        return None
+
+
+class ImageCache:
+    """Thumbnail and metadata cache for the images of one template"""
+
+    def __init__(self, root: str, cache_dir: Optional[str] = None,
+                 thumb_size: Tuple[int, int] = THUMBNAIL_SIZE,
+                 memory_items: int = MEMORY_CACHE_ITEMS):
+        self.root = os.path.abspath(root)
+        self.cache_dir = cache_dir or os.path.join(self.root, CACHE_DIR_NAME)
+        self.thumbs_dir = os.path.join(self.cache_dir, THUMBS_DIR_NAME)
+        self.meta_file = os.path.join(self.cache_dir, META_FILE_NAME)
+        self.thumb_size = thumb_size
+        self.memory_items = memory_items
+        self.lock = threading.RLock()
+
+        self.thumbnails: "OrderedDict[str, object]" = OrderedDict()
+        self.metadata: Dict[str, Dict] = {}
+        self.meta_dirty = False
+        self.load_metadata()
+
+    # Keys
+
+    def _stat(self, rel_path: str) -> Optional[os.stat_result]:
+        try:
+            return os.stat(os.path.join(self.root, rel_path))
+        except OSError:
+            return None
+
+    def _key(self, rel_path: str, st: os.stat_result) -> str:
+        raw = f"{rel_path}|{st.st_mtime_ns}|{st.st_size}|{self.thumb_size[0]}x{self.thumb_size[1]}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    # Metadata index
+
+    def load_metadata(self):
+        """Load the persisted metadata index"""
+        try:
+            with open(self.meta_file, 'r', encoding='utf-8') as f:
+                self.metadata = json.load(f)
+        except (OSError, ValueError):
+            self.metadata = {}
+
+    def save_metadata(self):
+        """Persist the metadata index if it changed"""
+        with self.lock:
+            if not self.meta_dirty:
+                return
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_file = self.meta_file + ".tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.metadata, f, indent=1)
+            os.replace(tmp_file, self.meta_file)
+            self.meta_dirty = False
+
+    def get_metadata(self, rel_path: str) -> Optional[Dict]:
+        """Return {"width", "height", "format", "bytes"} from the file header only"""
+        st = self._stat(rel_path)
+        if st is None:
+            return None
+
+        with self.lock:
+            meta = self.metadata.get(rel_path)
+            if (meta and meta.get("version") == META_VERSION and
+                    meta["mtime_ns"] == st.st_mtime_ns and meta["bytes"] == st.st_size):
+                return meta
+
+            meta = {
+                "width": None,
+                "height": None,
+                "format": os.path.splitext(rel_path)[1].lstrip('.').upper() or None,
+                "bytes": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "version": META_VERSION,
+            }
+            # Header-only probe: no Pillow import, no pixel decode
+            probed = probe_image(os.path.join(self.root, rel_path), st)
+            if probed is not None:
+                meta.update(probed)
+
+            self.metadata[rel_path] = meta
+            self.meta_dirty = True
+            return meta
+
+    def total_bytes(self, rel_paths) -> int:
+        """Sum of image sizes from the metadata index"""
+        total = 0
+        for rel_path in rel_paths:
+            meta = self.get_metadata(rel_path)
+            if meta:
+                total += meta["bytes"]
+        return total
+
+    # Thumbnails
+
+    def thumbnail(self, rel_path: str):
+        """Return a PIL thumbnail for an image, or None if it cannot be rendered"""
+        if rel_path.lower().endswith(VECTOR_EXTENSIONS):
+            return None
+        Image = _load_pil()
+        st = self._stat(rel_path)
+        if Image is None or st is None:
+            return None
+
+        key = self._key(rel_path, st)
+        with self.lock:
+            image = self.thumbnails.get(key)
+            if image is not None:
+                self.thumbnails.move_to_end(key)
+                return image
+
+        disk_path = os.path.join(self.thumbs_dir, key[:2], key + ".png")
+        image = None
+        if os.path.exists(disk_path):
+            try:
+                image = Image.open(disk_path)
+                image.load()
+            except Exception:
+                image = None
+
+        if image is None:
+            image = self._render_thumbnail(Image, rel_path)
+            if image is None:
+                return None
+            try:
+                os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+                tmp_path = disk_path + ".tmp"
+                image.save(tmp_path, "PNG")
+                os.replace(tmp_path, disk_path)
+            except OSError:
+                pass
+
+        with self.lock:
+            self.thumbnails[key] = image
+            while len(self.thumbnails) > self.memory_items:
+                self.thumbnails.popitem(last=False)
+        return image
+
+    def _render_thumbnail(self, Image, rel_path: str):
+        """Decode and downsample an image, using JPEG draft mode when possible"""
+        try:
+            with Image.open(os.path.join(self.root, rel_path)) as image:
+                # Let the JPEG decoder scale by 1/2..1/8 instead of decoding full size
+                image.draft("RGB", self.thumb_size)
+                if image.mode not in ("RGB", "RGBA"):
+                    image = image.convert("RGBA")
+                image.thumbnail(self.thumb_size, Image.Resampling.LANCZOS)
+                return image.copy()
+        except Exception:
+            return None
+
+    def invalidate(self, rel_path: str):
+        """Forget metadata for a path (thumbnails are keyed by mtime/size)"""
+        with self.lock:
+            if self.metadata.pop(rel_path, None) is not None:
+                self.meta_dirty = True
+
+
+_caches: Dict[str, ImageCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_image_cache(root: str) -> ImageCache:
+    """Return the shared ImageCache for a template directory"""
+    root = os.path.abspath(root)
+    with _caches_lock:
+        cache = _caches.get(root)
+        if cache is None:
+            cache = _caches[root] = ImageCache(root)
+        return cache
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Image Optimizer
+Recompresses every image the site references in a process pool: PNG and GIF
+losslessly, JPEG perceptually (quality 85, progressive), and writes a WebP
+sibling next to each raster image when it is smaller. Originals are moved to
+a sidecar folder first so the whole pass can be undone with restore_originals().
+Files are replaced atomically, never rewritten in place (exports may hardlink them).
+"""
+
+import os
+import json
+import time
+import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from file_index import get_file_index, hash_file
+
+SIDECAR_DIR_NAME = ".image_originals"
+MANIFEST_FILE_NAME = "manifest.json"
+REPORT_FILE_NAME = "report.json"
+
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+OPTIMIZABLE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif")
+
+
+def _sidecar(template_path: str, *parts: str) -> str:
+    return os.path.join(template_path, SIDECAR_DIR_NAME, *parts)
+
+
+def load_manifest(template_path: str) -> Dict[str, Dict]:
+    """Optimized images: {rel_path: {original_hash, optimized_hash, before, after, webp}}"""
+    try:
+        with open(_sidecar(template_path, MANIFEST_FILE_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json(path: str, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_file = path + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_file, path)
+
+
+def webp_sibling(rel_path: str) -> str:
+    """images/photo.jpg -> images/photo.webp"""
+    return os.path.splitext(rel_path)[0] + ".webp"
+
+
+def referenced_images(template_path: str) -> List[str]:
+    """Raster images referenced by the deployable pages and stylesheets"""
+    from site_graph import build_graph
+
+    index = get_file_index(template_path)
+    graph = build_graph(template_path)
+    images = set()
+    for node in graph.files():
+        entry = index.files.get(node)
+        if entry and entry["type"] == "image" and node.lower().endswith(OPTIMIZABLE_EXTENSIONS):
+            images.add(node)
+    return sorted(images)
+
+
+def _replace_with(path: str, data: bytes, like: str):
+    """Atomically replace path with data, keeping the mode of like"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    try:
+        os.chmod(temp_path, os.stat(like).st_mode & 0o7777)
+    except OSError:
+        pass
+    os.replace(temp_path, path)
+
+
+def _encode(image, fmt: str, **params) -> bytes:
+    from io import BytesIO
+    buffer = BytesIO()
+    image.save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+def encode_png(image, max_error: float = 0.0, **params) -> bytes:
+    """Smallest PNG encoding of image: as is, or as a 256-colour palette image.
+
+    The palette is used when it is exact or, with max_error, when no channel
+    differs from the original by more than max_error (0-255) on average.
+    """
+    from PIL import Image, ImageChops, ImageStat
+
+    best = _encode(image, "PNG", optimize=True, **params)
+    if image.mode not in ("RGB", "RGBA") or (max_error <= 0 and image.getcolors(256) is None):
+        return best
+    candidate = image.quantize(colors=256, method=Image.Quantize.FASTOCTREE
+                               if image.mode == "RGBA" else Image.Quantize.MEDIANCUT)
+    restored = candidate.convert(image.mode)
+    if restored.tobytes() != image.tobytes() and (
+            max_error <= 0 or max(ImageStat.Stat(ImageChops.difference(image, restored)).mean) > max_error):
+        return best
+    data = _encode(candidate, "PNG", optimize=True, **params)
+    return data if len(data) < len(best) else best
+
+
+def _optimize_one(source: str, make_webp: bool) -> Dict:
+    """Recompress source and optionally encode a WebP copy (worker process).
+
+    Nothing is written here; the parent decides what to keep.
+    """
+    from PIL import Image, ImageOps
+
+    result = {"optimized": None, "webp": None}
+    with Image.open(source) as image:
+        fmt = image.format
+        original = image
+        if getattr(image, "is_animated", False):
+            return result
+        info = {k: image.info[k] for k in ("icc_profile", "exif") if k in image.info}
+
+        if fmt == "JPEG":
+            if image.mode not in ("RGB", "L", "CMYK"):
+                image = image.convert("RGB")
+            result["optimized"] = _encode(image, "JPEG", quality=JPEG_QUALITY, optimize=True,
+                                          progressive=True, **info)
+        elif fmt == "PNG":
+            result["optimized"] = encode_png(
+                image, **({"icc_profile": info["icc_profile"]} if "icc_profile" in info else {}))
+        elif fmt == "GIF":
+            result["optimized"] = _encode(image, "GIF", optimize=True)
+
+        if make_webp:
+            # The WebP carries no EXIF, so its pixels must already be upright
+            upright = ImageOps.exif_transpose(original)
+            if upright.mode in ("P", "LA", "PA") or "transparency" in upright.info:
+                rgb = upright.convert("RGBA")
+            elif upright.mode not in ("RGB", "RGBA"):
+                rgb = upright.convert("RGB")
+            else:
+                rgb = upright
+            if fmt == "JPEG":
+                result["webp"] = _encode(rgb, "WEBP", quality=WEBP_QUALITY, method=6)
+            else:
+                result["webp"] = _encode(rgb, "WEBP", lossless=True, method=6)
+    return result
+
+
+def all_images(template_path: str) -> List[str]:
+    """Every optimizable raster image in the template, referenced or not"""
+    return [p for p in get_file_index(template_path).paths("image")
+            if p.lower().endswith(OPTIMIZABLE_EXTENSIONS)]
+
+
+def optimize_images(template_path: str, paths: Optional[List[str]] = None, webp: bool = True,
+                    workers: Optional[int] = None, task=None) -> Dict:
+    """Optimize images (default: all referenced ones) and return a byte-savings report.
+
+    Images already optimized and unchanged since are skipped. Originals are
+    kept in SIDECAR_DIR_NAME; the report is also written there as report.json.
+    task is an optional ui_dispatch.Task used for progress and cancellation.
+    """
+    started = time.perf_counter()
+    template_path = os.path.abspath(template_path)
+    manifest = load_manifest(template_path)
+    paths = referenced_images(template_path) if paths is None else paths
+
+    jobs, entries = [], []
+    for rel_path in paths:
+        source = os.path.join(template_path, rel_path)
+        if not os.path.isfile(source):
+            continue
+        current_hash = hash_file(source)
+        entry = manifest.get(rel_path)
+        if entry and entry.get("optimized_hash") == current_hash:
+            entries.append(dict(entry, path=rel_path, status="unchanged"))
+            continue
+        webp_rel = webp_sibling(rel_path) if webp else None
+        if webp_rel is not None and webp_rel in paths:
+            webp_rel = None
+        jobs.append((rel_path, current_hash, webp_rel))
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs) or 1))
+    # The editors call this from a worker thread; forking a threaded process is unsafe
+    executor = (ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+                if workers > 1 else None)
+    try:
+        if executor is not None:
+            futures = [executor.submit(_optimize_one, os.path.join(template_path, rel), w is not None)
+                       for rel, _, w in jobs]
+            results = (f.result() for f in futures)
+        else:
+            results = (_optimize_one(os.path.join(template_path, rel), w is not None)
+                       for rel, _, w in jobs)
+
+        for i, ((rel_path, original_hash, webp_rel), result) in enumerate(zip(jobs, results)):
+            if task is not None:
+                task.check_cancelled()
+                task.report(i, len(jobs), rel_path)
+            entries.append(_apply_result(template_path, manifest, rel_path, original_hash,
+                                         webp_rel, result))
+            _write_json(_sidecar(template_path, MANIFEST_FILE_NAME), manifest)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    report = {
+        "images": sorted(entries, key=lambda e: e["path"]),
+        "before": sum(e["before"] for e in entries),
+        "after": sum(e["after"] for e in entries),
+        "webp_bytes": sum(e.get("webp_bytes") or 0 for e in entries),
+        "optimized": sum(1 for e in entries if e["status"] == "optimized"),
+        "workers": workers,
+        "elapsed": time.perf_counter() - started,
+    }
+    _write_json(_sidecar(template_path, REPORT_FILE_NAME), report)
+    if task is not None:
+        task.report(len(jobs), len(jobs))
+    return report
+
+
+def _apply_result(template_path: str, manifest: Dict, rel_path: str, original_hash: str,
+                  webp_rel: Optional[str], result: Dict) -> Dict:
+    """Keep the original in the sidecar and install smaller outputs"""
+    source = os.path.join(template_path, rel_path)
+    before = os.path.getsize(source)
+    # Only changed files get here: an earlier entry describes a file that was since
+    # replaced, so its backup and WebP sibling are stale and source is the new original
+    previous = manifest.pop(rel_path, None)
+    if previous is not None:
+        backup = _sidecar(template_path, *rel_path.split('/'))
+        if os.path.isfile(backup):
+            os.remove(backup)
+    entry = {"path": rel_path, "original_hash": original_hash, "before": before,
+             "after": before, "webp": None, "webp_bytes": None, "status": "kept"}
+
+    optimized = result["optimized"]
+    if optimized is not None and len(optimized) < before:
+        backup = _sidecar(template_path, *rel_path.split('/'))
+        os.makedirs(os.path.dirname(backup), exist_ok=True)
+        shutil.copy2(source, backup)
+        _replace_with(source, optimized, source)
+        entry.update(after=len(optimized), status="optimized")
+
+    webp_data = result["webp"]
+    if webp_rel is not None and webp_data is not None and len(webp_data) < entry["after"]:
+        _replace_with(os.path.join(template_path, webp_rel), webp_data, source)
+        entry.update(webp=webp_rel, webp_bytes=len(webp_data))
+
+    if previous is not None and previous.get("webp") and previous["webp"] != entry["webp"]:
+        try:
+            os.remove(os.path.join(template_path, previous["webp"]))
+        except OSError:
+            pass
+
+    if entry["status"] == "optimized" or entry["webp"]:
+        entry["optimized_hash"] = hash_file(source)
+        manifest[rel_path] = {k: v for k, v in entry.items() if k not in ("path", "status")}
+    return entry
+
+
+def restore_originals(template_path: str, paths: Optional[List[str]] = None) -> List[str]:
+    """Undo optimize_images: put originals back and remove generated WebP files.
+
+    Returns the restored paths.
+    """
+    template_path = os.path.abspath(template_path)
+    manifest = load_manifest(template_path)
+    restored = []
+    for rel_path in list(paths if paths is not None else manifest):
+        entry = manifest.pop(rel_path, None)
+        if entry is None:
+            continue
+        target = os.path.join(template_path, rel_path)
+        backup = _sidecar(template_path, *rel_path.split('/'))
+        if os.path.isfile(backup):
+            temp_path = f"{target}.{os.getpid()}.tmp"
+            shutil.copy2(backup, temp_path)
+            os.replace(temp_path, target)
+            os.remove(backup)
+        if entry.get("webp"):
+            try:
+                os.remove(os.path.join(template_path, entry["webp"]))
+            except OSError:
+                pass
+        restored.append(rel_path)
+    _write_json(_sidecar(template_path, MANIFEST_FILE_NAME), manifest)
+    return restored
+
+
+def describe_report(report: Dict) -> List[str]:
+    """Human readable report lines: one per image plus a total"""
+    lines = []
+    for entry in report["images"]:
+        webp = f", webp {entry['webp_bytes'] / 1024:.0f} KB" if entry.get("webp") else ""
+        lines.append(f"{entry['path']}: {entry['before'] / 1024:.0f} KB -> "
+                     f"{entry['after'] / 1024:.0f} KB{webp} ({entry['status']})")
+    saved = report["before"] - report["after"]
+    percent = saved * 100 / report["before"] if report["before"] else 0
+    lines.append(f"Optimized {report['optimized']} of {len(report['images'])} images: "
+                 f"{report['before'] / 1024:.0f} KB -> {report['after'] / 1024:.0f} KB "
+                 f"(saved {saved / 1024:.0f} KB, {percent:.0f}%), WebP siblings "
+                 f"{report['webp_bytes'] / 1024:.0f} KB, in {report['elapsed']:.1f} s")
+    return lines
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Image Dimension Probe
+Reads intrinsic width/height from the first bytes of JPEG, PNG, GIF, WebP,
+ICO and SVG files without decoding pixels or importing Pillow. JPEG sizes
+honour the EXIF orientation, like browsers do. Results are memoized by path,
+mtime and size.
+"""
+
+import os
+import re
+import struct
+import threading
+from typing import Dict, Optional, Tuple
+
+# SVG root elements are expected within this many bytes
+SVG_HEAD_BYTES = 4096
+# Only this much of an EXIF segment is read to find the orientation tag
+EXIF_HEAD_BYTES = 4096
+
+_memo: Dict[str, Tuple[int, int, Optional[Dict]]] = {}
+_memo_lock = threading.Lock()
+
+
+def _jpeg_orientation(exif: bytes) -> int:
+    """Orientation tag (1-8) from the start of an APP1 Exif payload"""
+    if not exif.startswith(b'Exif\0\0') or len(exif) < 14:
+        return 1
+    tiff = exif[6:]
+    endian = '<' if tiff[:2] == b'II' else '>'
+    try:
+        ifd_offset = struct.unpack(endian + 'I', tiff[4:8])[0]
+        count = struct.unpack(endian + 'H', tiff[ifd_offset:ifd_offset + 2])[0]
+        for i in range(count):
+            entry = ifd_offset + 2 + i * 12
+            tag, _, _, value = struct.unpack(endian + 'HHI4s', tiff[entry:entry + 12])
+            if tag == 0x0112:
+                return struct.unpack(endian + 'H', value[:2])[0]
+    except struct.error:
+        pass
+    return 1
+
+
+def _probe_jpeg(f) -> Optional[Tuple[int, int]]:
+    f.seek(2)
+    orientation = 1
+    while True:
+        byte = f.read(1)
+        while byte and byte != b'\xff':
+            byte = f.read(1)
+        while byte == b'\xff':
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            continue
+        header = f.read(2)
+        if len(header) < 2:
+            return None
+        length = struct.unpack('>H', header)[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack('>HH', data[1:5])
+            return (height, width) if orientation >= 5 else (width, height)
+        if marker == 0xE1 and orientation == 1:
+            segment = f.read(min(length - 2, EXIF_HEAD_BYTES))
+            orientation = _jpeg_orientation(segment)
+            f.seek(length - 2 - len(segment), os.SEEK_CUR)
+        else:
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def _probe_webp(head: bytes) -> Optional[Tuple[int, int]]:
+    chunk = head[12:16]
+    if chunk == b'VP8 ' and len(head) >= 30:
+        width, height = struct.unpack('<HH', head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and len(head) >= 25:
+        bits = struct.unpack('<I', head[21:25])[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X' and len(head) >= 30:
+        return (int.from_bytes(head[24:27], 'little') + 1,
+                int.from_bytes(head[27:30], 'little') + 1)
+    return None
+
+
+def _probe_ico(head: bytes) -> Optional[Tuple[int, int]]:
+    count = struct.unpack('<H', head[4:6])[0]
+    best = None
+    for i in range(min(count, (len(head) - 6) // 16)):
+        width, height = head[6 + i * 16] or 256, head[7 + i * 16] or 256
+        if best is None or width * height > best[0] * best[1]:
+            best = (width, height)
+    return best
+
+
+SVG_TAG = re.compile(rb'<svg\b[^>]*>', re.IGNORECASE | re.DOTALL)
+SVG_LENGTH = re.compile(r'^\s*([0-9]*\.?[0-9]+(?:[eE][+-]?[0-9]+)?)\s*([a-zA-Z]*)\s*$')
+# CSS pixels per SVG length unit (em at the default 16px font size); percentages
+# depend on the container and fall back to the viewBox
+SVG_UNITS = {"": 1.0, "px": 1.0, "pt": 4 / 3, "pc": 16.0, "in": 96.0,
+             "cm": 96 / 2.54, "mm": 96 / 25.4, "q": 96 / 101.6, "em": 16.0}
+
+
+def _svg_attribute(tag: str, name: str) -> Optional[str]:
+    match = re.search(r'''\s%s\s*=\s*["']([^"']*)["']''' % name, tag)
+    return match.group(1) if match else None
+
+
+def _svg_length(value: Optional[str]) -> Optional[float]:
+    """An SVG width or height in CSS pixels, None if missing or relative"""
+    match = SVG_LENGTH.match(value) if value else None
+    if not match or match.group(2).lower() not in SVG_UNITS:
+        return None
+    return float(match.group(1)) * SVG_UNITS[match.group(2).lower()]
+
+
+def _probe_svg(head: bytes) -> Optional[Tuple[int, int]]:
+    match = SVG_TAG.search(head)
+    if not match:
+        return None
+    tag = match.group(0).decode('utf-8', errors='replace')
+    sizes = [_svg_length(_svg_attribute(tag, name)) for name in ('width', 'height')]
+    if all(sizes):
+        return round(sizes[0]), round(sizes[1])
+    view_box = _svg_attribute(tag, 'viewBox')
+    if view_box:
+        parts = view_box.replace(',', ' ').split()
+        if len(parts) == 4:
+            try:
+                return round(float(parts[2])), round(float(parts[3]))
+            except ValueError:
+                pass
+    return None
+
+
+def _probe(path: str) -> Optional[Dict]:
+    with open(path, 'rb') as f:
+        head = f.read(32)
+        if head.startswith(b'\xff\xd8'):
+            fmt, size = "JPEG", _probe_jpeg(f)
+        elif head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+            fmt, size = "PNG", struct.unpack('>II', head[16:24])
+        elif head[:6] in (b'GIF87a', b'GIF89a'):
+            fmt, size = "GIF", struct.unpack('<HH', head[6:10])
+        elif head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            fmt, size = "WEBP", _probe_webp(head)
+        elif head[:4] == b'\0\0\1\0':
+            head += f.read(16 * 16)
+            fmt, size = "ICO", _probe_ico(head)
+        else:
+            head += f.read(SVG_HEAD_BYTES - len(head))
+            if b'<svg' not in head.lower():
+                return None
+            fmt, size = "SVG", _probe_svg(head)
+    return {"format": fmt, "width": size[0] if size else None, "height": size[1] if size else None}
+
+
+def probe_image(path: str, st: Optional[os.stat_result] = None) -> Optional[Dict]:
+    """Return {"format", "width", "height"} from the file header, or None if unknown.
+
+    Width/height are None for recognised files without intrinsic size
+    (e.g. an SVG with neither width/height nor viewBox).
+    """
+    try:
+        st = st or os.stat(path)
+    except OSError:
+        return None
+    with _memo_lock:
+        cached = _memo.get(path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    try:
+        result = _probe(path)
+    except (OSError, struct.error, ValueError):
+        result = None
+    with _memo_lock:
+        _memo[path] = (st.st_mtime_ns, st.st_size, result)
+    return result
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+JavaScript Minifier
+A conservative token-level minifier: comments go, whitespace shrinks to what
+the grammar needs, and a line break is only removed where automatic semicolon
+insertion cannot depend on it. Identifiers are never renamed, so the output
+behaves exactly like the input.
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+PUNCTUATORS = sorted("""
+>>>= ... === !== **= <<= >>= >>> &&= ||= ??= => == != <= >= && || ?? ?. ++ -- += -= *= /= %= &= |= ^=
+** << >> { } ( ) [ ] ; , < > + - * / % & | ^ ! ~ ? : = . @ #
+""".split(), key=len, reverse=True)
+# Keywords after which a slash starts a regular expression
+REGEX_KEYWORDS = {"return", "typeof", "instanceof", "in", "of", "new", "delete", "void", "throw",
+                  "case", "do", "else", "yield", "await"}
+# A line break may be dropped after these punctuators...
+NO_BREAK_AFTER = {")", "]", "}", "++", "--"}
+# ...and before these
+BREAK_NEUTRAL_BEFORE = {")", "]", "}", ",", ";", ".", "?.", ":", "?", "=", "==", "===", "!=", "!==",
+                        "&&", "||", "??", "*", "%", "<", ">", "<=", ">=", "&", "|", "^", "=>",
+                        "+=", "-=", "*=", "/=", "%=", "&=", "|=", "^=", "**", "**="}
+
+LINE_TERMINATORS = "\n\r\u2028\u2029"
+WHITESPACE = " \t\f\v\xa0\ufeff"
+WORD_CHARS = re.compile(r'[\w$\u0080-\uffff]')
+IDENTIFIER = re.compile(r'[A-Za-z_$\u0080-\uffff\\][\w$\u0080-\uffff\\]*')
+NUMBER = re.compile(r'(?:0[xXoObB][\da-fA-F_]+n?|(?:\d[\d_]*\.?[\d_]*|\.\d[\d_]*)(?:[eE][+-]?\d+)?n?)')
+
+
+class JSSyntaxError(ValueError):
+    """The tokenizer could not make sense of the source"""
+
+
+def _string_end(source: str, i: int) -> int:
+    quote = source[i]
+    j = i + 1
+    while j < len(source):
+        ch = source[j]
+        if ch == '\\':
+            j += 2
+            continue
+        if ch == quote:
+            return j + 1
+        if ch == '\n':
+            break
+        j += 1
+    raise JSSyntaxError(f"unterminated string at offset {i}")
+
+
+def _template_end(source: str, i: int) -> int:
+    """End of the template literal starting at i, skipping ${...} expressions"""
+    j = i + 1
+    while j < len(source):
+        ch = source[j]
+        if ch == '\\':
+            j += 2
+            continue
+        if ch == '`':
+            return j + 1
+        if ch == '$' and source.startswith('${', j):
+            j = _expression_end(source, j + 2)
+            continue
+        j += 1
+    raise JSSyntaxError(f"unterminated template literal at offset {i}")
+
+
+def _expression_end(source: str, i: int) -> int:
+    """Index after the '}' closing a template ${ expression starting at i"""
+    depth = 1
+    for kind, text, start in scan(source, i):
+        if text == '{':
+            depth += 1
+        elif text == '}':
+            depth -= 1
+            if depth == 0:
+                return start + 1
+    raise JSSyntaxError(f"unterminated template expression at offset {i}")
+
+
+def _regex_end(source: str, i: int) -> int:
+    j = i + 1
+    in_class = False
+    while j < len(source):
+        ch = source[j]
+        if ch == '\\':
+            j += 2
+            continue
+        if ch == '\n':
+            break
+        if ch == '[':
+            in_class = True
+        elif ch == ']':
+            in_class = False
+        elif ch == '/' and not in_class:
+            j += 1
+            while j < len(source) and WORD_CHARS.match(source[j]):
+                j += 1
+            return j
+        j += 1
+    raise JSSyntaxError(f"unterminated regular expression at offset {i}")
+
+
+def _regex_allowed(previous: Optional[Tuple[str, str]]) -> bool:
+    if previous is None:
+        return True
+    kind, text = previous
+    if kind == "punctuator":
+        # ++ and -- before a slash are postfix: a prefix one cannot apply to a regex
+        return text not in (")", "]", "++", "--")
+    return kind == "word" and text in REGEX_KEYWORDS
+
+
+def scan(source: str, i: int = 0):
+    """Yield (kind, text, start) tokens; kinds: word, number, string, template,
+    regex, punctuator, comment, newline, space"""
+    previous = None
+    n = len(source)
+    while i < n:
+        ch = source[i]
+        start = i
+        if ch in LINE_TERMINATORS:
+            while i < n and source[i] in WHITESPACE + LINE_TERMINATORS:
+                i += 1
+            yield "newline", source[start:i], start
+            continue
+        if ch in WHITESPACE:
+            while i < n and source[i] in WHITESPACE:
+                i += 1
+            yield "space", source[start:i], start
+            continue
+        if source.startswith('//', i):
+            end = source.find('\n', i)
+            i = n if end == -1 else end
+            yield "comment", source[start:i], start
+            continue
+        if source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            if end == -1:
+                raise JSSyntaxError(f"unterminated comment at offset {i}")
+            i = end + 2
+            yield "comment", source[start:i], start
+            continue
+        if ch == '"' or ch == "'":
+            i = _string_end(source, i)
+            token = ("string", source[start:i])
+        elif ch == '`':
+            i = _template_end(source, i)
+            token = ("template", source[start:i])
+        elif ch == '/' and _regex_allowed(previous):
+            i = _regex_end(source, i)
+            token = ("regex", source[start:i])
+        elif ch.isdigit() or (ch == '.' and i + 1 < n and source[i + 1].isdigit()):
+            match = NUMBER.match(source, i)
+            i = match.end()
+            token = ("number", source[start:i])
+        else:
+            match = IDENTIFIER.match(source, i)
+            if match:
+                i = match.end()
+                token = ("word", source[start:i])
+            else:
+                for punctuator in PUNCTUATORS:
+                    if source.startswith(punctuator, i):
+                        break
+                else:
+                    raise JSSyntaxError(f"unexpected character {ch!r} at offset {i}")
+                i += len(punctuator)
+                token = ("punctuator", punctuator)
+        previous = token
+        yield token[0], token[1], start
+
+
+def tokenize(source: str) -> List[Tuple[str, str]]:
+    return [(kind, text) for kind, text, _ in scan(source)]
+
+
+def _needs_space(previous: Tuple[str, str], token: Tuple[str, str]) -> bool:
+    left, right = previous[1], token[1]
+    if WORD_CHARS.match(left[-1]) and WORD_CHARS.match(right[0]):
+        return True
+    # a + +b, a - -b, a / /re/
+    if left[-1] in '+-/' and right[0] == left[-1]:
+        return True
+    # 1 .toString()
+    if previous[0] == "number" and right[0] == '.' and not re.search(r'[.eExXn]', left):
+        return True
+    return False
+
+
+def minify(source: str) -> str:
+    """Minified source; raises JSSyntaxError if the source cannot be tokenized"""
+    out: List[str] = []
+    previous: Optional[Tuple[str, str]] = None
+    pending_break = False
+    pending_space = False
+    for kind, text, _ in scan(source):
+        if kind == "comment":
+            if text.startswith('/*!'):
+                # Licence comments stay, on their own line only if they already were
+                if previous is not None:
+                    out.append('\n' if pending_break else ' ')
+                out.append(text)
+            if '\n' in text:
+                pending_break = True
+            pending_space = True
+            continue
+        if kind == "newline":
+            pending_break = True
+            continue
+        if kind == "space":
+            pending_space = True
+            continue
+
+        token = (kind, text)
+        if previous is not None:
+            if pending_break and not (previous[0] == "punctuator" and previous[1] not in NO_BREAK_AFTER) \
+                    and not (kind == "punctuator" and text in BREAK_NEUTRAL_BEFORE):
+                # Automatic semicolon insertion may depend on this line break
+                out.append('\n')
+            elif (pending_space or pending_break) and _needs_space(previous, token):
+                out.append(' ')
+        out.append(text)
+        previous = token
+        pending_break = pending_space = False
+    return ''.join(out)
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+JavaScript Optimization
+Export stage that minifies the site's scripts, marks their <script> tags
+defer, and can move rarely used class methods into a chunk that is loaded
+when the browser is idle. An optional headless benchmark (Node.js) compares
+size and parse time before and after.
+"""
+
+import os
+import json
+import zlib
+import shutil
+import hashlib
+import tempfile
+import posixpath
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+from js_minify import JSSyntaxError, minify, scan
+from html_tags import SCRIPT_ELEMENT, parse_attributes, add_attributes, is_script
+from site_graph import resolve_reference
+
+DEFAULT_OPTIONS = {
+    "enabled": True,
+    "minify": True,
+    "defer": True,
+    # Class methods moved to a lazily loaded chunk, e.g. ["setupParallaxEffects"]
+    "lazy_methods": [],
+    "benchmark": False,
+}
+BENCHMARK_RUNS = 25
+
+# Installs loader stubs for the moved methods right after the class; the
+# first call loads the chunk during idle time and then runs the real method
+LAZY_LOADER = (";(function(C,names,src){var p;function load(){return p||(p=new Promise(function(resolve,reject)"
+               "{(window.requestIdleCallback||setTimeout)(function(){var s=document.createElement('script');"
+               "s.src=src;s.onload=resolve;s.onerror=reject;document.head.appendChild(s);});}));}"
+               "names.forEach(function(n){C.prototype[n]=function(){var self=this,args=arguments;"
+               "return load().then(function(){return C.prototype[n].apply(self,args);});};});})"
+               "(%(cls)s,%(names)s,new URL(%(chunk)s,document.currentScript&&document.currentScript.src||location.href).href);")
+
+# Parse/compile time of each file with V8, median of several runs
+NODE_BENCHMARK = r"""
+const vm = require('vm');
+const fs = require('fs');
+const runs = parseInt(process.argv[1], 10);
+const result = {};
+for (const file of process.argv.slice(2)) {
+  const source = fs.readFileSync(file, 'utf8');
+  const times = [];
+  for (let i = 0; i < runs; i++) {
+    const started = process.hrtime.bigint();
+    new vm.Script(source, {filename: `${file}#${i}`});
+    times.push(Number(process.hrtime.bigint() - started) / 1e6);
+  }
+  times.sort((a, b) => a - b);
+  result[file] = times[times.length >> 1];
+}
+console.log(JSON.stringify(result));
+"""
+
+
+def split_lazy_methods(source: str, names: List[str]) -> Tuple[str, Optional[str], List[Tuple[str, str]]]:
+    """Cut the named methods out of the first top-level class that has any.
+
+    Returns (source, class name, [(method name, method source)]); the source
+    gets a "\\0LAZY\\0" placeholder right after the class body for the loader.
+    """
+    tokens = [(kind, text, start) for kind, text, start in scan(source)
+              if kind not in ("space", "newline", "comment")]
+    wanted = set(names)
+    depth = 0
+    i = 0
+    while i < len(tokens):
+        kind, text, start = tokens[i]
+        if text in ('{', '(', '['):
+            depth += 1
+        elif text in ('}', ')', ']'):
+            depth -= 1
+        elif (depth == 0 and kind == "word" and text == "class" and
+              i + 1 < len(tokens) and tokens[i + 1][0] == "word"):
+            class_name = tokens[i + 1][1]
+            k = i + 2
+            while k < len(tokens) and tokens[k][1] != '{':
+                k += 1
+            # Walk the class body looking for "name(...) {...}" members
+            body_depth = 0
+            methods = []
+            cuts = []
+            while k < len(tokens):
+                member = tokens[k][1]
+                if member in ('{', '(', '['):
+                    body_depth += 1
+                elif member in ('}', ')', ']'):
+                    body_depth -= 1
+                    if body_depth == 0:
+                        break
+                elif (body_depth == 1 and tokens[k][0] == "word" and member in wanted and
+                      k + 1 < len(tokens) and tokens[k + 1][1] == '(' and tokens[k - 1][1] in ('{', '}', ';')):
+                    span = _method_span(tokens, k)
+                    # super in an object literal method would point at Object.prototype
+                    if span is not None and 'super' not in {t[1] for t in tokens[k:span[2]]}:
+                        methods.append((member, source[span[0]:span[1]]))
+                        cuts.append(span[:2])
+                        k = span[2]
+                        continue
+                k += 1
+            if methods:
+                end = tokens[k][2] + 1 if k < len(tokens) else len(source)
+                source = source[:end] + "\0LAZY\0" + source[end:]
+                for start, stop in reversed(cuts):
+                    source = source[:start] + source[stop:]
+                return source, class_name, methods
+            i = k + 1
+            continue
+        i += 1
+    return source, None, []
+
+
+def _method_span(tokens, k: int) -> Optional[Tuple[int, int, int]]:
+    """(start, end offset, next token index) of the method whose name is tokens[k]"""
+    depth = 0
+    j = k + 1
+    # Parameters
+    while j < len(tokens):
+        if tokens[j][1] == '(':
+            depth += 1
+        elif tokens[j][1] == ')':
+            depth -= 1
+            if depth == 0:
+                break
+        j += 1
+    j += 1
+    if j >= len(tokens) or tokens[j][1] != '{':
+        return None
+    depth = 0
+    while j < len(tokens):
+        if tokens[j][1] in ('{', '(', '['):
+            depth += 1
+        elif tokens[j][1] in ('}', ')', ']'):
+            depth -= 1
+            if depth == 0:
+                return tokens[k][2], tokens[j][2] + 1, j + 1
+        j += 1
+    return None
+
+
+def _gzip_size(data: bytes) -> int:
+    return len(zlib.compress(data, 9))
+
+
+def benchmark(sources: Dict[str, str], runs: int = BENCHMARK_RUNS) -> Dict[str, Dict]:
+    """Bytes, gzip bytes and V8 parse/compile time (ms, None without Node.js) per source"""
+    result = {}
+    for label, source in sources.items():
+        data = source.encode('utf-8')
+        result[label] = {"bytes": len(data), "gzip": _gzip_size(data), "parse_ms": None}
+    node = shutil.which("node")
+    if not node:
+        return result
+    with tempfile.TemporaryDirectory() as temp_dir:
+        files = {}
+        for n, (label, source) in enumerate(sources.items()):
+            files[label] = os.path.join(temp_dir, f"{n}.js")
+            with open(files[label], 'w', encoding='utf-8') as f:
+                f.write(source)
+        try:
+            output = subprocess.run([node, "-e", NODE_BENCHMARK, str(runs)] + list(files.values()),
+                                    capture_output=True, text=True, timeout=120, check=True).stdout
+            times = json.loads(output)
+        except (OSError, subprocess.SubprocessError, ValueError):
+            return result
+        for label, path in files.items():
+            result[label]["parse_ms"] = times.get(path)
+    return result
+
+
+def _defer_scripts(page: str, html: str, context, scripts: set) -> Tuple[str, int]:
+    """Add defer to local classic scripts that no later inline script depends on"""
+    elements = list(SCRIPT_ELEMENT.finditer(html))
+    edits = []
+    for n, match in enumerate(elements):
+        attributes = parse_attributes(match.group(1))
+        src = attributes.get("src")
+        target = resolve_reference(page, src) if src else None
+        if (target not in scripts or not is_script(attributes) or attributes.get("type") == "module" or
+                "async" in attributes or "defer" in attributes or "nomodule" in attributes):
+            continue
+        # Inline scripts run immediately and may use what this script defines
+        later_inline = any(not parse_attributes(m.group(1)).get("src") and m.group(2).strip() and
+                           is_script(parse_attributes(m.group(1))) for m in elements[n + 1:])
+        if later_inline or 'document.write' in context.read_text(target):
+            continue
+        edits.append((match.start(1), match.end(1), add_attributes(match.group(1), [("defer", None)])))
+    for start, end, replacement in reversed(edits):
+        html = html[:start] + replacement + html[end:]
+    return html, len(edits)
+
+
+def run(context, options: Dict) -> Dict:
+    """Export stage: minify scripts, defer their tags, split lazy methods"""
+    options = dict(DEFAULT_OPTIONS, **options)
+    scripts = [path for path in context.files("js") if not path.endswith('.min.js')]
+    stats = {"title": "JavaScript", "scripts": len(scripts), "bytes_before": 0, "bytes_after": 0,
+             "gzip_before": 0, "gzip_after": 0, "deferred": 0, "lazy_methods": [], "chunks": 0,
+             "skipped": [], "benchmark": None}
+    originals = {}
+    outputs = {}
+
+    for rel_path in scripts:
+        source = context.read_text(rel_path)
+        originals[rel_path] = source
+        output = source
+        try:
+            if options["lazy_methods"]:
+                output, class_name, methods = split_lazy_methods(output, options["lazy_methods"])
+                if methods:
+                    chunk = (f"Object.assign({class_name}.prototype,{{\n" +
+                             ",\n".join(text for _, text in methods) + "\n});\n")
+                    if options["minify"]:
+                        chunk = minify(chunk)
+                    digest = hashlib.sha256(chunk.encode('utf-8')).hexdigest()[:10]
+                    chunk_path = f"{os.path.splitext(rel_path)[0]}.lazy.{digest}.js"
+                    context.write(chunk_path, chunk)
+                    moved = [name for name, _ in methods]
+                    loader = LAZY_LOADER % {"cls": class_name, "names": json.dumps(moved),
+                                            "chunk": json.dumps(posixpath.basename(chunk_path))}
+                    output = output.replace("\0LAZY\0", loader)
+                    outputs[chunk_path] = chunk
+                    stats["lazy_methods"] += moved
+                    stats["chunks"] += 1
+            if options["minify"]:
+                output = minify(output)
+        except JSSyntaxError as e:
+            # Leave scripts we cannot tokenize untouched
+            stats["skipped"].append(f"{rel_path}: {e}")
+            output = source
+        outputs[rel_path] = output
+        if output != source:
+            context.write(rel_path, output)
+        stats["bytes_before"] += len(source.encode('utf-8'))
+        stats["bytes_after"] += len(output.encode('utf-8'))
+        stats["gzip_before"] += _gzip_size(source.encode('utf-8'))
+        stats["gzip_after"] += _gzip_size(output.encode('utf-8'))
+
+    if options["defer"]:
+        for page in context.files("html"):
+            html = context.read_text(page)
+            html, count = _defer_scripts(page, html, context, set(scripts))
+            if count:
+                context.write(page, html)
+                stats["deferred"] += count
+
+    message = (f"{len(scripts)} script{'s' if len(scripts) != 1 else ''} "
+               f"{stats['bytes_before'] / 1024:.1f} KB -> {stats['bytes_after'] / 1024:.1f} KB "
+               f"(gzip {stats['gzip_before'] / 1024:.1f} -> {stats['gzip_after'] / 1024:.1f} KB), "
+               f"{stats['deferred']} tag{'s' if stats['deferred'] != 1 else ''} deferred")
+    if stats["chunks"]:
+        message += f", {len(stats['lazy_methods'])} methods in {stats['chunks']} lazy chunk(s)"
+    if stats["skipped"]:
+        message += f", {len(stats['skipped'])} skipped"
+
+    if options["benchmark"] and scripts:
+        before = benchmark(originals)
+        after = benchmark({path: outputs[path] for path in scripts})
+        stats["benchmark"] = {"before": before, "after": after}
+        parse_before = [b["parse_ms"] for b in before.values()]
+        parse_after = [a["parse_ms"] for a in after.values()]
+        if None not in parse_before + parse_after:
+            message += f"; parse {sum(parse_before):.2f} ms -> {sum(parse_after):.2f} ms"
+        else:
+            message += "; parse time not measured (Node.js not found)"
+    stats["message"] = message
+    return stats
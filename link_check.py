@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Link Checker
+Finds broken local references in the template's pages, stylesheets and web
+app manifests: missing files, paths that only match with different letter
+case (a 404 on case-sensitive hosts such as GitHub Pages), files the deploy
+profile leaves out of the export, and #fragments without a matching id.
+Files are parsed across a thread pool; lookups go through the file index.
+"""
+
+import re
+import json
+import time
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlsplit
+from typing import Dict, List, Optional, Tuple
+
+from css_minify import tokens, url_value
+from file_index import get_file_index, file_type
+from site_graph import CSS_IMPORT, HTML_REFERENCE, HTML_SRCSET
+from site_export import deployable_files, DEFAULT_PROFILE
+
+# Web app manifests are JSON files under these names
+MANIFEST_NAMES = ("manifest.json", "site.webmanifest", "manifest.webmanifest")
+# Schemes and prefixes pointing outside the template
+EXTERNAL = re.compile(r'^(?:[a-z][a-z0-9+.-]*:|//)', re.IGNORECASE)
+HTML_COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+CSS_COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+# CSS inside a page: <style> blocks and style attributes
+STYLE_BLOCK = re.compile(r'<style\b[^>]*>(.*?)</style\s*>', re.IGNORECASE | re.DOTALL)
+STYLE_ATTRIBUTE = re.compile(r'''\sstyle\s*=\s*(?:"([^"]*)"|'([^']*)')''', re.IGNORECASE)
+ID_ATTRIBUTE = re.compile(r'''<[a-z][^>]*?\s(?:id|name)\s*=\s*["']?([^"'\s>]+)''', re.IGNORECASE)
+# Fragments every page has
+IMPLICIT_FRAGMENTS = ("", "top")
+
+
+def _blank(match) -> str:
+    """Comment replaced by whitespace of the same length, so offsets and lines stay put"""
+    return re.sub(r'[^\n]', ' ', match.group(0))
+
+
+def _line(text: str, position: int) -> int:
+    return text.count('\n', 0, position) + 1
+
+
+def _css_urls(css: str, offset: int = 0) -> List[Tuple[int, str]]:
+    """(position, value) of the url()s in CSS; the tokenizer keeps url()s inside
+    strings, comments and data: URIs from being mistaken for references"""
+    found = []
+    position = offset
+    for kind, piece in tokens(css):
+        if kind == "url":
+            found.append((position, url_value(piece)[0]))
+        position += len(piece)
+    return found
+
+
+def html_references(text: str) -> List[Tuple[int, str]]:
+    """(line, reference) of every href/src/srcset and url() in a page"""
+    text = HTML_COMMENT.sub(_blank, text)
+    found = [(m.start(1), m.group(1)) for m in HTML_REFERENCE.finditer(text)]
+    for match in HTML_SRCSET.finditer(text):
+        found += [(match.start(1), candidate.split()[0]) for candidate in match.group(1).split(',')
+                  if candidate.strip()]
+    for match in STYLE_BLOCK.finditer(text):
+        found += _css_urls(match.group(1), match.start(1))
+    for match in STYLE_ATTRIBUTE.finditer(text):
+        group = 1 if match.group(1) is not None else 2
+        found += _css_urls(match.group(group), match.start(group))
+    return [(_line(text, position), reference) for position, reference in sorted(found)]
+
+
+def css_references(text: str) -> List[Tuple[int, str]]:
+    """(line, reference) of every url() and @import in a stylesheet"""
+    found = _css_urls(text)
+    found += [(m.start(1), m.group(1)) for m in CSS_IMPORT.finditer(CSS_COMMENT.sub(_blank, text))]
+    return [(_line(text, position), reference) for position, reference in sorted(found)]
+
+
+def manifest_references(text: str) -> List[Tuple[int, str]]:
+    """(line, reference) of icons, screenshots, shortcuts and start_url in a web app manifest"""
+    manifest = json.loads(text)
+    found = [manifest.get("start_url")]
+    found += [icon.get("src") for icon in manifest.get("icons") or []]
+    found += [shot.get("src") for shot in manifest.get("screenshots") or []]
+    for shortcut in manifest.get("shortcuts") or []:
+        found += [shortcut.get("url")] + [icon.get("src") for icon in shortcut.get("icons") or []]
+    references = []
+    for reference in found:
+        if isinstance(reference, str) and reference:
+            position = text.find(json.dumps(reference)[1:-1])
+            references.append((_line(text, max(position, 0)), reference))
+    return references
+
+
+def _parse(index, rel_path: str) -> Dict:
+    """References made by a file and the ids it defines (runs on a worker thread)"""
+    try:
+        with open(index.abspath(rel_path), 'r', encoding='utf-8', errors='replace') as f:
+            text = f.read()
+    except OSError as e:
+        return {"references": [], "ids": set(), "error": str(e)}
+    ids = set(ID_ATTRIBUTE.findall(text)) if rel_path.lower().endswith(('.html', '.htm', '.svg')) else set()
+    try:
+        if rel_path.lower().endswith(('.html', '.htm')):
+            references = html_references(text)
+        elif rel_path.lower().endswith('.css'):
+            references = css_references(text)
+        elif posixpath.basename(rel_path).lower() in MANIFEST_NAMES:
+            references = manifest_references(text)
+        else:
+            references = []
+    except ValueError as e:
+        return {"references": [], "ids": ids, "error": f"invalid JSON: {e}"}
+    return {"references": references, "ids": ids, "error": None}
+
+
+def resolve_local(source: str, reference: str) -> Optional[Tuple[str, str]]:
+    """(template-relative path, fragment) of a local reference, None for external ones.
+    Directory references resolve to their index.html; a bare fragment to source itself"""
+    reference = reference.strip()
+    if not reference or EXTERNAL.match(reference):
+        return None
+    parts = urlsplit(reference)
+    path = unquote(parts.path)
+    if not path:
+        return source, unquote(parts.fragment)
+    if path.startswith('/'):
+        target = posixpath.normpath(path.lstrip('/') or '.')
+    else:
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(source), path))
+    if target == '.' or path.endswith('/'):
+        target = posixpath.join(target, "index.html") if target != '.' else "index.html"
+    return target, unquote(parts.fragment)
+
+
+def check_links(template_path: str, all_files: bool = False, profile: str = DEFAULT_PROFILE,
+                workers: Optional[int] = None) -> Dict:
+    """Check every local reference in the deployable (or, with all_files, all indexed)
+    pages, stylesheets and manifests. Returns a report with one entry per problem."""
+    started = time.perf_counter()
+    index = get_file_index(template_path)
+    deployable = set(deployable_files(index, profile))
+    scope = index.paths() if all_files else sorted(deployable)
+    sources = [p for p in scope if file_type(p) in ("html", "css") or
+               posixpath.basename(p).lower() in MANIFEST_NAMES]
+    # Fragment targets are parsed too, even when they are not checked themselves
+    anchored = [p for p in index.paths() if p.lower().endswith(('.html', '.htm', '.svg'))]
+    to_parse = sorted(set(sources) | set(anchored))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        parsed = dict(zip(to_parse, pool.map(lambda p: _parse(index, p), to_parse)))
+
+    by_lower: Dict[str, List[str]] = {}
+    for rel_path in index.paths():
+        by_lower.setdefault(rel_path.lower(), []).append(rel_path)
+
+    problems = []
+    checked = 0
+    for source in sources:
+        result = parsed[source]
+        if result["error"]:
+            problems.append({"source": source, "line": None, "reference": None,
+                             "problem": result["error"], "suggestion": None})
+        for line, reference in result["references"]:
+            resolved = resolve_local(source, reference)
+            if resolved is None:
+                continue
+            checked += 1
+            target, fragment = resolved
+            problem, suggestion = None, None
+            if target.startswith('..'):
+                problem = "points outside the template"
+            elif target not in index.files:
+                matches = by_lower.get(target.lower())
+                if matches:
+                    problem, suggestion = "letter case differs from the file on disk", matches[0]
+                else:
+                    problem = "file not found"
+            elif not all_files and target not in deployable:
+                problem = f"not exported by the {profile} profile"
+            elif fragment not in IMPLICIT_FRAGMENTS and target in parsed and fragment not in parsed[target]["ids"]:
+                problem = f"no element with id \"{fragment}\""
+            if problem:
+                problems.append({"source": source, "line": line, "reference": reference,
+                                 "problem": problem, "suggestion": suggestion})
+    return {"files": len(sources), "references": checked, "problems": problems,
+            "elapsed": time.perf_counter() - started}
+
+
+def describe_links(report: Dict) -> List[str]:
+    """One line per problem plus a summary line"""
+    lines = []
+    for problem in report["problems"]:
+        where = f"{problem['source']}:{problem['line']}" if problem["line"] else problem["source"]
+        what = f"{problem['reference']}: " if problem["reference"] else ""
+        hint = f" (did you mean {problem['suggestion']}?)" if problem["suggestion"] else ""
+        lines.append(f"{where}: {what}{problem['problem']}{hint}")
+    lines.append(f"{report['references']} local references in {report['files']} files checked, "
+                 f"{len(report['problems'])} problem{'s' if len(report['problems']) != 1 else ''} "
+                 f"({report['elapsed'] * 1000:.0f} ms)")
+    return lines
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Log Console
+Buffered, bounded sink for the editors' activity log. Messages are collected
+from any thread and written to the Tk text widget in one batch at most every
+flush_ms milliseconds, the widget is trimmed to max_lines, and entries can be
+mirrored to a rotating log file.
+"""
+
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List, Optional
+
+DEFAULT_SETTINGS = {
+    "flush_ms": 100,
+    "max_lines": 2000,
+    "log_file": None,
+    "max_bytes": 1024 * 1024,
+    "backup_count": 3,
+}
+
+
+def load_log_settings(config_file: str) -> Dict:
+    """Read the optional "log" section of the editor config file"""
+    settings = dict(DEFAULT_SETTINGS)
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            settings.update(json.load(f).get("log", {}))
+    except (OSError, ValueError, AttributeError):
+        pass
+    return settings
+
+
+class LogConsole:
+    """Thread-safe, batched writer for a Tk text widget"""
+
+    def __init__(self, widget, dispatcher, flush_ms: int = 100, max_lines: int = 2000,
+                 log_file: Optional[str] = None, max_bytes: int = 1024 * 1024,
+                 backup_count: int = 3):
+        self.widget = widget
+        self.dispatcher = dispatcher
+        self.flush_ms = flush_ms
+        self.max_lines = max_lines
+        self.buffer: List[str] = []
+        self.lock = threading.Lock()
+        self.flush_scheduled = False
+
+        self.file_logger = None
+        if log_file:
+            os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+            handler = RotatingFileHandler(log_file, maxBytes=max_bytes,
+                                          backupCount=backup_count, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self.file_logger = logging.getLogger(f"website_editor.console.{id(self)}")
+            self.file_logger.propagate = False
+            self.file_logger.setLevel(logging.INFO)
+            self.file_logger.addHandler(handler)
+
+    def write(self, message: str):
+        """Queue a message; safe to call from any thread"""
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        with self.lock:
+            self.buffer.append(f"[{timestamp}] {message}\n")
+            schedule = not self.flush_scheduled
+            self.flush_scheduled = True
+        if self.file_logger is not None:
+            self.file_logger.info(message)
+        if schedule:
+            self.dispatcher.call(self._schedule_flush)
+
+    def _schedule_flush(self):
+        self.widget.after(self.flush_ms, self.flush)
+
+    def flush(self):
+        """Write buffered messages to the widget (Tk thread only)"""
+        with self.lock:
+            lines, self.buffer = self.buffer, []
+            self.flush_scheduled = False
+        if not lines:
+            return
+
+        # Only keep what can survive trimming anyway
+        if self.max_lines and len(lines) > self.max_lines:
+            lines = lines[-self.max_lines:]
+
+        try:
+            self.widget.insert("end", "".join(lines))
+            if self.max_lines:
+                last_line, column = map(int, self.widget.index("end-1c").split('.'))
+                # Messages end with a newline, which leaves an empty last line behind them
+                line_count = last_line - 1 if column == 0 else last_line
+                excess = line_count - self.max_lines
+                if excess > 0:
+                    self.widget.delete("1.0", f"{excess + 1}.0")
+            self.widget.see("end")
+        except Exception:
+            # Widget destroyed while messages were pending
+            pass
+
+    def close(self):
+        """Flush pending messages and release the log file"""
+        self.flush()
+        if self.file_logger is not None:
+            for handler in list(self.file_logger.handlers):
+                handler.close()
+                self.file_logger.removeHandler(handler)
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Page Weight
+Measures what each deployable page makes the browser download: bytes per
+resource type (raw and gzip), requests, render-blocking requests and images
+shipped larger than they are displayed, and checks them against performance
+budgets. Runs as the last export stage and for the editor's preview stats;
+results are cached by the content hashes of the files.
+"""
+
+import os
+import re
+import json
+import gzip
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+from file_index import file_type
+from html_tags import HEAD_MARKUP, IMG_TAG, SCRIPT_ELEMENT, parse_attributes, is_script, is_stylesheet
+from image_probe import probe_image
+from site_graph import CSS_IMPORT, CSS_URL, resolve_reference
+
+DEFAULT_OPTIONS = {
+    "enabled": True,
+    # "warn" reports exceeded budgets in the build summary, "fail" stops the export
+    "on_exceed": "warn",
+    # Screen the page is measured on: <img sizes> resolve against its width, and pixels
+    # beyond what its density can show are wasted bytes
+    "viewport_width": 1280,
+    "device_pixel_ratio": 2,
+    # Per page; sizes are transferred (gzip for text) KB, 0 disables a budget
+    "budgets": {
+        "total_kb": 1000,
+        "html_kb": 100,
+        "css_kb": 100,
+        "js_kb": 150,
+        "image_kb": 600,
+        "font_kb": 150,
+        "requests": 40,
+        "render_blocking": 3,
+        "oversized_image_kb": 100,
+    },
+}
+# Bumped whenever the analysis changes, so cached reports are recomputed
+WEIGHT_VERSION = 2
+WEIGHT_DIR_NAME = "page_weight"
+# Types hosts serve compressed; images other than SVG and fonts are compressed already
+COMPRESSED_TYPES = ("html", "css", "js", "json", "text")
+# Per-type budgets and the totals they limit
+TYPE_BUDGETS = {"html_kb": "html", "css_kb": "css", "js_kb": "js", "image_kb": "image", "font_kb": "font"}
+# An image is oversized when it has this much more width than the display needs
+OVERSIZE_SLACK = 1.1
+
+COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+FONT_FACE = re.compile(r'@font-face\s*\{([^}]*)\}', re.IGNORECASE)
+SIZES_ENTRY = re.compile(r'^(?:\((min|max)-width:\s*(\d+)px\)\s+)?(\d+(?:\.\d+)?)(px|vw)$')
+PRELOAD_TYPES = {"style": "css", "script": "js", "image": "image", "font": "font", "fetch": "json"}
+
+
+class BudgetExceeded(ValueError):
+    """Raised by the export stage when a budget is exceeded and on_exceed is "fail" """
+
+
+# Resources
+
+class PageResources:
+    """Files one page loads, each counted once, with how the page loads them"""
+
+    def __init__(self, context, page: str):
+        self.context = context
+        self.page = page
+        self.resources: Dict[str, Dict] = {}
+        self.images: List[Dict] = []
+
+    def add(self, source: str, reference: str, blocking: bool = False) -> Optional[str]:
+        target = resolve_reference(source, reference) if reference else None
+        if target is None or not self.context.exists(target):
+            return None
+        entry = self.resources.setdefault(target, {"blocking": False})
+        entry["blocking"] = entry["blocking"] or blocking
+        return target
+
+    def add_stylesheet(self, source: str, reference: str, blocking: bool, seen=None):
+        """A stylesheet with its @import chain, fonts and url() images"""
+        seen = set() if seen is None else seen
+        sheet = self.add(source, reference, blocking)
+        if sheet is None or sheet in seen or not sheet.endswith('.css'):
+            return
+        seen.add(sheet)
+        css = self.context.read_text(sheet)
+        for imported in CSS_IMPORT.findall(css):
+            # Imports are fetched only after the importing sheet, and block just as it does
+            self.add_stylesheet(sheet, imported, blocking, seen)
+        self.add_css_assets(sheet, css)
+
+    def add_css_assets(self, source: str, css: str):
+        # Only one source of each @font-face is downloaded; woff2 is listed first in practice
+        for face in FONT_FACE.finditer(css):
+            urls = CSS_URL.findall(face.group(1))
+            url = next((u for u in urls if u.split('?')[0].lower().endswith('.woff2')), urls[0] if urls else None)
+            if url:
+                self.add(source, url)
+        css = FONT_FACE.sub('', css)
+        for url in CSS_URL.findall(css):
+            target = resolve_reference(source, url)
+            if target is not None and file_type(target) == "image":
+                self.add(source, url)
+
+
+def _pick_candidate(attributes: Dict[str, Optional[str]], display_width: Optional[int], dpr: float) -> str:
+    """The srcset candidate a browser at dpr picks for display_width, else the src"""
+    candidates = []
+    for candidate in (attributes.get("srcset") or "").split(','):
+        parts = candidate.split()
+        if not parts:
+            continue
+        descriptor = parts[1].lower() if len(parts) > 1 else "1x"
+        try:
+            if descriptor.endswith('w') and display_width:
+                candidates.append((float(descriptor[:-1]) / display_width, parts[0]))
+            elif descriptor.endswith('x'):
+                candidates.append((float(descriptor[:-1]), parts[0]))
+        except ValueError:
+            continue
+    if not candidates:
+        return attributes.get("src") or ""
+    candidates.sort()
+    return next((url for density, url in candidates if density >= dpr), candidates[-1][1])
+
+
+def _dimension(value: Optional[str]) -> Optional[int]:
+    value = (value or "").strip().lower()
+    if value.endswith('px'):
+        value = value[:-2]
+    return int(value) if value.isdigit() and int(value) > 0 else None
+
+
+def _layout_size(attributes: Dict[str, Optional[str]], viewport: int) -> Tuple[Optional[int], Optional[int]]:
+    """CSS pixel size of an <img> on the viewport: the first matching sizes entry, else width/height"""
+    width, height = _dimension(attributes.get("width")), _dimension(attributes.get("height"))
+    for entry in (attributes.get("sizes") or "").split(','):
+        match = SIZES_ENTRY.match(entry.strip().lower())
+        if not match:
+            continue
+        feature, limit, value, unit = match.groups()
+        if (feature == "max" and viewport > int(limit)) or (feature == "min" and viewport < int(limit)):
+            continue
+        layout_width = round(float(value) * (viewport / 100 if unit == "vw" else 1))
+        return layout_width, round(layout_width * height / width) if width and height else None
+    return width, height
+
+
+def page_resources(context, page: str, html: str, viewport: int, dpr: float) -> PageResources:
+    """Everything the page loads: its stylesheets and their imports, fonts and images,
+    scripts, preloads, icons and <img> images"""
+    resources = PageResources(context, page)
+    html = COMMENT.sub('', html)
+    body_start = html.lower().find('<body')
+    for match in HEAD_MARKUP.finditer(html):
+        token = match.group(0)
+        lowered = token.lower()
+        if lowered.startswith('<style'):
+            resources.add_css_assets(page, token)
+        if not lowered.startswith('<link'):
+            continue
+        attributes = parse_attributes(token)
+        rel = (attributes.get("rel") or "").lower().split()
+        href = attributes.get("href") or ""
+        if is_stylesheet(attributes):
+            media = (attributes.get("media") or "all").strip().lower()
+            # Sheets loaded asynchronously (onload swap, non-matching media) do not block rendering
+            blocking = "onload" not in attributes and media in ("all", "screen", "")
+            resources.add_stylesheet(page, href, blocking)
+        elif "preload" in rel and (attributes.get("as") or "").lower() == "style":
+            resources.add_stylesheet(page, href, False)
+        elif "preload" in rel and (attributes.get("as") or "").lower() in PRELOAD_TYPES:
+            resources.add(page, href)
+        elif "modulepreload" in rel or "icon" in rel:
+            resources.add(page, href)
+
+    for match in SCRIPT_ELEMENT.finditer(html):
+        attributes = parse_attributes(match.group(1))
+        if not is_script(attributes) or not attributes.get("src"):
+            continue
+        module = (attributes.get("type") or "").strip().lower() == "module"
+        deferred = module or "defer" in attributes or "async" in attributes
+        in_head = body_start == -1 or match.start() < body_start
+        resources.add(page, attributes["src"], blocking=in_head and not deferred)
+
+    for match in IMG_TAG.finditer(html):
+        attributes = parse_attributes(match.group(0))
+        width, height = _layout_size(attributes, viewport)
+        target = resources.add(page, _pick_candidate(attributes, width, dpr))
+        if target is not None:
+            resources.images.append({"path": target, "width": width, "height": height,
+                                     "lazy": (attributes.get("loading") or "").lower() == "lazy"})
+    return resources
+
+
+# Measuring
+
+def _transfer_size(context, rel_path: str, sizes: Dict[str, Tuple[int, int]]) -> Tuple[int, int]:
+    """(raw, transferred) bytes; text types are measured gzip-compressed"""
+    if rel_path not in sizes:
+        raw = context.size(rel_path)
+        transferred = raw
+        if file_type(rel_path) in COMPRESSED_TYPES or rel_path.lower().endswith('.svg'):
+            transferred = min(raw, len(gzip.compress(context.read(rel_path), compresslevel=6, mtime=0)))
+        sizes[rel_path] = (raw, transferred)
+    return sizes[rel_path]
+
+
+def _intrinsic_size(context, rel_path: str) -> Optional[Tuple[int, int]]:
+    if rel_path.lower().endswith('.svg'):
+        return None
+    path = context.source_path(rel_path)
+    probed = probe_image(path) if path else None
+    if probed and probed.get("width") and probed.get("height"):
+        return probed["width"], probed["height"]
+    return None
+
+
+def _oversized(context, resources: PageResources, sizes, dpr: float) -> List[Dict]:
+    """Raster images with more pixels than their layout size shows at dpr"""
+    oversized = []
+    for image in resources.images:
+        intrinsic = _intrinsic_size(context, image["path"])
+        if intrinsic is None or not image["width"]:
+            continue
+        width, height = intrinsic
+        shown_width = image["width"] * dpr
+        shown_height = image["height"] * dpr if image["height"] else height * shown_width / width
+        if width <= shown_width * OVERSIZE_SLACK:
+            continue
+        raw = _transfer_size(context, image["path"], sizes)[0]
+        needed = min(1.0, shown_width * shown_height / (width * height))
+        oversized.append({"path": image["path"], "intrinsic": [width, height],
+                          "displayed": [image["width"], image["height"]], "bytes": raw,
+                          "wasted": round(raw * (1 - needed)), "lazy": image["lazy"]})
+    return oversized
+
+
+def analyze_page(context, page: str, options: Dict, sizes: Dict) -> Dict:
+    """Weight of one page and everything it loads"""
+    dpr = options["device_pixel_ratio"]
+    resources = page_resources(context, page, context.read_text(page), options["viewport_width"], dpr)
+    by_type: Dict[str, Dict[str, int]] = {}
+    for rel_path in [page] + sorted(resources.resources):
+        kind = file_type(rel_path)
+        raw, transferred = _transfer_size(context, rel_path, sizes)
+        totals = by_type.setdefault(kind, {"requests": 0, "bytes": 0, "gzip": 0})
+        totals["requests"] += 1
+        totals["bytes"] += raw
+        totals["gzip"] += transferred
+    oversized = _oversized(context, resources, sizes, dpr)
+    return {
+        "types": by_type,
+        "requests": sum(t["requests"] for t in by_type.values()),
+        "bytes": sum(t["bytes"] for t in by_type.values()),
+        "gzip": sum(t["gzip"] for t in by_type.values()),
+        "render_blocking": sorted(path for path, entry in resources.resources.items() if entry["blocking"]),
+        "oversized_images": oversized,
+        "oversized_bytes": sum(image["wasted"] for image in oversized),
+    }
+
+
+def check_budgets(page: str, report: Dict, budgets: Dict) -> List[str]:
+    """One line per budget the page exceeds"""
+    measured = {"total_kb": report["gzip"] / 1024, "requests": report["requests"],
+                "render_blocking": len(report["render_blocking"]),
+                "oversized_image_kb": report["oversized_bytes"] / 1024}
+    for budget, kind in TYPE_BUDGETS.items():
+        measured[budget] = report["types"].get(kind, {}).get("gzip", 0) / 1024
+    violations = []
+    for budget, limit in budgets.items():
+        if limit and budget in measured and measured[budget] > limit:
+            unit = " KB" if budget.endswith('_kb') else ""
+            name = budget[:-3] if budget.endswith('_kb') else budget
+            value = f"{measured[budget]:.0f}" if unit else f"{measured[budget]}"
+            violations.append(f"{page}: {name.replace('_', ' ')} {value}{unit} > {limit}{unit}")
+    return violations
+
+
+def analyze(context, options: Optional[Dict] = None) -> Dict:
+    """Page weight report of every deployable page, cached by the content of all files"""
+    options = dict(DEFAULT_OPTIONS, **(options or {}))
+    options["budgets"] = dict(DEFAULT_OPTIONS["budgets"], **options["budgets"])
+    pages = context.files("html")
+    state = {path: [context.size(path), context.content_hash(path)] for path in context.files()}
+    digest = hashlib.sha256(json.dumps([WEIGHT_VERSION, options, state], sort_keys=True)
+                            .encode('utf-8')).hexdigest()
+    cache_file = os.path.join(context.cache_dir, WEIGHT_DIR_NAME, digest[:2], digest + ".json")
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            result = json.load(f)
+        result["cached"] = True
+        return result
+    except (OSError, ValueError):
+        pass
+
+    sizes: Dict[str, Tuple[int, int]] = {}
+    result = {"pages": {}, "violations": [], "budgets": options["budgets"], "cached": False}
+    for page in pages:
+        report = analyze_page(context, page, options, sizes)
+        result["pages"][page] = report
+        result["violations"] += check_budgets(page, report, options["budgets"])
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+    os.replace(tmp_file, cache_file)
+    return result
+
+
+def describe_page(page: str, report: Dict) -> str:
+    """One-line summary of a page's weight"""
+    types = ", ".join(f"{kind} {totals['gzip'] / 1024:.0f} KB" for kind, totals in
+                      sorted(report["types"].items(), key=lambda item: -item[1]["gzip"]))
+    line = (f"{page} {report['gzip'] / 1024:.0f} KB transferred ({report['bytes'] / 1024:.0f} KB raw, {types}), "
+            f"{report['requests']} requests, {len(report['render_blocking'])} render-blocking")
+    if report["oversized_images"]:
+        line += (f", {len(report['oversized_images'])} oversized image"
+                 f"{'s' if len(report['oversized_images']) != 1 else ''} "
+                 f"({report['oversized_bytes'] / 1024:.0f} KB wasted)")
+    return line
+
+
+def run(context, options: Dict) -> Dict:
+    """Export stage: measure every page and enforce the budgets"""
+    options = dict(DEFAULT_OPTIONS, **options)
+    result = analyze(context, options)
+    stats = dict(result, title="Page weight")
+    lines = [describe_page(page, report) for page, report in result["pages"].items()]
+    if result["violations"]:
+        lines.append(f"{len(result['violations'])} budget{'s' if len(result['violations']) != 1 else ''} "
+                     f"exceeded: {'; '.join(result['violations'])}")
+        if options["on_exceed"] == "fail":
+            raise BudgetExceeded("Performance budget exceeded: " + "; ".join(result["violations"]))
+    else:
+        lines.append("within budget")
+    stats["message"] = "; ".join(lines) if lines else "no pages"
+    return stats
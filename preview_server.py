@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Preview Server
+Threaded HTTP server for live previews. Files are served from an explicit
+directory (no os.chdir), responses are marked no-store so the browser always
+shows the latest render, and stop() really releases the socket and thread.
+"""
+
+import threading
+import http.server
+from functools import partial
+from typing import Callable, Optional
+
+
+class PreviewRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Static file handler that disables caching and forwards its log"""
+
+    log_callback: Optional[Callable[[str], None]] = None
+
+    def end_headers(self):
+        self.send_header("Cache-Control", "no-store, must-revalidate")
+        self.send_header("Expires", "0")
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        if self.log_callback is not None:
+            self.log_callback(format % args)
+
+
+class PreviewServer:
+    """Start/stop wrapper around ThreadingHTTPServer bound to one directory"""
+
+    def __init__(self, directory: str, port: int = 8090, host: str = "127.0.0.1",
+                 log_callback: Optional[Callable[[str], None]] = None):
+        self.directory = directory
+        self.requested_port = port
+        self.host = host
+        self.log_callback = log_callback
+        self.httpd = None
+        self.thread = None
+
+    @property
+    def running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    @property
+    def port(self) -> Optional[int]:
+        return self.httpd.server_address[1] if self.httpd else None
+
+    @property
+    def url(self) -> str:
+        host = "localhost" if self.host in ("", "0.0.0.0", "127.0.0.1") else self.host
+        return f"http://{host}:{self.port or self.requested_port}/"
+
+    def start(self) -> str:
+        """Bind (falling back to an ephemeral port if busy) and serve in a thread"""
+        if self.running:
+            return self.url
+
+        handler = type("BoundPreviewHandler", (PreviewRequestHandler,),
+                       {"log_callback": staticmethod(self.log_callback) if self.log_callback else None})
+        handler = partial(handler, directory=self.directory)
+
+        try:
+            self.httpd = http.server.ThreadingHTTPServer((self.host, self.requested_port), handler)
+        except OSError:
+            # Port taken (e.g. another editor instance): let the OS pick one
+            self.httpd = http.server.ThreadingHTTPServer((self.host, 0), handler)
+        self.httpd.daemon_threads = True
+
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="preview-server", daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self, timeout: float = 5.0):
+        """Shut down the serve loop, close the socket and join the thread"""
+        if self.httpd is None:
+            return
+        if self.running:
+            self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        self.httpd = None
+        self.thread = None
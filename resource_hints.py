@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Resource Hints
+Export stage that tells the browser about critical resources before it would
+find them itself: the largest above-the-fold image (the likely LCP element)
+gets fetchpriority="high" and a preload, late-discovered stylesheets and
+fonts are preloaded, third-party origins are preconnected and module scripts
+get modulepreload for their static imports. Hints already in a page are
+never added twice, so the stage can run over its own output.
+"""
+
+import re
+import posixpath
+from urllib.parse import urlsplit
+from typing import Dict, List, Optional, Set, Tuple
+
+from css_select import parse_html, above_the_fold
+from html_tags import HEAD_MARKUP, IMG_TAG, SCRIPT_ELEMENT, parse_attributes, add_attributes, is_stylesheet
+from image_probe import probe_image
+from js_minify import JSSyntaxError, scan
+from site_graph import CSS_IMPORT, CSS_URL, resolve_reference
+
+DEFAULT_OPTIONS = {
+    "enabled": True,
+    # Top-level blocks of <body> treated as the first screen (e.g. nav + hero)
+    "fold_blocks": 2,
+    # Above-the-fold images preloaded per page, the LCP candidate first
+    "preload_images": 2,
+    "preload_fonts": 2,
+    "preload_stylesheets": True,
+    "preconnect": True,
+    "modulepreload": True,
+}
+
+COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+FONT_FACE = re.compile(r'@font-face\s*\{([^}]*)\}', re.IGNORECASE)
+LAZY_LOADING = re.compile(r'''\s+loading\s*=\s*(?:"lazy"|'lazy'|lazy\b)''', re.IGNORECASE)
+# Stylesheet hosts whose fonts are served from another origin
+FONT_ORIGINS = {"fonts.googleapis.com": "https://fonts.gstatic.com"}
+FONT_TYPES = {".woff2": "font/woff2", ".woff": "font/woff", ".ttf": "font/ttf", ".otf": "font/otf"}
+
+
+def _origin(url: str) -> Optional[str]:
+    parts = urlsplit(url if not url.startswith('//') else "https:" + url)
+    if parts.scheme not in ("http", "https") or not parts.netloc:
+        return None
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _quote(value: str) -> str:
+    return value.replace('"', '&quot;')
+
+
+def _relative(page: str, target: str) -> str:
+    return posixpath.relpath(target, posixpath.dirname(page) or ".")
+
+
+def _outside(spans: List[Tuple[int, int]], position: int) -> bool:
+    return not any(start <= position < end for start, end in spans)
+
+
+def module_imports(source: str) -> List[str]:
+    """Specifiers of the static import/export-from statements of an ES module"""
+    try:
+        tokens = [(kind, text) for kind, text, _ in scan(source) if kind not in ("space", "newline", "comment")]
+    except JSSyntaxError:
+        return []
+    specifiers = []
+    for (kind, text), (next_kind, next_text) in zip(tokens, tokens[1:]):
+        # import "x"; import a from "x"; export * from "x" (not import("x"))
+        if kind == "word" and text in ("import", "from") and next_kind == "string":
+            specifiers.append(next_text[1:-1])
+    return specifiers
+
+
+class PageHints:
+    """Hints a page already has and the ones this stage adds"""
+
+    def __init__(self, page: str, html: str):
+        self.page = page
+        self.existing: Set[Tuple[str, str]] = set()
+        self.added: List[Tuple[str, str]] = []      # (rel, tag)
+        for match in HEAD_MARKUP.finditer(html):
+            token = match.group(0)
+            if not token.lower().startswith('<link'):
+                continue
+            attributes = parse_attributes(token)
+            href = attributes.get("href")
+            if href is None:
+                continue
+            for rel in (attributes.get("rel") or "").lower().split():
+                self.existing.add((rel, self._key(rel, href, "crossorigin" in attributes)))
+
+    def _key(self, rel: str, href: str, crossorigin: bool = False) -> str:
+        if rel in ("preconnect", "dns-prefetch"):
+            return f"{_origin(href) or href}|{crossorigin}"
+        return resolve_reference(self.page, href) or href
+
+    def has(self, rel: str, href: str, crossorigin: bool = False) -> bool:
+        return (rel, self._key(rel, href, crossorigin)) in self.existing
+
+    def add(self, rel: str, href: str, extra: List[Tuple[str, Optional[str]]] = (), crossorigin: bool = False):
+        if self.has(rel, href, crossorigin):
+            return
+        self.existing.add((rel, self._key(rel, href, crossorigin)))
+        attributes = [("rel", rel), ("href", href)] + list(extra)
+        if crossorigin:
+            attributes.append(("crossorigin", None))
+        tag = "<link" + ''.join(f' {name}="{_quote(value)}"' if value is not None else f' {name}'
+                                for name, value in attributes) + ">"
+        self.added.append((rel, tag))
+
+
+def _image_area(page: str, attributes: Dict, context) -> int:
+    """Rendered size estimate of an <img>: its width/height attributes or intrinsic size"""
+    width, height = attributes.get("width") or "", attributes.get("height") or ""
+    if width.isdigit() and height.isdigit():
+        return int(width) * int(height)
+    target = resolve_reference(page, attributes.get("src") or "")
+    path = context.source_path(target) if target and context.exists(target) else None
+    probed = probe_image(path) if path else None
+    if probed and probed.get("width") and probed.get("height"):
+        return probed["width"] * probed["height"]
+    return 0
+
+
+def _fold_images(page: str, html: str, context, blocks: int) -> List[Dict]:
+    """Attributes of the above-the-fold <img> elements that can be preloaded, in document order"""
+    root, _ = parse_html(html)
+    images = []
+    for element in above_the_fold(root, blocks):
+        if element.tag != "img" or (element.parent is not None and element.parent.tag == "picture"):
+            # <picture> picks its source at render time; a preload could fetch the wrong one
+            continue
+        src = element.attributes.get("src") or ""
+        if not src or src.startswith("data:"):
+            continue
+        target = resolve_reference(page, src)
+        if target is None and _origin(src) is None:
+            continue
+        if target is not None and not context.exists(target):
+            continue
+        images.append(element.attributes)
+    return images
+
+
+def _mark_lcp(html: str, src: str) -> Tuple[str, bool]:
+    """Add fetchpriority="high" (and drop loading="lazy") on the first <img> with this src"""
+    comments = [m.span() for m in COMMENT.finditer(html)]
+    for match in IMG_TAG.finditer(html):
+        if not _outside(comments, match.start()):
+            continue
+        attributes = parse_attributes(match.group(0))
+        if attributes.get("src") != src:
+            continue
+        if "fetchpriority" in attributes:
+            return html, False
+        tag = add_attributes(LAZY_LOADING.sub('', match.group(0)), [("fetchpriority", "high")])
+        return html[:match.start()] + tag + html[match.end():], True
+    return html, False
+
+
+def _font_preloads(page: str, html: str, context, hints: PageHints, limit: int):
+    """Local fonts of the @font-face rules in the page's inline styles and linked sheets"""
+    sources = []
+    for match in HEAD_MARKUP.finditer(html):
+        token = match.group(0)
+        if token.lower().startswith('<style'):
+            sources.append((page, token))
+        elif token.lower().startswith('<link'):
+            attributes = parse_attributes(token)
+            target = resolve_reference(page, attributes.get("href") or "")
+            rel = (attributes.get("rel") or "").lower().split()
+            as_style = "preload" in rel and (attributes.get("as") or "").lower() == "style"
+            if target and target.endswith('.css') and context.exists(target) and (
+                    is_stylesheet(attributes) or as_style):
+                sources.append((target, context.read_text(target)))
+    count = 0
+    for source, text in sources:
+        for face in FONT_FACE.finditer(text):
+            urls = CSS_URL.findall(face.group(1))
+            # The first format the browser supports wins; woff2 is listed first in practice
+            url = next((u for u in urls if u.split('?')[0].lower().endswith('.woff2')), urls[0] if urls else None)
+            target = resolve_reference(source, url) if url else None
+            if target is None or not context.exists(target) or count >= limit:
+                continue
+            font_type = FONT_TYPES.get(posixpath.splitext(target)[1].lower())
+            extra = [("as", "font")] + ([("type", font_type)] if font_type else [])
+            # Fonts are always fetched in CORS mode; without crossorigin the preload is wasted
+            href = _relative(page, target)
+            if not hints.has("preload", href):
+                hints.add("preload", href, extra, crossorigin=True)
+                count += 1
+
+
+def _stylesheet_preloads(page: str, html: str, context, hints: PageHints):
+    """Sheets the browser finds late: @import targets and stylesheets linked from <body>"""
+    body_start = html.lower().find('<body')
+    linked = []
+    for match in HEAD_MARKUP.finditer(html):
+        token = match.group(0)
+        if not token.lower().startswith('<link'):
+            continue
+        attributes = parse_attributes(token)
+        if not is_stylesheet(attributes):
+            continue
+        target = resolve_reference(page, attributes["href"])
+        if target is None or not context.exists(target):
+            continue
+        linked.append(target)
+        if 0 <= body_start < match.start():
+            hints.add("preload", attributes["href"], [("as", "style")])
+    for sheet in linked:
+        if not sheet.endswith('.css'):
+            continue
+        for reference in CSS_IMPORT.findall(context.read_text(sheet)):
+            target = resolve_reference(sheet, reference)
+            if target and target not in linked and context.exists(target):
+                hints.add("preload", _relative(page, target), [("as", "style")])
+
+
+def _module_preloads(page: str, html: str, context, hints: PageHints):
+    """modulepreload for local module scripts and everything they statically import"""
+    pending = []
+    for match in SCRIPT_ELEMENT.finditer(html):
+        attributes = parse_attributes(match.group(1))
+        if (attributes.get("type") or "").strip().lower() != "module":
+            continue
+        target = resolve_reference(page, attributes.get("src") or "")
+        if target and context.exists(target):
+            pending.append(target)
+    seen: Set[str] = set()
+    while pending:
+        module = pending.pop(0)
+        if module in seen:
+            continue
+        seen.add(module)
+        hints.add("modulepreload", _relative(page, module))
+        for specifier in module_imports(context.read_text(module)):
+            # Bare specifiers ("lodash") need an import map; only relative and absolute paths resolve
+            if specifier.startswith(('./', '../', '/')):
+                target = resolve_reference(module, specifier)
+                if target and context.exists(target):
+                    pending.append(target)
+
+
+def _preconnects(html: str, hints: PageHints, lcp: Optional[Dict]):
+    """Third-party origins the first render needs: stylesheets, their font hosts, the LCP image"""
+    origins = []
+    for match in HEAD_MARKUP.finditer(html):
+        token = match.group(0)
+        if token.lower().startswith('<link'):
+            attributes = parse_attributes(token)
+            origin = _origin(attributes.get("href") or "") if is_stylesheet(attributes) else None
+            if origin:
+                origins.append((origin, "crossorigin" in attributes))
+                host = urlsplit(origin).netloc
+                if host in FONT_ORIGINS:
+                    origins.append((FONT_ORIGINS[host], True))
+    for match in SCRIPT_ELEMENT.finditer(html):
+        attributes = parse_attributes(match.group(1))
+        origin = _origin(attributes.get("src") or "")
+        if origin:
+            crossorigin = "crossorigin" in attributes or (attributes.get("type") or "").lower() == "module"
+            origins.append((origin, crossorigin))
+    if lcp is not None:
+        origin = _origin(lcp.get("src") or "")
+        if origin:
+            origins.append((origin, "crossorigin" in lcp))
+    for origin, crossorigin in origins:
+        hints.add("preconnect", origin, crossorigin=crossorigin)
+
+
+def _insert(html: str, tags: List[str]) -> str:
+    """Insert tags in <head> before its first link, style or script"""
+    head = re.search(r'<head\b[^>]*>', html, re.IGNORECASE)
+    head_end = html.lower().find('</head>')
+    if head is None or head_end == -1:
+        return html
+    candidates = [match.start() for match in HEAD_MARKUP.finditer(html, head.end(), head_end)
+                  if not match.group(0).startswith('<!--')]
+    script = SCRIPT_ELEMENT.search(html, head.end(), head_end)
+    if script:
+        candidates.append(script.start())
+    position = min(candidates) if candidates else head_end
+    line_start = html.rfind('\n', 0, position) + 1
+    indent = html[line_start:position]
+    # One tag per line when the anchor starts its own line, else inline
+    separator = "" if indent.strip() else f"\n{indent}"
+    return html[:position] + separator.join(tags) + separator + html[position:]
+
+
+def run(context, options: Dict) -> Dict:
+    """Export stage: add preload, preconnect, modulepreload and fetchpriority hints"""
+    options = dict(DEFAULT_OPTIONS, **options)
+    stats = {"title": "Resource hints", "pages": 0, "hinted_pages": 0, "preload": 0, "preconnect": 0,
+             "modulepreload": 0, "fetchpriority": 0, "lcp": {}}
+
+    for page in context.files("html"):
+        html = context.read_text(page)
+        stats["pages"] += 1
+        hints = PageHints(page, html)
+        original = html
+
+        images = _fold_images(page, html, context, options["fold_blocks"]) if options["preload_images"] else []
+        lcp = None
+        if images:
+            # An image the author already marked wins; otherwise the largest one is the LCP candidate
+            lcp = next((a for a in images if (a.get("fetchpriority") or "").lower() == "high"), None)
+            if lcp is None:
+                areas = [_image_area(page, attributes, context) for attributes in images]
+                lcp = images[areas.index(max(areas))]
+            html, marked = _mark_lcp(html, lcp["src"])
+            stats["fetchpriority"] += marked
+            stats["lcp"][page] = lcp["src"]
+
+        if options["preconnect"]:
+            _preconnects(html, hints, lcp)
+        if options["preload_stylesheets"]:
+            _stylesheet_preloads(page, html, context, hints)
+        if options["preload_fonts"]:
+            _font_preloads(page, html, context, hints, options["preload_fonts"])
+        if images:
+            ordered = [lcp] + [attributes for attributes in images if attributes is not lcp]
+            # Images the author lazy-loads stay lazy, unless they are the LCP candidate
+            ordered = [a for a in ordered if a is lcp or (a.get("loading") or "").lower() != "lazy"]
+            for attributes in ordered[:options["preload_images"]]:
+                extra = [("as", "image")]
+                if attributes.get("srcset"):
+                    extra.append(("imagesrcset", attributes["srcset"]))
+                    if attributes.get("sizes"):
+                        extra.append(("imagesizes", attributes["sizes"]))
+                if attributes is lcp:
+                    extra.append(("fetchpriority", "high"))
+                hints.add("preload", attributes["src"], extra)
+        if options["modulepreload"]:
+            _module_preloads(page, html, context, hints)
+
+        if hints.added:
+            html = _insert(html, [tag for _, tag in hints.added])
+            for rel, _ in hints.added:
+                stats[rel] += 1
+        if html != original:
+            context.write(page, html)
+            stats["hinted_pages"] += 1
+
+    total = stats["preload"] + stats["preconnect"] + stats["modulepreload"]
+    stats["message"] = (f"{total} hint{'s' if total != 1 else ''} in {stats['hinted_pages']} of "
+                        f"{stats['pages']} pages ({stats['preload']} preload, {stats['preconnect']} preconnect, "
+                        f"{stats['modulepreload']} modulepreload), fetchpriority=high on "
+                        f"{stats['fetchpriority']} LCP image{'s' if stats['fetchpriority'] != 1 else ''}")
+    return stats
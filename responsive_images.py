@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Responsive Images
+Export stage that generates downscaled variants of local raster images and
+rewrites every <img> tag with srcset/sizes, intrinsic width/height and
+loading="lazy" decoding="async" (except above-the-fold images). Variants are
+cached under .editor_cache/variants by source content hash, so re-exports
+only link them.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+from html_tags import IMG_TAG, parse_attributes, add_attributes
+from site_graph import resolve_reference
+
+VARIANTS_DIR_NAME = "variants"
+DEFAULT_OPTIONS = {
+    "enabled": True,
+    "widths": [320, 640, 960, 1280],
+    "sizes": "(max-width: 768px) 100vw, 50vw",
+    # Images with one of these classes are above the fold: never lazy
+    "eager": ["logo-icon", "profile-photo"],
+    "quality": 80,
+}
+RESIZABLE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+EXIF_ORIENTATION = 0x0112
+# Bumped whenever rendering changes, so cached variants are rendered again
+VARIANT_VERSION = 2
+
+
+def variant_name(rel_path: str, width: int) -> str:
+    """images/photo.jpg -> images/photo-640w.jpg"""
+    stem, ext = os.path.splitext(rel_path)
+    return f"{stem}-{width}w{ext}"
+
+
+def _render_variant(source: str, target: str, width: int, quality: int):
+    """Downscale source to width and save it atomically to target (worker thread)"""
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        fmt = image.format
+        # Widths and heights are those of the EXIF-oriented image, as browsers show it
+        swapped = image.getexif().get(EXIF_ORIENTATION, 1) in (5, 6, 7, 8)
+        oriented_width, oriented_height = (image.height, image.width) if swapped else image.size
+        height = max(1, round(oriented_height * width / oriented_width))
+        image.draft(image.mode, (height, width) if swapped else (width, height))
+        resized = ImageOps.exif_transpose(image).resize((width, height), Image.LANCZOS)
+    params = {"optimize": True}
+    if fmt == "JPEG":
+        if resized.mode not in ("RGB", "L"):
+            resized = resized.convert("RGB")
+        params.update(quality=quality, progressive=True)
+    elif fmt == "WEBP":
+        params = {"quality": quality, "method": 6}
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temp_path = f"{target}.{os.getpid()}.tmp"
+    resized.save(temp_path, fmt, **params)
+    os.replace(temp_path, target)
+
+
+def run(context, options: Dict) -> Dict:
+    """Export stage: generate variants and rewrite <img> tags in every page"""
+    from image_cache import get_image_cache
+
+    options = dict(DEFAULT_OPTIONS, **options)
+    widths = sorted(set(int(w) for w in options["widths"]))
+    eager_classes = set(options["eager"])
+    image_cache = get_image_cache(context.template_path)
+    variants_dir = os.path.join(context.cache_dir, VARIANTS_DIR_NAME)
+
+    pending = {}      # cache path -> (source, width)
+    planned = {}      # image rel path -> [(variant rel path, width, cache path)]
+    stats = {"pages": 0, "images": 0, "srcset": 0, "lazy": 0, "variants": 0, "generated": 0}
+
+    def plan(rel_path: str, intrinsic_width: int) -> List[Tuple[str, int, str]]:
+        if rel_path in planned:
+            return planned[rel_path]
+        variants = []
+        digest = context.index.content_hash(rel_path) if rel_path in context.index.files else None
+        source = context.source_path(rel_path)
+        if digest and source and rel_path.lower().endswith(RESIZABLE_EXTENSIONS):
+            ext = os.path.splitext(rel_path)[1].lower()
+            for width in widths:
+                if width >= intrinsic_width:
+                    break
+                cached = os.path.join(variants_dir, digest[:2], f"{digest}-{width}q{options['quality']}v{VARIANT_VERSION}{ext}")
+                if not os.path.exists(cached):
+                    pending[cached] = (source, width)
+                variants.append((variant_name(rel_path, width), width, cached))
+        planned[rel_path] = variants
+        return variants
+
+    def rewrite_tag(page: str, match) -> str:
+        tag = match.group(0)
+        attributes = parse_attributes(tag)
+        src = attributes.get("src")
+        target = resolve_reference(page, src) if src else None
+        stats["images"] += 1
+        extra = []
+
+        # External images only get the loading hints
+        meta = image_cache.get_metadata(target) if target in context.index.files else None
+        width, height = (meta or {}).get("width"), (meta or {}).get("height")
+        if width and height and "width" not in attributes and "height" not in attributes:
+            extra += [("width", str(width)), ("height", str(height))]
+
+        if width and "srcset" not in attributes:
+            variants = plan(target, width)
+            if variants:
+                base = src.split('?')[0].split('#')[0]
+                prefix = base[:len(base) - len(os.path.basename(base))]
+                candidates = [f"{prefix}{os.path.basename(name)} {w}w" for name, w, _ in variants]
+                candidates.append(f"{src} {width}w")
+                extra.append(("srcset", ", ".join(candidates)))
+                if "sizes" not in attributes:
+                    extra.append(("sizes", options["sizes"]))
+                stats["srcset"] += 1
+
+        classes = set((attributes.get("class") or "").split())
+        eager = (classes & eager_classes or attributes.get("fetchpriority") == "high" or
+                 attributes.get("loading") == "eager")
+        if not eager:
+            if "loading" not in attributes:
+                extra.append(("loading", "lazy"))
+            if "decoding" not in attributes:
+                extra.append(("decoding", "async"))
+            stats["lazy"] += 1
+        return add_attributes(tag, extra)
+
+    for page in context.files("html"):
+        text = context.read_text(page)
+        rewritten = IMG_TAG.sub(lambda m: rewrite_tag(page, m), text)
+        stats["pages"] += 1
+        if rewritten != text:
+            context.write(page, rewritten)
+
+    # Missing variants are rendered in parallel; Pillow releases the GIL while resizing
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1)) as pool:
+            list(pool.map(lambda item: _render_variant(item[1][0], item[0], item[1][1], options["quality"]),
+                          pending.items()))
+    for variants in planned.values():
+        for name, _, cached in variants:
+            context.add_file(name, cached)
+            stats["variants"] += 1
+    stats["generated"] = len(pending)
+    image_cache.save_metadata()
+
+    stats["message"] = (f"{stats['images']} images in {stats['pages']} pages, {stats['srcset']} with srcset, "
+                        f"{stats['lazy']} lazy; {stats['variants']} variants ({stats['generated']} generated)")
+    return stats
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Service Worker
+Export stage that fingerprints the final output into asset-manifest.json and
+generates a versioned sw.js from it: pages and assets are precached on
+install (unchanged files are copied over from the previous version's cache),
+HTML is served stale-while-revalidate, fingerprinted assets cache-first, and
+caches of older versions are deleted on activation.
+"""
+
+import re
+import json
+import fnmatch
+import hashlib
+import posixpath
+from typing import Dict, Set
+
+from file_index import file_type
+from html_tags import IMG_TAG, parse_attributes
+from site_graph import CSS_URL, HTML_REFERENCE, extract_references, resolve_reference
+
+DEFAULT_OPTIONS = {
+    "enabled": True,
+    # Served from the site root so its scope covers every page
+    "filename": "sw.js",
+    "manifest": "asset-manifest.json",
+    "cache_prefix": "site",
+    "precache_types": ["html", "css", "js", "json", "image", "font"],
+    # Larger files are left to the browser's HTTP cache
+    "precache_max_kb": 512,
+    # Glob patterns never precached, e.g. ["images/gallery/*"]
+    "exclude": [],
+}
+# Other types (images, fonts, ...) are only precached when a page or stylesheet links them
+ALWAYS_PRECACHED = ("html", "css", "js")
+# Files named like bundle.81dfa360f3.css never change content under the same URL
+FINGERPRINTED = re.compile(r'\.[0-9a-f]{10}\.\w+$')
+GENERATED_MARKER = "/* Generated by the export pipeline"
+
+SERVICE_WORKER = GENERATED_MARKER + r"""; edit service_worker.py instead */
+'use strict';
+const VERSION = %(version)s;
+const PREFIX = %(prefix)s + '-';
+const PRECACHE = PREFIX + 'precache-' + VERSION;
+const RUNTIME = PREFIX + 'runtime-' + VERSION;
+// Path -> revision; fingerprinted paths have none because their name is their revision
+const PRECACHE_MANIFEST = %(precache)s;
+const FINGERPRINTED = /%(fingerprinted)s/;
+
+const scope = self.registration.scope;
+const cacheKeys = new Map();
+for (const [path, revision] of Object.entries(PRECACHE_MANIFEST)) {
+  const url = new URL(path, scope).href;
+  const key = revision ? url + (url.includes('?') ? '&' : '?') + '__rev=' + revision : url;
+  cacheKeys.set(url, key);
+  // "/" and "dir/" are served by their index page
+  if (/(^|\/)index\.html$/.test(path)) {
+    cacheKeys.set(url.slice(0, -'index.html'.length), key);
+  }
+}
+
+function cleanResponse(response) {
+  // Redirected responses must not answer navigations
+  if (!response.redirected) {
+    return response;
+  }
+  return response.blob().then(body => new Response(body, {
+    status: response.status, statusText: response.statusText, headers: response.headers
+  }));
+}
+
+self.addEventListener('install', event => {
+  event.waitUntil((async () => {
+    const cache = await caches.open(PRECACHE);
+    await Promise.all([...new Set(cacheKeys.values())].map(async key => {
+      if (await cache.match(key)) {
+        return;
+      }
+      // Keys carry the revision, so a match in an older cache has the same content
+      const previous = await caches.match(key);
+      if (previous) {
+        return cache.put(key, previous);
+      }
+      const response = await fetch(key, {cache: 'no-cache'});
+      if (!response.ok) {
+        throw new Error('Precaching ' + key + ' failed: ' + response.status);
+      }
+      await cache.put(key, await cleanResponse(response));
+    }));
+    await self.skipWaiting();
+  })());
+});
+
+self.addEventListener('activate', event => {
+  event.waitUntil((async () => {
+    for (const name of await caches.keys()) {
+      if (name.startsWith(PREFIX) && name !== PRECACHE && name !== RUNTIME) {
+        await caches.delete(name);
+      }
+    }
+    await self.clients.claim();
+  })());
+});
+
+function revalidate(request) {
+  return fetch(request).then(response => {
+    if (!response.ok || response.type === 'opaque') {
+      return response;
+    }
+    const copy = response.clone();
+    return caches.open(RUNTIME).then(cache => cache.put(request, copy)).then(() => response);
+  });
+}
+
+async function staleWhileRevalidate(event, request, key) {
+  const network = revalidate(request);
+  event.waitUntil(network.catch(() => undefined));
+  const cached = await caches.match(request, {cacheName: RUNTIME}) || (key && await caches.match(key));
+  if (cached) {
+    return cached;
+  }
+  try {
+    return await network;
+  } catch (error) {
+    // Offline and never seen: fall back to the start page
+    const fallback = cacheKeys.get(scope) && await caches.match(cacheKeys.get(scope));
+    if (fallback) {
+      return fallback;
+    }
+    throw error;
+  }
+}
+
+async function cacheFirst(request, key) {
+  const cached = await caches.match(key || request);
+  return cached || revalidate(request);
+}
+
+self.addEventListener('fetch', event => {
+  const request = event.request;
+  if (request.method !== 'GET') {
+    return;
+  }
+  const url = new URL(request.url);
+  if (url.origin !== self.location.origin) {
+    return;
+  }
+  const key = cacheKeys.get(url.origin + url.pathname);
+  const html = request.mode === 'navigate' || (request.headers.get('Accept') || '').includes('text/html');
+  if (html) {
+    event.respondWith(staleWhileRevalidate(event, request, key));
+  } else if (key || FINGERPRINTED.test(url.pathname)) {
+    event.respondWith(cacheFirst(request, key));
+  }
+});
+"""
+
+
+def _referenced(context, files) -> Set[str]:
+    """Files pages and stylesheets point at directly; srcset candidates are left out
+    because the browser fetches only one of them"""
+    referenced, candidates = set(), set()
+    for path in files:
+        if file_type(path) not in ("html", "css"):
+            continue
+        content = context.read_text(path)
+        if path.endswith('.css'):
+            references = extract_references(path, content)
+        else:
+            references = HTML_REFERENCE.findall(content) + CSS_URL.findall(content)
+            # An <img> with srcset only falls back to its src in browsers without srcset support
+            candidates.update(resolve_reference(path, attributes["src"]) for attributes in map(
+                parse_attributes, IMG_TAG.findall(content)) if attributes.get("srcset") and attributes.get("src"))
+        referenced.update(resolve_reference(path, reference) for reference in references)
+    return referenced - candidates - {None}
+
+
+def _registered(context, filename: str) -> bool:
+    """True if a page or script registers the service worker"""
+    pattern = re.compile(r'serviceWorker\s*\.\s*register\s*\(\s*["\'`]/?(?:\./)?' + re.escape(filename))
+    return any(pattern.search(context.read_text(path)) for path in context.files()
+               if file_type(path) in ("html", "js"))
+
+
+def run(context, options: Dict) -> Dict:
+    """Export stage: write asset-manifest.json and a versioned service worker"""
+    options = dict(DEFAULT_OPTIONS, **options)
+    filename, manifest_name = options["filename"], options["manifest"]
+    stats = {"title": "Service worker", "files": 0, "fingerprinted": 0, "precached": 0,
+             "precache_bytes": 0, "version": None}
+
+    if context.exists(filename) and not context.read_text(filename).startswith(GENERATED_MARKER):
+        # Never replace a hand-written worker
+        stats["message"] = f"{filename} exists in the template; not generated"
+        return stats
+
+    generated = {filename, manifest_name}
+    files = [path for path in context.files() if path not in generated]
+    referenced = _referenced(context, files)
+    assets = {}
+    precache = {}
+    for path in files:
+        size = context.size(path)
+        fingerprinted = bool(FINGERPRINTED.search(posixpath.basename(path)))
+        revision = context.content_hash(path)[:10]
+        assets[path] = {"revision": revision, "bytes": size, "fingerprinted": fingerprinted}
+        stats["fingerprinted"] += fingerprinted
+        if (file_type(path) in options["precache_types"] and size <= options["precache_max_kb"] * 1024 and
+                (file_type(path) in ALWAYS_PRECACHED or path in referenced) and
+                not any(fnmatch.fnmatchcase(path, pattern) for pattern in options["exclude"])):
+            precache[path] = None if fingerprinted else revision
+            stats["precache_bytes"] += size
+    stats["files"] = len(assets)
+    stats["precached"] = len(precache)
+
+    # Any change to a precached file yields a new version, hence new caches
+    version = hashlib.sha256(json.dumps(precache, sort_keys=True).encode('utf-8')).hexdigest()[:10]
+    stats["version"] = version
+    context.write(manifest_name, json.dumps({"version": version, "files": assets}, indent=1, sort_keys=True))
+    context.write(filename, SERVICE_WORKER % {
+        "version": json.dumps(version),
+        "prefix": json.dumps(options["cache_prefix"]),
+        "precache": json.dumps(precache, indent=1, sort_keys=True),
+        "fingerprinted": FINGERPRINTED.pattern.replace('/', r'\/'),
+    })
+
+    stats["message"] = (f"{filename} version {version}: {stats['precached']} of {stats['files']} files "
+                        f"precached ({stats['precache_bytes'] / 1024:.1f} KB), "
+                        f"{stats['fingerprinted']} fingerprinted")
+    if not _registered(context, filename):
+        stats["message"] += f"; warning: no page or script registers /{filename}"
+    return stats
+
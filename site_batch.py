@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Batch Site Builder
+Renders many website_config.json variants of one template (per language,
+department, staging/production, ...) across a process pool. The template is
+parsed and its deployable assets are hashed once in the parent; workers get
+that snapshot through the pool initializer, render HTML and CSS in memory, run
+the same build stages as a single export and link unchanged assets from a
+content-addressed store shared by all sites.
+"""
+
+import os
+import json
+import time
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from file_index import get_file_index
+from site_render import render_index_html
+from site_builder import CSS_STYLES, DEFAULT_STYLE, load_config
+
+ASSET_STORE_NAME = ".assets"
+
+# Snapshot of the template shared by every site of a batch (set per worker process)
+_shared: Optional[Dict] = None
+
+
+def _init_worker(shared: Dict):
+    global _shared
+    _shared = shared
+
+
+def site_names(config_paths: List[str]) -> List[str]:
+    """Output folder name per config: file stem, or folder name for website_config.json"""
+    names, seen = [], {}
+    for path in config_paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if stem == "website_config":
+            stem = os.path.basename(os.path.dirname(os.path.abspath(path))) or stem
+        count = seen.get(stem, 0)
+        seen[stem] = count + 1
+        names.append(stem if count == 0 else f"{stem}-{count + 1}")
+    return names
+
+
+def ignore_output(template_path: str, rel_dir: str) -> bool:
+    """Add an output folder inside the template to its .editorignore, so exports,
+    link checks and clean-ups skip it too. Returns True if the file was changed."""
+    index = get_file_index(template_path)
+    if index.is_excluded(rel_dir, True):
+        return False
+    path = os.path.join(template_path, ".editorignore")
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+    except OSError:
+        text = ""
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(("\n" if text and not text.endswith("\n") else "") +
+                f"# Batch builds (site_builder.py batch)\n/{rel_dir}/\n")
+    index.reload_rules()
+    return True
+
+
+def stage_assets(template_path: str, store_dir: str, profile: str, skip: str = "") -> Dict:
+    """Hash deployable files once and make sure each is in the shared asset store.
+
+    Files under the skip prefix (the batch output) are left out. Returns the
+    snapshot handed to the workers.
+    """
+    from site_export import deployable_files
+
+    index = get_file_index(template_path)
+
+    os.makedirs(store_dir, exist_ok=True)
+    assets = {}
+    for rel_path in deployable_files(index, profile):
+        if skip and rel_path.startswith(skip):
+            continue
+        digest = index.content_hash(rel_path)
+        if digest is None:
+            continue
+        stored = os.path.join(store_dir, digest[:2], digest)
+        if not os.path.exists(stored):
+            os.makedirs(os.path.dirname(stored), exist_ok=True)
+            temp_path = f"{stored}.{os.getpid()}.tmp"
+            shutil.copy2(index.abspath(rel_path), temp_path)
+            os.replace(temp_path, stored)
+        assets[rel_path] = (stored, index.files[rel_path]["size"])
+    index.save()
+    return {"assets": assets, "skip": skip}
+
+
+def _build_site(name: str, config_path: str, site_dir: str) -> Dict:
+    """Render one configuration into site_dir (worker process)"""
+    from site_export import clone_file, profile_excludes
+    from export_pipeline import ExportContext, run_stages
+
+    started = time.perf_counter()
+    shared = _shared
+    config = load_config(config_path)
+    css_file, css_builder = CSS_STYLES[shared["style"]]
+
+    context = ExportContext(shared["template"], config, shared["profile"])
+    if shared["skip"]:
+        for rel_path in context.files():
+            if rel_path.startswith(shared["skip"]):
+                context.remove(rel_path)
+    # Per-site outputs are rendered in memory from the shared template text,
+    # then go through the same build stages as a single export
+    context.write(css_file, css_builder(config, shared["custom_css"]))
+    if shared["html"] is not None:
+        context.write(shared["html_file"], render_index_html(shared["html"], config, css_file))
+    run_stages(context)
+    if not profile_excludes("website_config.json", shared["profile"]):
+        context.write("website_config.json", json.dumps(config, indent=2))
+
+    if os.path.exists(site_dir):
+        shutil.rmtree(site_dir)
+    os.makedirs(site_dir)
+
+    result = {"name": name, "config": config_path, "output": site_dir,
+              "files": 0, "linked": 0, "copied": 0, "bytes": 0}
+    created_dirs = set()
+    for rel_path in context.files():
+        dst = os.path.join(site_dir, *rel_path.split('/'))
+        parent = os.path.dirname(dst)
+        if parent not in created_dirs:
+            os.makedirs(parent, exist_ok=True)
+            created_dirs.add(parent)
+        data = context.overlay.data.get(rel_path)
+        if data is not None:
+            with open(dst, 'wb') as f:
+                f.write(data)
+            size = len(data)
+        elif rel_path in shared["assets"] and rel_path not in context.overlay.files:
+            stored, size = shared["assets"][rel_path]
+            if clone_file(stored, dst) == "copy":
+                result["copied"] += 1
+            else:
+                result["linked"] += 1
+        else:
+            # Stage output cached in the template (e.g. image variants)
+            shutil.copy2(context.source_path(rel_path), dst)
+            size = os.path.getsize(dst)
+            result["copied"] += 1
+        result["files"] += 1
+        result["bytes"] += size
+
+    result["stages"] = context.report
+    result["elapsed"] = time.perf_counter() - started
+    return result
+
+
+def batch_build(template_path: str, config_paths: List[str], output_dir: str,
+                style: str = DEFAULT_STYLE, custom_css: str = "", profile: Optional[str] = None,
+                workers: Optional[int] = None, html_file: str = "index.html", on_site=None) -> Dict:
+    """Build every config into output_dir/<name>/ in parallel.
+
+    on_site, if given, is called with each per-site result as it completes.
+    Returns a summary with per-site results, total bytes, elapsed time and throughput.
+    """
+    from site_export import DEFAULT_PROFILE
+
+    started = time.perf_counter()
+    template_path = os.path.abspath(template_path)
+    output_dir = os.path.abspath(output_dir)
+    profile = profile or DEFAULT_PROFILE
+    if output_dir == template_path or template_path.startswith(output_dir + os.sep):
+        raise ValueError("Batch output folder must not contain the template")
+    # An output folder inside the template must not be built into the next batch
+    skip = ""
+    if output_dir.startswith(template_path + os.sep):
+        skip = os.path.relpath(output_dir, template_path).replace(os.sep, '/') + '/'
+        ignore_output(template_path, skip[:-1])
+
+    shared = stage_assets(template_path, os.path.join(output_dir, ASSET_STORE_NAME), profile, skip)
+    html_path = os.path.join(template_path, html_file)
+    shared["html"] = None
+    if os.path.exists(html_path):
+        with open(html_path, 'r', encoding='utf-8') as f:
+            shared["html"] = f.read()
+    shared.update(template=template_path, profile=profile, html_file=html_file, style=style,
+                  custom_css=custom_css)
+    prepared = time.perf_counter() - started
+
+    names = site_names(config_paths)
+    jobs = [(name, os.path.abspath(path), os.path.join(output_dir, name))
+            for name, path in zip(names, config_paths)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs) or 1))
+
+    sites = []
+    if workers == 1:
+        _init_worker(shared)
+        for job in jobs:
+            sites.append(_build_site(*job))
+            if on_site is not None:
+                on_site(sites[-1])
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shared,)) as pool:
+            futures = [pool.submit(_build_site, *job) for job in jobs]
+            for future in futures:
+                sites.append(future.result())
+                if on_site is not None:
+                    on_site(sites[-1])
+
+    elapsed = time.perf_counter() - started
+    total_bytes = sum(site["bytes"] for site in sites)
+    return {"output_dir": output_dir, "profile": profile, "workers": workers, "sites": sites,
+            "assets": len(shared["assets"]), "prepare": prepared, "elapsed": elapsed,
+            "bytes": total_bytes,
+            "sites_per_second": len(sites) / elapsed if elapsed else 0.0,
+            "mb_per_second": total_bytes / (1024 * 1024) / elapsed if elapsed else 0.0}
+
+
+def describe_site(site: Dict) -> str:
+    """One-line per-site result"""
+    return (f"{site['name']}: {site['files']} files ({site['linked']} linked, "
+            f"{site['copied']} copied) in {site['elapsed'] * 1000:.0f} ms -> {site['output']}")
+
+
+def describe_batch(summary: Dict) -> str:
+    """One-line batch throughput summary"""
+    return (f"Built {len(summary['sites'])} sites with {summary['workers']} workers in "
+            f"{summary['elapsed']:.2f} s (template prepared in {summary['prepare'] * 1000:.0f} ms): "
+            f"{summary['sites_per_second']:.1f} sites/s, {summary['mb_per_second']:.1f} MB/s")
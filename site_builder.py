@@ -0,0 +1,608 @@
+#!/usr/bin/env python3
+"""
+Headless Site Builder
+Build engine shared by both Tk editors and usable from scripts and CI.
+Renders a website_config.json into the template, exports it, serves a preview
+and reports stats without a display. Heavy modules are imported lazily so the
+command line starts quickly.
+
+Usage:
+    python site_builder.py build   --config website_config.json
+    python site_builder.py export  --config website_config.json --version v1.2 --format zip
+    python site_builder.py preview --port 8090
+    python site_builder.py stats
+    python site_builder.py watch   --config website_config.json
+    python site_builder.py optimize-images [--restore]
+    python site_builder.py icons   [--source images/Logo.png] [--padding 0.1]
+    python site_builder.py check-links [--all]
+    python site_builder.py disk-usage
+    python site_builder.py gc [--dry-run] [--restore]
+    python site_builder.py batch   configs/*.json --output builds --workers 4
+"""
+
+import os
+import sys
+import json
+import copy
+import time
+import contextlib
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from site_render import render_site, build_basic_css, build_custom_css
+from page_weight import BudgetExceeded
+
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_CONFIG = {
+    "meta": {
+        "title": "Hamid Haghmoradi | Quantum Force Metrology",
+        "description": "Doctoral Researcher in Quantum Force Metrology",
+        "author": "Hamid Haghmoradi",
+        "version": "1.0.0"
+    },
+    "colors": {
+        "primary": "#007AFF",
+        "secondary": "#5856D6",
+        "accent": "#FF9F0A",
+        "background": "#FFFFFF",
+        "text": "#000000"
+    },
+    "logo": {
+        "src": "images/logo.svg",
+        "width": "6rem",
+        "height": "6rem",
+        "alt": "HH Logo"
+    },
+    "navigation": {
+        "title": "Hamid Haghmoradi",
+        "menu_items": ["Home", "Research", "Publications", "Contact"]
+    },
+    "sections": [],
+    "images": {},
+    "tiles": [],
+    # Export build stages (see export_pipeline.py)
+    "build": {
+        "responsive_images": {
+            "enabled": True,
+            "widths": [320, 640, 960, 1280],
+            "sizes": "(max-width: 768px) 100vw, 50vw",
+            "eager": ["logo-icon", "profile-photo"]
+        },
+        "css_bundle": {
+            "enabled": True,
+            "minify": True,
+            "merge_rules": True,
+            "source_map": False,
+            "output_dir": "styles"
+        },
+        "css_prune": {
+            "enabled": True,
+            "prune": True,
+            "critical": True,
+            "fold_blocks": 2,
+            "safelist": []
+        },
+        "js_optimize": {
+            "enabled": True,
+            "minify": True,
+            "defer": True,
+            "lazy_methods": [],
+            "benchmark": False
+        },
+        "asset_inline": {
+            "enabled": True,
+            "max_bytes": 4096,
+            "repeat_views": 3,
+            "request_bytes": 1500,
+            "images": True,
+            "stylesheets": True
+        },
+        "resource_hints": {
+            "enabled": True,
+            "fold_blocks": 2,
+            "preload_images": 2,
+            "preload_fonts": 2,
+            "preload_stylesheets": True,
+            "preconnect": True,
+            "modulepreload": True
+        },
+        "html_minify": {
+            "enabled": True,
+            "remove_comments": True,
+            "collapse_whitespace": True,
+            "remove_redundant_attributes": True,
+            "minify_inline_css": True
+        },
+        "service_worker": {
+            "enabled": True,
+            "filename": "sw.js",
+            "manifest": "asset-manifest.json",
+            "cache_prefix": "site",
+            "precache_types": ["html", "css", "js", "json", "image", "font"],
+            "precache_max_kb": 512,
+            "exclude": []
+        },
+        "page_weight": {
+            "enabled": True,
+            "on_exceed": "warn",
+            "viewport_width": 1280,
+            "device_pixel_ratio": 2,
+            "budgets": {
+                "total_kb": 1000,
+                "html_kb": 100,
+                "css_kb": 100,
+                "js_kb": 150,
+                "image_kb": 600,
+                "font_kb": 150,
+                "requests": 40,
+                "render_blocking": 3,
+                "oversized_image_kb": 100
+            }
+        }
+    }
+}
+
+# Generated stylesheet flavours: (file name, builder)
+CSS_STYLES = {
+    "basic": ("custom_styles.css", build_basic_css),
+    "custom": ("custom_editor_styles.css", build_custom_css),
+}
+DEFAULT_STYLE = "custom"
+
+
+def default_config() -> Dict:
+    """Fresh copy of the default website configuration"""
+    return copy.deepcopy(DEFAULT_CONFIG)
+
+
+def merge_config(base: Dict, override: Dict) -> Dict:
+    """Merge override into base at every level of nesting; lists and values replace"""
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            merge_config(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+def load_config(path: str) -> Dict:
+    """Load a website_config.json, filling missing sections and keys from the defaults"""
+    with open(path, 'r', encoding='utf-8') as f:
+        loaded = json.load(f)
+    return merge_config(default_config(), loaded)
+
+
+class SiteBuilder:
+    """Render, export, preview and measure one template with one configuration"""
+
+    def __init__(self, template_path: str, config: Optional[Dict] = None,
+                 custom_css: str = "", style: str = DEFAULT_STYLE, lock=None):
+        self.template_path = os.path.abspath(template_path)
+        self.config = config if config is not None else default_config()
+        self.custom_css = custom_css
+        self.style = style
+        # Serializes renders of the same template (the editors share one lock)
+        self.lock = lock if lock is not None else contextlib.nullcontext()
+
+    @property
+    def css_file(self) -> str:
+        return CSS_STYLES[self.style][0]
+
+    def build(self, outputs: Optional[Set[str]] = None) -> List[str]:
+        """Apply the configuration to the template; returns the files that changed.
+
+        outputs limits the render to some of the generated files (see changed_outputs).
+        """
+        css_file, css_builder = CSS_STYLES[self.style]
+        with self.lock:
+            return render_site(self.template_path, self.config, self.custom_css,
+                               css_file=css_file, css_builder=css_builder, outputs=outputs)
+
+    def rendered_files(self) -> Set[str]:
+        return {"index.html", self.css_file}
+
+    def rendered_state(self) -> Dict[str, Optional[tuple]]:
+        """(size, mtime_ns) of the rendered files, to notice edits made outside the builder"""
+        from site_graph import file_state
+        return file_state(self.template_path, sorted(self.rendered_files()))
+
+    def changed_outputs(self, previous_config: Optional[Dict], previous_css: Optional[str] = None) -> Set[str]:
+        """Generated files affected by the configuration changes since a previous render"""
+        from site_graph import DependencyGraph, CONFIG_PREFIX, changed_config_keys
+        from site_render import HTML_CONFIG_KEYS, CSS_CONFIG_KEYS
+
+        graph = DependencyGraph()
+        for key in HTML_CONFIG_KEYS:
+            graph.add("index.html", CONFIG_PREFIX + key)
+        for key in CSS_CONFIG_KEYS:
+            graph.add(self.css_file, CONFIG_PREFIX + key)
+        keys = changed_config_keys(previous_config, self.config, previous_css, self.custom_css)
+        return graph.affected(changed_keys=keys, transitive=False)
+
+    def graph(self, profile: Optional[str] = None):
+        """Dependency graph of the template's pages, assets and configuration keys"""
+        from site_graph import build_graph
+        return build_graph(self.template_path, css_file=self.css_file, profile=profile)
+
+    def watch(self, config_path: Optional[str] = None, custom_css_path: Optional[str] = None,
+              interval: float = 0.5, on_rebuild=None, stop_event=None):
+        """Poll inputs and re-render only the outputs affected by each change.
+
+        on_rebuild is called with {"files", "keys", "affected", "rendered", "elapsed"}
+        after every change. Runs until stop_event (a threading.Event) is set.
+        """
+        from site_graph import file_state, changed_config_keys
+
+        rendered_files = self.rendered_files()
+        self.build()
+        graph = self.graph()
+        sources = [p for p in (config_path, custom_css_path) if p]
+        source_state = file_state("", sources)
+        state = file_state(self.template_path, graph.files())
+
+        while stop_event is None or not stop_event.wait(interval):
+            if stop_event is None:
+                time.sleep(interval)
+            started = time.perf_counter()
+
+            # Configuration and custom CSS files feed configuration keys
+            keys: Set[str] = set()
+            current_sources = file_state("", sources)
+            if current_sources != source_state:
+                source_state = current_sources
+                old_config, old_css = self.config, self.custom_css
+                try:
+                    if config_path:
+                        self.config = load_config(config_path)
+                    if custom_css_path:
+                        with open(custom_css_path, 'r', encoding='utf-8') as f:
+                            self.custom_css = f.read()
+                except (OSError, ValueError):
+                    # Half-written file: keep the last good configuration
+                    self.config, self.custom_css = old_config, old_css
+                keys = changed_config_keys(old_config, self.config, old_css, self.custom_css)
+
+            current = file_state(self.template_path, graph.files())
+            files = {p for p in current if current[p] != state.get(p)}
+            if not files and not keys:
+                continue
+
+            # Only outputs whose own configuration keys changed (or that were edited
+            # directly) are re-rendered; everything downstream is reported as affected
+            affected = graph.affected(files, keys)
+            outputs = (graph.affected(changed_keys=keys, transitive=False) | files) & rendered_files
+            rendered = self.build(outputs) if outputs else []
+
+            # Pages and stylesheets may now reference different files
+            if any(p.endswith(('.html', '.htm', '.css')) for p in files):
+                graph = self.graph()
+            state = file_state(self.template_path, graph.files())
+
+            if on_rebuild is not None:
+                on_rebuild({"files": sorted(files), "keys": sorted(keys), "affected": sorted(affected),
+                            "rendered": rendered, "elapsed": time.perf_counter() - started})
+
+    def export_info(self, version: str, profile: str) -> str:
+        """Text of the EXPORT_INFO.txt file added to exports"""
+        from site_export import profile_excludes
+        config = self.config
+        backup = ("" if profile_excludes("website_config.json", profile)
+                  else "- website_config.json (complete configuration backup)\n")
+        return f"""
+Website Export Information
+=========================
+
+Export Version: {version}
+Export Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+Original Template: {self.template_path}
+
+Configuration Summary:
+- Title: {config["meta"]["title"]}
+- Description: {config["meta"]["description"]}
+- Brand: {config["navigation"]["title"]}
+- Primary Color: {config["colors"]["primary"]}
+- Logo: {config["logo"]["src"]}
+
+Files Included:
+- index.html (main website file)
+- All deployable template files (profile: {profile})
+- {self.css_file} (your customizations)
+{backup}- EXPORT_INFO.txt (this file)
+
+To use this website:
+1. Upload all files to your web server
+2. Point your domain to index.html
+3. Ensure all file permissions are correct
+
+Generated by Website Template Editor v1.0
+"""
+
+    def export(self, version: str = "v1.0", profile: Optional[str] = None,
+               export_format: str = "folder", output: Optional[str] = None,
+               include_info: bool = True, workers: Optional[int] = None, task=None):
+        """Build, then export to a versioned folder or archive.
+
+        Returns (output path, timestamp, export summary).
+        """
+        from site_export import export_site, export_archive, profile_excludes, DEFAULT_PROFILE
+        from export_pipeline import ExportContext, run_stages
+        profile = profile or DEFAULT_PROFILE
+
+        if task is not None:
+            task.report(0, message="Generating preview")
+        self.build()
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if output is None:
+            output = os.path.join(os.path.dirname(self.template_path), f"{version}_{timestamp}")
+            if export_format != "folder":
+                output = f"{output}.{export_format}"
+
+        # Save configuration, unless the profile keeps such files off the server
+        extra_files = {"website_config.json": json.dumps(self.config, indent=2)}
+        if include_info:
+            extra_files["EXPORT_INFO.txt"] = self.export_info(version, profile)
+        extra_files = {n: c for n, c in extra_files.items() if not profile_excludes(n, profile)}
+
+        # Build stages transform the export through an overlay, never the template
+        context = ExportContext(self.template_path, self.config, profile, task=task)
+        run_stages(context)
+
+        if export_format == "folder":
+            # Export deployable files; unchanged files are linked from the previous export
+            summary = export_site(self.template_path, output, profile, task=task, overlay=context.overlay)
+            for name, content in extra_files.items():
+                with open(os.path.join(output, name), 'w', encoding='utf-8') as f:
+                    f.write(content)
+        else:
+            # Stream a single archive straight from the file index
+            summary = export_archive(self.template_path, output, export_format, profile,
+                                     extra_files={n: c.encode('utf-8') for n, c in extra_files.items()},
+                                     workers=workers, task=task, overlay=context.overlay)
+        summary["stages"] = context.report
+        return output, timestamp, summary
+
+    def stats(self) -> Dict:
+        """Page weight of the template's deployable pages and their budgets, cached by content"""
+        from export_pipeline import ExportContext, stage_options
+        from page_weight import analyze
+        context = ExportContext(self.template_path, self.config)
+        return analyze(context, stage_options(self.config, "page_weight"))
+
+    def preview(self, port: int = 8090, host: str = "127.0.0.1", log_callback=None):
+        """Build and start a PreviewServer; the caller must stop() it"""
+        from preview_server import PreviewServer
+        self.build()
+        server = PreviewServer(self.template_path, port, host, log_callback=log_callback)
+        server.start()
+        return server
+
+
+def _builder_from_args(args) -> SiteBuilder:
+    config = load_config(args.config) if args.config else default_config()
+    custom_css = ""
+    if args.custom_css:
+        with open(args.custom_css, 'r', encoding='utf-8') as f:
+            custom_css = f.read()
+    return SiteBuilder(args.template, config, custom_css, args.style)
+
+
+def _run_batch(args) -> int:
+    from site_batch import batch_build, describe_site, describe_batch
+    custom_css = ""
+    if args.custom_css:
+        with open(args.custom_css, 'r', encoding='utf-8') as f:
+            custom_css = f.read()
+    try:
+        summary = batch_build(args.template, args.configs, args.output, style=args.style,
+                              custom_css=custom_css, profile=args.profile, workers=args.workers,
+                              on_site=lambda site: print(describe_site(site)))
+    except BudgetExceeded as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print(describe_batch(summary))
+    return 0
+
+
+def _run_optimize_images(args) -> int:
+    from image_optimize import optimize_images, restore_originals, describe_report, all_images
+    if args.restore:
+        restored = restore_originals(args.template)
+        print(f"Restored {len(restored)} original images")
+        return 0
+    paths = all_images(args.template) if args.all else None
+    report = optimize_images(args.template, paths, webp=not args.no_webp, workers=args.workers)
+    print("\n".join(describe_report(report)))
+    return 0
+
+
+def _run_icons(args) -> int:
+    from icon_set import generate_icons, describe_icons
+    config = load_config(args.config) if args.config else default_config()
+    try:
+        report = generate_icons(args.template, args.source or config["logo"]["src"],
+                                background=args.background, padding=args.padding)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    print("\n".join(describe_icons(report)))
+    return 0
+
+
+def _run_check_links(args) -> int:
+    from link_check import check_links, describe_links
+    from site_export import DEFAULT_PROFILE
+    report = check_links(args.template, all_files=args.all, profile=args.profile or DEFAULT_PROFILE)
+    print("\n".join(describe_links(report)))
+    return 1 if report["problems"] else 0
+
+
+def _template_config(args) -> Dict:
+    """--config, else the template's own website_config.json, else the defaults"""
+    path = args.config or os.path.join(args.template, "website_config.json")
+    return load_config(path) if os.path.isfile(path) else default_config()
+
+
+def _run_disk_usage(args) -> int:
+    from asset_gc import disk_usage, describe_usage, find_unused
+    config = _template_config(args)
+    print("\n".join(describe_usage(disk_usage(args.template, config))))
+    unused = find_unused(args.template, config)
+    if unused:
+        print(f"Unused assets ({len(unused)}, 'gc' quarantines them):")
+        print("\n".join(f"  {path}" for path in unused))
+    return 0
+
+
+def _run_gc(args) -> int:
+    from asset_gc import collect_garbage, describe_gc, restore_quarantined
+    if args.restore is not None:
+        restored = restore_quarantined(args.template, args.restore or None)
+        print(f"Restored {len(restored)} files" + (f": {', '.join(restored)}" if restored else ""))
+        return 0
+    report = collect_garbage(args.template, _template_config(args), grace_days=args.grace_days,
+                             keep_backups=args.keep_backups, keep=args.keep, dry_run=args.dry_run)
+    print("\n".join(describe_gc(report)))
+    return 0
+
+
+def main(argv=None) -> int:
+    """Command-line entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build and export the website template without the GUI")
+    parser.add_argument("--template", default=TEMPLATE_DIR, help="Template folder (default: this folder)")
+    parser.add_argument("--config", help="website_config.json to apply (default: built-in defaults)")
+    parser.add_argument("--custom-css", help="File with extra CSS appended to the generated stylesheet")
+    parser.add_argument("--style", choices=list(CSS_STYLES), default=DEFAULT_STYLE,
+                        help="Generated stylesheet flavour (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("build", help="Apply the configuration to the template files")
+
+    export_parser = commands.add_parser("export", help="Build and export a versioned copy")
+    export_parser.add_argument("--version", default="v1.0", help="Version name used in the export name")
+    export_parser.add_argument("--profile", default=None, help="Deploy profile (default: github-pages)")
+    export_parser.add_argument("--format", choices=("folder", "zip", "tar.gz"), default="folder")
+    export_parser.add_argument("--output", help="Output path ('-' streams an archive to stdout)")
+    export_parser.add_argument("--no-info", action="store_true", help="Do not add EXPORT_INFO.txt")
+    export_parser.add_argument("--workers", type=int, default=None, help="Compression threads for archives")
+
+    preview_parser = commands.add_parser("preview", help="Build and serve a live preview")
+    preview_parser.add_argument("--port", type=int, default=8090)
+    preview_parser.add_argument("--host", default="127.0.0.1")
+
+    stats_parser = commands.add_parser("stats", help="Print the page weight of every page and check its budgets")
+    stats_parser.add_argument("--json", action="store_true", help="Print the full report as JSON")
+
+    optimize_parser = commands.add_parser("optimize-images", help="Recompress images and write WebP siblings")
+    optimize_parser.add_argument("--all", action="store_true", help="Include images no page references")
+    optimize_parser.add_argument("--no-webp", action="store_true", help="Do not write WebP siblings")
+    optimize_parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    optimize_parser.add_argument("--restore", action="store_true", help="Put the original images back")
+
+    icons_parser = commands.add_parser("icons", help="Generate favicons and manifest icons from one master image")
+    icons_parser.add_argument("--source", help="Master image (default: the configured logo)")
+    icons_parser.add_argument("--background", help="Fill of the opaque icons (default: manifest background_color)")
+    icons_parser.add_argument("--padding", type=float, default=0.0, help="Margin around the logo, 0-0.25 of the icon")
+
+    links_parser = commands.add_parser("check-links", help="Report broken local links, case mismatches and anchors")
+    links_parser.add_argument("--all", action="store_true", help="Check every template file, not just deployable ones")
+    links_parser.add_argument("--profile", default=None, help="Deploy profile (default: github-pages)")
+
+    commands.add_parser("disk-usage", help="Show where the template's disk space goes and list unused assets")
+
+    gc_parser = commands.add_parser("gc", help="Quarantine unused assets and old backups, delete expired ones")
+    gc_parser.add_argument("--dry-run", action="store_true", help="Only report what would happen")
+    gc_parser.add_argument("--grace-days", type=float, default=14, help="Days before quarantined files are deleted")
+    gc_parser.add_argument("--keep-backups", type=int, default=10, help="Newest backups to keep")
+    gc_parser.add_argument("--keep", action="append", default=[], help="Glob of files never collected (repeatable)")
+    gc_parser.add_argument("--restore", nargs="*", default=None, metavar="PATH",
+                           help="Put quarantined files back (all when no path is given)")
+
+    watch_parser = commands.add_parser("watch", help="Rebuild affected outputs whenever inputs change")
+    watch_parser.add_argument("--interval", type=float, default=0.5, help="Polling interval in seconds")
+
+    batch_parser = commands.add_parser("batch", help="Render many configs into separate site folders")
+    batch_parser.add_argument("configs", nargs="+", help="website_config.json files, one per site")
+    batch_parser.add_argument("--output", required=True, help="Folder receiving one subfolder per site")
+    batch_parser.add_argument("--profile", default=None, help="Deploy profile (default: github-pages)")
+    batch_parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+
+    args = parser.parse_args(argv)
+    if args.command == "batch":
+        return _run_batch(args)
+    if args.command == "optimize-images":
+        return _run_optimize_images(args)
+    if args.command == "icons":
+        return _run_icons(args)
+    if args.command == "check-links":
+        return _run_check_links(args)
+    if args.command == "disk-usage":
+        return _run_disk_usage(args)
+    if args.command == "gc":
+        return _run_gc(args)
+    builder = _builder_from_args(args)
+
+    if args.command == "build":
+        changed = builder.build()
+        print(f"{len(changed)} files updated" + (f": {', '.join(changed)}" if changed else ""))
+
+    elif args.command == "export":
+        from site_export import describe_export
+        from export_pipeline import describe_stages
+        stream = args.output == "-"
+        export_format = "zip" if stream and args.format == "folder" else args.format
+        try:
+            output, _, summary = builder.export(args.version, args.profile, export_format,
+                                                sys.stdout.buffer if stream else args.output,
+                                                include_info=not args.no_info, workers=args.workers)
+        except BudgetExceeded as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        out = sys.stderr if stream else sys.stdout
+        if not stream:
+            print(f"Exported to {output}")
+        for line in [describe_export(summary)] + describe_stages(summary["stages"]):
+            print(line, file=out)
+
+    elif args.command == "preview":
+        server = builder.preview(args.port, args.host, log_callback=lambda msg: print(msg, file=sys.stderr))
+        print(f"Preview server running at {server.url} (Ctrl+C to stop)")
+        try:
+            while server.running:
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
+
+    elif args.command == "stats":
+        from page_weight import describe_page
+        stats = builder.stats()
+        if args.json:
+            print(json.dumps(stats, indent=2))
+        else:
+            for page, report in stats["pages"].items():
+                print(describe_page(page, report))
+            for violation in stats["violations"]:
+                print(f"Over budget: {violation}")
+
+    elif args.command == "watch":
+        def report(event):
+            changes = event["files"] + [f"config:{key}" for key in event["keys"]]
+            print(f"Changed: {', '.join(changes)} -> re-rendered {len(event['rendered'])} "
+                  f"({', '.join(event['rendered']) or 'none'}), {len(event['affected'])} affected "
+                  f"in {event['elapsed'] * 1000:.0f} ms")
+        print(f"Watching {builder.template_path} (Ctrl+C to stop)")
+        try:
+            builder.watch(args.config, args.custom_css, args.interval, on_rebuild=report)
+        except KeyboardInterrupt:
+            pass
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
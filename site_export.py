@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+"""
+Site Exporter
+Incremental export of the deployable part of a template. Files are selected
+by a deploy profile, hashed through the file index, and files unchanged since
+the previous export are hardlinked (or reflinked) from it instead of copied.
+Exports are snapshots: later stages must replace files, never edit them in place.
+"""
+
+import os
+import sys
+import json
+import time
+import gzip
+import zlib
+import shutil
+import struct
+import fnmatch
+import hashlib
+import tarfile
+import argparse
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set
+
+from file_index import CACHE_DIR_NAME, FileIndex, get_file_index, hash_file
+
+LAST_EXPORT_FILE = "last_export.json"
+
+# Deployable file selection, in .gitignore-like glob syntax relative to the template root
+DEPLOY_PROFILES = {
+    "github-pages": {
+        "types": ["html", "css", "js", "json", "image", "font", "document"],
+        "keep": ["CNAME", ".nojekyll", "_config.yml", "robots.txt", "sitemap.xml", "favicon.ico", "404.html"],
+        "exclude": [
+            # Editor and test pages
+            "*editor*.html", "edit.html", "edit_working.html", "portal.html",
+            "test*.html", "debug_*.html", "simple.html",
+            # Editor state and tooling
+            "editor_config.json", "website_config.json", "package.json", "package-lock.json",
+            ".github/*", "styles.css", "script.js",
+        ],
+    },
+    "full": {
+        "types": None,
+        "keep": [],
+        "exclude": [],
+    },
+}
+DEFAULT_PROFILE = "github-pages"
+
+
+def _matches(rel_path: str, patterns: List[str]) -> bool:
+    name = rel_path.rsplit('/', 1)[-1]
+    return any(fnmatch.fnmatchcase(rel_path, p) or ('/' not in p and fnmatch.fnmatchcase(name, p))
+               for p in patterns)
+
+
+def profile_excludes(rel_path: str, profile: str = DEFAULT_PROFILE) -> bool:
+    """True if the profile's exclude list drops rel_path (its keep list wins)"""
+    rules = DEPLOY_PROFILES[profile]
+    return not _matches(rel_path, rules["keep"]) and _matches(rel_path, rules["exclude"])
+
+
+def deployable_files(index: FileIndex, profile: str = DEFAULT_PROFILE) -> List[str]:
+    """Return the indexed files that belong in an export for the given profile"""
+    rules = DEPLOY_PROFILES[profile]
+    selected = []
+    for rel_path in index.paths():
+        if _matches(rel_path, rules["keep"]):
+            selected.append(rel_path)
+        elif _matches(rel_path, rules["exclude"]):
+            continue
+        elif rules["types"] is None or index.files[rel_path]["type"] in rules["types"]:
+            selected.append(rel_path)
+    return selected
+
+
+class ExportOverlay:
+    """Generated or transformed files applied on top of the deployable files.
+
+    Build stages never touch the template: they put new content (data), point
+    a path at a cached file (files) or drop a path from the export (removed).
+    """
+
+    def __init__(self):
+        self.data: Dict[str, bytes] = {}
+        self.files: Dict[str, str] = {}
+        self.removed: Set[str] = set()
+
+    def put(self, rel_path: str, data: bytes):
+        self.files.pop(rel_path, None)
+        self.removed.discard(rel_path)
+        self.data[rel_path] = data
+
+    def put_file(self, rel_path: str, abs_path: str):
+        self.data.pop(rel_path, None)
+        self.removed.discard(rel_path)
+        self.files[rel_path] = abs_path
+
+    def remove(self, rel_path: str):
+        self.data.pop(rel_path, None)
+        self.files.pop(rel_path, None)
+        self.removed.add(rel_path)
+
+    def apply(self, files: List[str]) -> List[str]:
+        """Deployable file list after the overlay"""
+        result = [p for p in files if p not in self.removed]
+        present = set(result)
+        result.extend(sorted(p for p in list(self.data) + list(self.files) if p not in present))
+        return result
+
+
+def clone_file(src: str, dst: str) -> str:
+    """Share src's data with dst: hardlink, then reflink, then fall back to copying.
+
+    Returns "hardlink", "reflink" or "copy".
+    """
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        pass
+    if reflink_file(src, dst):
+        return "reflink"
+    shutil.copy2(src, dst)
+    return "copy"
+
+
+def reflink_file(src: str, dst: str) -> bool:
+    """Copy-on-write clone (Linux FICLONE); returns False if unsupported"""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    FICLONE = 0x40049409
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        shutil.copystat(src, dst)
+        return True
+    except OSError:
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        return False
+
+
+def load_last_export(template_path: str) -> Optional[Dict]:
+    """Manifest of the previous export, if its directory still exists"""
+    try:
+        with open(os.path.join(template_path, CACHE_DIR_NAME, LAST_EXPORT_FILE), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.isdir(manifest.get("export_dir", "")):
+        return None
+    return manifest
+
+
+def save_last_export(template_path: str, manifest: Dict):
+    """Remember an export so the next one can link unchanged files from it"""
+    cache_dir = os.path.join(template_path, CACHE_DIR_NAME)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_file = os.path.join(cache_dir, LAST_EXPORT_FILE + ".tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_file, os.path.join(cache_dir, LAST_EXPORT_FILE))
+
+
+def export_site(template_path: str, export_dir: str, profile: str = DEFAULT_PROFILE,
+                task=None, overlay: Optional[ExportOverlay] = None) -> Dict:
+    """Export deployable files into export_dir, reusing the previous export.
+
+    overlay adds, replaces or drops files produced by build stages.
+    task is an optional ui_dispatch.Task used for progress and cancellation.
+    Returns a summary dict with file counts, bytes copied and elapsed time.
+    """
+    started = time.perf_counter()
+    index = get_file_index(template_path)
+    overlay = overlay or ExportOverlay()
+
+    files = overlay.apply(deployable_files(index, profile))
+    previous = load_last_export(template_path)
+    previous_files = previous["files"] if previous and previous.get("profile") == profile else {}
+
+    os.makedirs(export_dir)
+    summary = {"export_dir": export_dir, "profile": profile, "files": len(files),
+               "linked": 0, "copied": 0, "bytes_copied": 0, "bytes_total": 0}
+    manifest_files = {}
+    created_dirs = set()
+    try:
+        for i, rel_path in enumerate(files):
+            if task is not None:
+                task.check_cancelled()
+                task.report(i, len(files), rel_path)
+
+            # Generated content is hashed like files so unchanged output is linked too
+            data = overlay.data.get(rel_path)
+            source = overlay.files.get(rel_path)
+            if data is not None:
+                digest, size = hashlib.sha256(data).hexdigest(), len(data)
+            elif source is not None:
+                digest, size = hash_file(source), os.path.getsize(source)
+            else:
+                source = index.abspath(rel_path)
+                digest, size = index.content_hash(rel_path), index.files[rel_path]["size"]
+            manifest_files[rel_path] = digest
+            summary["bytes_total"] += size
+
+            dst = os.path.join(export_dir, *rel_path.split('/'))
+            parent = os.path.dirname(dst)
+            if parent not in created_dirs:
+                os.makedirs(parent, exist_ok=True)
+                created_dirs.add(parent)
+
+            prev_src = os.path.join(previous["export_dir"], *rel_path.split('/')) if previous_files else None
+            if (prev_src and digest is not None and previous_files.get(rel_path) == digest and
+                    os.path.isfile(prev_src) and os.path.getsize(prev_src) == size):
+                if clone_file(prev_src, dst) != "copy":
+                    summary["linked"] += 1
+                    continue
+            elif data is not None:
+                with open(dst, 'wb') as f:
+                    f.write(data)
+            else:
+                shutil.copy2(source, dst)
+            summary["copied"] += 1
+            summary["bytes_copied"] += size
+    except BaseException:
+        shutil.rmtree(export_dir, ignore_errors=True)
+        raise
+
+    save_last_export(template_path, {"export_dir": export_dir, "profile": profile,
+                                     "files": manifest_files})
+    index.save()
+    if task is not None:
+        task.report(len(files), len(files))
+    summary["elapsed"] = time.perf_counter() - started
+    return summary
+
+
+# Archive export
+
+ARCHIVE_FORMATS = ("zip", "tar.gz")
+
+# Media that is already compressed: stored as-is instead of deflated
+STORED_EXTENSIONS = {
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".avif", ".ico",
+    ".pdf", ".zip", ".gz", ".tgz", ".bz2", ".xz", ".woff", ".woff2",
+    ".mp3", ".mp4", ".webm", ".ogg",
+}
+COMPRESS_LEVEL = 6
+STREAM_CHUNK = 1024 * 1024
+# Stored files above this size are streamed from disk instead of read into memory
+MAX_BUFFERED_STORE = 8 * 1024 * 1024
+
+
+def _is_stored(rel_path: str) -> bool:
+    return os.path.splitext(rel_path)[1].lower() in STORED_EXTENSIONS
+
+
+def _dos_datetime(mtime: float):
+    t = time.localtime(max(mtime, 315532800))  # zip dates start in 1980
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+
+def _zip_member(source, data: Optional[bytes]):
+    """Compress one zip member (worker thread): returns (method, crc, size, payload)"""
+    stored = _is_stored(source[0])
+    if data is None:
+        size = os.path.getsize(source[1])
+        if stored and size > MAX_BUFFERED_STORE:
+            crc = 0
+            with open(source[1], 'rb') as f:
+                for chunk in iter(lambda: f.read(STREAM_CHUNK), b''):
+                    crc = zlib.crc32(chunk, crc)
+            return 0, crc, size, None
+        with open(source[1], 'rb') as f:
+            data = f.read()
+    crc = zlib.crc32(data)
+    if stored:
+        return 0, crc, len(data), data
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -15)
+    payload = compressor.compress(data) + compressor.flush()
+    return 8, crc, len(data), payload
+
+
+def _tar_member(source, data: Optional[bytes], mtime: float) -> bytes:
+    """Build and gzip one tar member as an independent gzip stream (worker thread)"""
+    rel_path, abs_path = source
+    if data is None:
+        with open(abs_path, 'rb') as f:
+            data = f.read()
+    info = tarfile.TarInfo(rel_path)
+    info.size = len(data)
+    info.mtime = int(mtime)
+    info.mode = 0o644
+    block = info.tobuf(format=tarfile.PAX_FORMAT, encoding='utf-8') + data
+    block += b'\0' * (-len(block) % tarfile.BLOCKSIZE)
+    level = 0 if _is_stored(rel_path) else COMPRESS_LEVEL
+    return gzip.compress(block, compresslevel=level, mtime=0)
+
+
+class _ZipWriter:
+    """Minimal streaming zip writer for pre-compressed members"""
+
+    def __init__(self, out):
+        self.out = out
+        self.offset = 0
+        self.central = []
+
+    def _write(self, data: bytes):
+        self.out.write(data)
+        self.offset += len(data)
+
+    def add(self, name: str, mtime: float, method: int, crc: int, size: int,
+            payload: Optional[bytes], path: Optional[str] = None):
+        encoded = name.encode('utf-8')
+        csize = len(payload) if payload is not None else size
+        if self.offset > 0xFFFFFFFF or csize > 0xFFFFFFFF or size > 0xFFFFFFFF:
+            raise ValueError("Archive too large for the zip writer (no ZIP64 support)")
+        dos_time, dos_date = _dos_datetime(mtime)
+        header_offset = self.offset
+        self._write(struct.pack('<IHHHHHIIIHH', 0x04034b50, 20, 0x800, method,
+                                dos_time, dos_date, crc, csize, size, len(encoded), 0) + encoded)
+        if payload is not None:
+            self._write(payload)
+        else:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(STREAM_CHUNK), b''):
+                    self._write(chunk)
+        self.central.append(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, 20, 20, 0x800, method,
+                                        dos_time, dos_date, crc, csize, size, len(encoded),
+                                        0, 0, 0, 0, 0o100644 << 16, header_offset) + encoded)
+
+    def close(self):
+        start = self.offset
+        for entry in self.central:
+            self._write(entry)
+        self._write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, len(self.central), len(self.central),
+                                self.offset - start, start, 0))
+
+
+def export_archive(template_path: str, output, archive_format: str = "zip",
+                   profile: str = DEFAULT_PROFILE, extra_files: Optional[Dict[str, bytes]] = None,
+                   workers: Optional[int] = None, task=None,
+                   overlay: Optional[ExportOverlay] = None) -> Dict:
+    """Stream deployable files into a .zip or .tar.gz without copying the site first.
+
+    output is a path or a binary file object. Members are compressed in a
+    thread pool and written in order; extra_files adds generated members and
+    overlay applies the output of build stages.
+    """
+
+    if archive_format not in ARCHIVE_FORMATS:
+        raise ValueError(f"Unknown archive format: {archive_format}")
+
+    started = time.perf_counter()
+    index = get_file_index(template_path)
+
+    overlay = overlay or ExportOverlay()
+    now = time.time()
+    members = []
+    for rel_path in overlay.apply(deployable_files(index, profile)):
+        if rel_path in overlay.data:
+            members.append((rel_path, None, overlay.data[rel_path], now))
+        elif rel_path in overlay.files:
+            source = overlay.files[rel_path]
+            members.append((rel_path, source, None, os.path.getmtime(source)))
+        else:
+            members.append((rel_path, index.abspath(rel_path), None, index.files[rel_path]["mtime_ns"] / 1e9))
+    for name, data in (extra_files or {}).items():
+        members.append((name, None, data, now))
+
+    if isinstance(output, str):
+        tmp_path = output + ".tmp"
+        out = open(tmp_path, 'wb')
+    else:
+        tmp_path, out = None, output
+
+    summary = {"archive": output if isinstance(output, str) else None, "format": archive_format,
+               "profile": profile, "files": len(members), "stored": 0, "bytes_in": 0, "bytes_out": 0}
+    workers = workers or min(8, (os.cpu_count() or 2))
+    try:
+        zip_writer = _ZipWriter(out) if archive_format == "zip" else None
+        written = 0
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="archive") as pool:
+            pending = deque()
+
+            def submit(member):
+                rel_path, abs_path, data, mtime = member
+                if zip_writer is not None:
+                    return pool.submit(_zip_member, (rel_path, abs_path), data)
+                return pool.submit(_tar_member, (rel_path, abs_path), data, mtime)
+
+            # Keep a bounded window of in-flight members so memory stays flat
+            members_iter = iter(members)
+            for member in members_iter:
+                pending.append((member, submit(member)))
+                if len(pending) >= workers * 2:
+                    break
+
+            for i in range(len(members)):
+                if task is not None:
+                    task.check_cancelled()
+                    task.report(i, len(members), members[i][0])
+                member, future = pending.popleft()
+                next_member = next(members_iter, None)
+                if next_member is not None:
+                    pending.append((next_member, submit(next_member)))
+
+                rel_path, abs_path, data, mtime = member
+                if _is_stored(rel_path):
+                    summary["stored"] += 1
+                if zip_writer is not None:
+                    method, crc, size, payload = future.result()
+                    before = zip_writer.offset
+                    zip_writer.add(rel_path, mtime, method, crc, size, payload, abs_path)
+                    summary["bytes_in"] += size
+                    written += zip_writer.offset - before
+                else:
+                    block = future.result()
+                    summary["bytes_in"] += len(data) if data is not None else os.path.getsize(abs_path)
+                    out.write(block)
+                    written += len(block)
+
+            if zip_writer is not None:
+                before = zip_writer.offset
+                zip_writer.close()
+                written += zip_writer.offset - before
+            else:
+                end = gzip.compress(b'\0' * (2 * tarfile.BLOCKSIZE), mtime=0)
+                out.write(end)
+                written += len(end)
+        summary["bytes_out"] = written
+    except BaseException:
+        if tmp_path:
+            out.close()
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        raise
+
+    if tmp_path:
+        out.close()
+        os.replace(tmp_path, output)
+    index.save()
+    if task is not None:
+        task.report(len(members), len(members))
+    summary["elapsed"] = time.perf_counter() - started
+    return summary
+
+
+def describe_export(summary: Dict) -> str:
+    """One-line human readable export summary"""
+    elapsed = f"{summary['elapsed'] * 1000:.0f} ms"
+    if "format" in summary:
+        return (f"{summary['format']} archive ({summary['profile']}): {summary['files']} files, "
+                f"{summary['stored']} stored, {summary['bytes_in'] / 1024:.0f} KB -> "
+                f"{summary['bytes_out'] / 1024:.0f} KB in {elapsed}")
+    return (f"Folder export ({summary['profile']}): {summary['files']} files, "
+            f"{summary['linked']} linked, {summary['copied']} copied "
+            f"({summary['bytes_copied'] / 1024:.0f} KB) in {elapsed}")
+
+
+def open_in_file_manager(path: str):
+    """Reveal a folder (or an archive's folder) in the platform file manager"""
+    if os.path.isfile(path):
+        path = os.path.dirname(path)
+    if sys.platform.startswith("win"):
+        os.startfile(path)
+    elif sys.platform == "darwin":
+        subprocess.Popen(["open", path])
+    else:
+        subprocess.Popen(["xdg-open", path])
+
+
+def main(argv=None):
+    """Command-line archive/folder export"""
+
+    parser = argparse.ArgumentParser(description="Export the deployable files of a website template")
+    parser.add_argument("output", help="Output folder, .zip or .tar.gz file ('-' streams to stdout)")
+    parser.add_argument("--template", default=os.path.dirname(os.path.abspath(__file__)),
+                        help="Template folder (default: this folder)")
+    parser.add_argument("--format", choices=("folder",) + ARCHIVE_FORMATS,
+                        help="Output format (default: inferred from the output name)")
+    parser.add_argument("--profile", choices=list(DEPLOY_PROFILES), default=DEFAULT_PROFILE)
+    parser.add_argument("--workers", type=int, default=None, help="Compression threads")
+    args = parser.parse_args(argv)
+
+    archive_format = args.format
+    if archive_format is None:
+        if args.output.endswith(".zip"):
+            archive_format = "zip"
+        elif args.output.endswith((".tar.gz", ".tgz")):
+            archive_format = "tar.gz"
+        elif args.output == "-":
+            archive_format = "zip"
+        else:
+            archive_format = "folder"
+
+    if archive_format == "folder":
+        summary = export_site(args.template, args.output, args.profile)
+    else:
+        output = sys.stdout.buffer if args.output == "-" else args.output
+        summary = export_archive(args.template, output, archive_format, args.profile, workers=args.workers)
+
+    print(describe_export(summary), file=sys.stderr if args.output == "-" else sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
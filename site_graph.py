@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Site Dependency Graph
+Links every page to the stylesheets, scripts and images it references, every
+stylesheet to its imports and url() assets, and the rendered outputs to the
+configuration keys they consume. Used to rebuild only what a change affects
+and to drive the watch mode.
+"""
+
+import os
+import re
+import posixpath
+from urllib.parse import unquote, urlsplit
+from typing import Dict, Iterable, List, Optional, Set
+
+from file_index import get_file_index
+from site_render import HTML_CONFIG_KEYS, CSS_CONFIG_KEYS
+
+# Prefix of configuration key nodes, e.g. "config:colors.primary"
+CONFIG_PREFIX = "config:"
+
+HTML_REFERENCE = re.compile(r'''\b(?:href|src|poster|data-src)\s*=\s*["']([^"']+)["']''', re.IGNORECASE)
+HTML_SRCSET = re.compile(r'''\bsrcset\s*=\s*["']([^"']+)["']''', re.IGNORECASE)
+CSS_URL = re.compile(r'''url\(\s*["']?([^"')]+?)["']?\s*\)''', re.IGNORECASE)
+CSS_IMPORT = re.compile(r'''@import\s+["']([^"']+)["']''', re.IGNORECASE)
+EXTERNAL_SCHEMES = ("http:", "https:", "//", "data:", "mailto:", "tel:", "javascript:", "#")
+
+
+def resolve_reference(source: str, reference: str) -> Optional[str]:
+    """Template-relative path a reference in source points to, or None if external"""
+    reference = reference.strip()
+    if not reference or reference.lower().startswith(EXTERNAL_SCHEMES):
+        return None
+    path = unquote(urlsplit(reference).path)
+    if not path:
+        return None
+    if path.startswith('/'):
+        resolved = posixpath.normpath(path.lstrip('/'))
+    else:
+        resolved = posixpath.normpath(posixpath.join(posixpath.dirname(source), path))
+    if resolved.startswith('..') or resolved == '.':
+        return None
+    return resolved
+
+
+def extract_references(rel_path: str, content: str) -> List[str]:
+    """Raw references (href/src/srcset or url()/@import) found in an HTML or CSS file"""
+    if rel_path.endswith('.css'):
+        return CSS_IMPORT.findall(content) + CSS_URL.findall(content)
+    references = HTML_REFERENCE.findall(content)
+    for srcset in HTML_SRCSET.findall(content):
+        references.extend(candidate.split()[0] for candidate in srcset.split(',') if candidate.strip())
+    # Inline style blocks and attributes may reference assets too
+    references.extend(CSS_URL.findall(content))
+    return references
+
+
+def flatten_config(config: Dict, prefix: str = "") -> Dict[str, object]:
+    """Flatten nested dicts into dotted keys (lists are leaves)"""
+    flat = {}
+    for key, value in config.items():
+        dotted = f"{prefix}{key}"
+        if isinstance(value, dict) and value:
+            flat.update(flatten_config(value, dotted + "."))
+        else:
+            flat[dotted] = value
+    return flat
+
+
+def changed_config_keys(old: Optional[Dict], new: Dict, old_css: Optional[str] = None,
+                        new_css: Optional[str] = None) -> Set[str]:
+    """Dotted configuration keys whose value differs (custom CSS counts as "custom_css")"""
+    old_flat = flatten_config(old or {})
+    new_flat = flatten_config(new)
+    changed = {key for key in old_flat.keys() | new_flat.keys() if old_flat.get(key) != new_flat.get(key)}
+    if old_css != new_css:
+        changed.add("custom_css")
+    return changed
+
+
+def key_matches(changed: str, consumed: str) -> bool:
+    """True if a change to one dotted key affects a consumer of the other"""
+    return (changed == consumed or changed.startswith(consumed + ".") or
+            consumed.startswith(changed + "."))
+
+
+class DependencyGraph:
+    """Directed graph of node -> the nodes it depends on"""
+
+    def __init__(self):
+        self.deps: Dict[str, Set[str]] = {}
+        self.rdeps: Dict[str, Set[str]] = {}
+
+    def add(self, node: str, dependency: str):
+        self.deps.setdefault(node, set()).add(dependency)
+        self.rdeps.setdefault(dependency, set()).add(node)
+        self.deps.setdefault(dependency, set())
+
+    def dependencies(self, node: str) -> Set[str]:
+        """Direct dependencies of a node"""
+        return set(self.deps.get(node, ()))
+
+    def dependents(self, nodes: Iterable[str]) -> Set[str]:
+        """Every node that directly or transitively depends on any of nodes"""
+        result: Set[str] = set()
+        stack = list(nodes)
+        while stack:
+            for parent in self.rdeps.get(stack.pop(), ()):
+                if parent not in result:
+                    result.add(parent)
+                    stack.append(parent)
+        return result
+
+    def files(self) -> Set[str]:
+        """All file nodes (inputs and outputs)"""
+        return {node for node in self.deps if not node.startswith(CONFIG_PREFIX)}
+
+    def config_nodes(self) -> Set[str]:
+        return {node[len(CONFIG_PREFIX):] for node in self.deps if node.startswith(CONFIG_PREFIX)}
+
+    def affected(self, changed_files: Iterable[str] = (), changed_keys: Iterable[str] = (),
+                 transitive: bool = True) -> Set[str]:
+        """Nodes affected after files and/or configuration keys changed.
+
+        With transitive=False only the direct dependents are returned, e.g. the
+        outputs that have to be re-rendered for a configuration change.
+        """
+        changed = set(changed_files)
+        consumed = self.config_nodes()
+        for key in changed_keys:
+            changed.update(CONFIG_PREFIX + c for c in consumed if key_matches(key, c))
+        if transitive:
+            return self.dependents(changed)
+        return {parent for node in changed for parent in self.rdeps.get(node, ())}
+
+
+def build_graph(template_path: str, html_file: str = "index.html",
+                css_file: str = "custom_editor_styles.css", profile: Optional[str] = None) -> DependencyGraph:
+    """Scan the deployable HTML and CSS files of a template into a DependencyGraph"""
+    from site_export import deployable_files, DEFAULT_PROFILE
+
+    index = get_file_index(template_path)
+    graph = DependencyGraph()
+    for rel_path in deployable_files(index, profile or DEFAULT_PROFILE):
+        if index.files[rel_path]["type"] not in ("html", "css"):
+            continue
+        try:
+            with open(index.abspath(rel_path), 'r', encoding='utf-8', errors='replace') as f:
+                content = f.read()
+        except OSError:
+            continue
+        graph.deps.setdefault(rel_path, set())
+        for reference in extract_references(rel_path, content):
+            target = resolve_reference(rel_path, reference)
+            if target is not None and target != rel_path:
+                # Missing targets stay in the graph so creating them triggers a rebuild
+                graph.add(rel_path, target)
+
+    # Rendered outputs and the configuration they consume
+    for key in HTML_CONFIG_KEYS:
+        graph.add(html_file, CONFIG_PREFIX + key)
+    for key in CSS_CONFIG_KEYS:
+        graph.add(css_file, CONFIG_PREFIX + key)
+    graph.add(html_file, css_file)
+    return graph
+
+
+def file_state(template_path: str, paths: Iterable[str]) -> Dict[str, Optional[tuple]]:
+    """(size, mtime_ns) of each path, None if missing; used to poll for changes.
+
+    Paths are relative to template_path unless they are absolute.
+    """
+    state = {}
+    for rel_path in paths:
+        try:
+            st = os.stat(os.path.join(template_path, rel_path))
+            state[rel_path] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            state[rel_path] = None
+    return state
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Site Renderer
+Applies the editor configuration to the template files in one transaction:
+each file is read once, all edits happen in memory, unchanged files are not
+rewritten, and changed files are staged completely before any is replaced.
+"""
+
+import os
+import re
+import hashlib
+from datetime import datetime
+from typing import Callable, Collection, Dict, List, Optional
+
+# Lines that change on every render and must not count as a content change
+VOLATILE_PATTERN = re.compile(r'^/\* Last updated: .*? \*/$', re.MULTILINE)
+
+
+def content_hash(text: str, ignore: Optional[re.Pattern] = None) -> str:
+    """Hash text, optionally ignoring volatile parts"""
+    if ignore is not None:
+        text = ignore.sub('', text)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class RenderTransaction:
+    """In-memory staging area for template file edits"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.originals: Dict[str, Optional[str]] = {}
+        self.staged: Dict[str, str] = {}
+        self.ignore: Dict[str, Optional[re.Pattern]] = {}
+
+    def path(self, rel_path: str) -> str:
+        return os.path.join(self.root, rel_path)
+
+    def read(self, rel_path: str) -> Optional[str]:
+        """Return the current (staged or on-disk) content; files are read once"""
+        if rel_path in self.staged:
+            return self.staged[rel_path]
+        if rel_path not in self.originals:
+            try:
+                with open(self.path(rel_path), 'r', encoding='utf-8') as f:
+                    self.originals[rel_path] = f.read()
+            except FileNotFoundError:
+                self.originals[rel_path] = None
+        return self.originals[rel_path]
+
+    def write(self, rel_path: str, content: str, ignore: Optional[re.Pattern] = None):
+        """Stage new content for a file"""
+        self.read(rel_path)
+        self.staged[rel_path] = content
+        self.ignore[rel_path] = ignore
+
+    def changed(self) -> List[str]:
+        """Files whose staged content differs from what is on disk"""
+        result = []
+        for rel_path, content in self.staged.items():
+            original = self.originals.get(rel_path)
+            ignore = self.ignore.get(rel_path)
+            if original is None or content_hash(original, ignore) != content_hash(content, ignore):
+                result.append(rel_path)
+        return result
+
+    def commit(self) -> List[str]:
+        """Write changed files: stage all temp files first, then replace each atomically"""
+        changed = self.changed()
+        temp_files = []
+        try:
+            for rel_path in changed:
+                target = self.path(rel_path)
+                os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+                temp_path = os.path.join(os.path.dirname(target),
+                                         f".{os.path.basename(target)}.{os.getpid()}.tmp")
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write(self.staged[rel_path])
+                if os.path.exists(target):
+                    os.chmod(temp_path, os.stat(target).st_mode & 0o7777)
+                temp_files.append((temp_path, target))
+        except Exception:
+            for temp_path, _ in temp_files:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+            raise
+
+        for temp_path, target in temp_files:
+            os.replace(temp_path, target)
+        for rel_path in changed:
+            self.originals[rel_path] = self.staged[rel_path]
+        return changed
+
+
+# Configuration keys read by each rendered output (dotted paths; a key covers its children).
+# "custom_css" stands for the editor's free-form CSS text.
+HTML_CONFIG_KEYS = ["meta.title", "meta.description", "logo.src", "logo.alt", "navigation.title"]
+CSS_CONFIG_KEYS = ["colors", "logo.width", "logo.height", "images", "custom_css"]
+
+
+def render_index_html(content: str, config: Dict, css_file: str) -> str:
+    """Apply meta, logo and brand settings and link the generated stylesheet"""
+    meta, logo, navigation = config["meta"], config["logo"], config["navigation"]
+
+    # Replacement functions keep backslashes in user text literal
+    content = re.sub(r'<title>.*?</title>',
+                     lambda m: f'<title>{meta["title"]}</title>', content)
+    content = re.sub(r'<meta name="description" content=".*?"',
+                     lambda m: f'<meta name="description" content="{meta["description"]}"', content)
+    content = re.sub(r'<img src="[^"]*" alt="[^"]*" class="logo-icon">',
+                     lambda m: f'<img src="{logo["src"]}" alt="{logo.get("alt", "Logo")}" class="logo-icon">', content)
+    content = re.sub(r'<span class="logo-text">.*?</span>',
+                     lambda m: f'<span class="logo-text">{navigation["title"]}</span>', content)
+
+    if css_file not in content:
+        # Add custom CSS link before closing head tag
+        content = content.replace('</head>', f'    <link rel="stylesheet" href="{css_file}">\n</head>', 1)
+    return content
+
+
+def build_basic_css(config: Dict, custom_css: str) -> str:
+    """Generated stylesheet used by the full editor"""
+    colors, logo = config["colors"], config["logo"]
+    return f"""
+/* Generated Custom Styles */
+:root {{
+    --primary-color: {colors["primary"]};
+    --secondary-color: {colors["secondary"]};
+    --accent-color: {colors["accent"]};
+    --background-color: {colors["background"]};
+    --text-color: {colors["text"]};
+}}
+
+.logo-icon {{
+    width: {logo["width"]} !important;
+    height: {logo["height"]} !important;
+}}
+
+/* Custom CSS from editor */
+{custom_css}
+"""
+
+
+FRAME_STYLES = {
+    "rounded": "    border-radius: 12px !important;\n",
+    "circle": "    border-radius: 50% !important;\n",
+    "shadow": "    box-shadow: 0 8px 25px rgba(0, 0, 0, 0.15) !important;\n",
+    "border": "    border: 2px solid var(--primary-color) !important;\n",
+}
+
+POSITION_STYLES = {
+    "left": "    margin-right: auto !important;\n",
+    "right": "    margin-left: auto !important;\n",
+    "center": "    margin: 0 auto !important;\n",
+    "float-left": "    float: left !important; margin-right: 1rem !important;\n",
+    "float-right": "    float: right !important; margin-left: 1rem !important;\n",
+}
+
+
+def build_custom_css(config: Dict, custom_css: str) -> str:
+    """Generated stylesheet with per-image rules, used by the simplified editor"""
+    colors, logo = config["colors"], config["logo"]
+    css_content = f"""
+/* Generated by Website Template Editor */
+/* Last updated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} */
+
+:root {{
+    --primary-color: {colors["primary"]} !important;
+    --secondary-color: {colors["secondary"]} !important;
+    --accent-color: {colors["accent"]} !important;
+    --background-color: {colors["background"]} !important;
+    --text-color: {colors["text"]} !important;
+}}
+
+/* Logo customization */
+.logo-icon,
+.nav .logo-icon,
+.nav-container .logo-icon,
+.nav-logo .logo-icon {{
+    width: {logo["width"]} !important;
+    height: {logo["height"]} !important;
+}}
+
+/* Image customizations */
+"""
+
+    # Add image-specific CSS
+    for image_path, props in config.get("images", {}).items():
+        css_content += f"""
+/* Styles for {image_path} */
+img[src="{image_path}"] {{
+    width: {props.get('width', 'auto')} !important;
+    height: {props.get('height', 'auto')} !important;
+"""
+        css_content += FRAME_STYLES.get(props.get('frame', 'none'), "")
+        css_content += POSITION_STYLES.get(props.get('position', 'center'), "")
+        css_content += "}\n\n"
+
+    # Add custom CSS from editor
+    css_content += f"""
+/* Custom CSS from editor */
+{custom_css}
+"""
+    return css_content
+
+
+def render_site(template_path: str, config: Dict, custom_css: str,
+                css_file: str = "custom_editor_styles.css",
+                css_builder: Callable[[Dict, str], str] = build_custom_css,
+                html_file: str = "index.html",
+                outputs: Optional[Collection[str]] = None) -> List[str]:
+    """Render configuration into the template and return the files that changed.
+
+    outputs limits rendering to some of html_file and css_file (default: both).
+    """
+    transaction = RenderTransaction(template_path)
+
+    if outputs is None or html_file in outputs:
+        content = transaction.read(html_file)
+        if content is not None:
+            transaction.write(html_file, render_index_html(content, config, css_file))
+
+    if outputs is None or css_file in outputs:
+        transaction.write(css_file, css_builder(config, custom_css), ignore=VOLATILE_PATTERN)
+    return transaction.commit()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+File Index Tests
+Gitignore-style matching and incremental refreshes of the template file index
+"""
+
+import os
+
+import pytest
+
+from file_index import FileIndex, IgnoreRules
+
+
+# Ignore rules
+
+@pytest.mark.parametrize("pattern, path, is_dir, excluded", [
+    # A trailing slash only restricts the pattern to directories
+    ("build/", "build", True, True),
+    ("build/", "x/build", True, True),
+    ("build/", "build", False, False),
+    # A leading slash anchors to the root
+    ("/top/", "top", True, True),
+    ("/top/", "x/top", True, False),
+    # So does a slash in the middle
+    ("a/b/", "a/b", True, True),
+    ("a/b/", "x/a/b", True, False),
+    ("docs/*.md", "docs/a.md", False, True),
+    ("docs/*.md", "x/docs/a.md", False, False),
+    # **/ matches at any depth
+    ("**/deep", "q/deep", False, True),
+    ("**/deep", "deep", True, True),
+    # Plain names match at any depth
+    ("*.log", "x/y.log", False, True),
+    ("*.log", "x/y.txt", False, False),
+    ("/out/**", "out/a/b.html", False, True),
+])
+def test_ignore_pattern(pattern, path, is_dir, excluded):
+    assert IgnoreRules([pattern]).match(path, is_dir) is excluded
+
+
+def test_ignore_negation_and_comments():
+    rules = IgnoreRules(["# comment", "", "*.log", "!keep.log"])
+    assert rules.match("a.log", False)
+    assert not rules.match("keep.log", False)
+    assert not rules.match("# comment", False)
+
+
+def test_ignore_signature_follows_rules():
+    assert IgnoreRules(["a/"]).signature() == IgnoreRules(["a/"]).signature()
+    assert IgnoreRules(["a/"]).signature() != IgnoreRules(["/a/"]).signature()
+
+
+# Index
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def test_index_excludes_and_types(tmp_path):
+    root = str(tmp_path)
+    _write(os.path.join(root, "index.html"), "<p>")
+    _write(os.path.join(root, "styles", "main.css"), "p{}")
+    _write(os.path.join(root, "backups", "old.html"), "<p>")
+    _write(os.path.join(root, ".editorignore"), "drafts/\n")
+    _write(os.path.join(root, "drafts", "a.html"), "<p>")
+    index = FileIndex(root)
+    index.refresh()
+    assert index.paths() == [".editorignore", "index.html", "styles/main.css"]
+    assert index.by_type()["css"] == ["styles/main.css"]
+
+
+def test_refresh_picks_up_in_place_edits(tmp_path):
+    root = str(tmp_path)
+    path = os.path.join(root, "d", "x.txt")
+    _write(path, "ab")
+    index = FileIndex(root)
+    index.refresh()
+    assert index.total_size() == 2
+
+    # Rewriting a file does not change its directory's mtime
+    st = os.stat(os.path.dirname(path))
+    _write(path, "abcdef")
+    os.utime(os.path.dirname(path), ns=(st.st_atime_ns, st.st_mtime_ns))
+    # The cheap refresh only stats directories; a full one re-stats every file
+    index.refresh(restat=False)
+    assert index.total_size() == 2
+    index.refresh()
+    assert index.total_size() == 6
+
+
+def test_get_restats_the_file(tmp_path):
+    root = str(tmp_path)
+    path = os.path.join(root, "x.txt")
+    _write(path, "ab")
+    index = FileIndex(root)
+    index.refresh()
+    _write(path, "abcdef")
+    assert index.get("x.txt")["size"] == 6
+
+
+def test_refresh_rescans_changed_directories(tmp_path):
+    root = str(tmp_path)
+    _write(os.path.join(root, "a.txt"), "a")
+    index = FileIndex(root)
+    index.refresh()
+    _write(os.path.join(root, "sub", "b.txt"), "b")
+    os.remove(os.path.join(root, "a.txt"))
+    assert index.refresh() >= 1
+    assert index.paths() == ["sub/b.txt"]
+
+
+def test_content_hash_follows_changes(tmp_path):
+    root = str(tmp_path)
+    path = os.path.join(root, "a.txt")
+    _write(path, "one")
+    index = FileIndex(root)
+    index.refresh()
+    first = index.content_hash("a.txt")
+    _write(path, "two!")
+    assert index.content_hash("a.txt") != first
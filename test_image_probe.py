@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Image Probe Tests
+Header parsing for every supported format, EXIF orientation and SVG units
+"""
+
+import os
+
+import pytest
+
+from image_probe import probe_image
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _save(tmp_path, name, size=(40, 20), **params):
+    path = os.path.join(str(tmp_path), name)
+    Image.new("RGB", size, (200, 30, 30)).save(path, **params)
+    return path
+
+
+@pytest.mark.parametrize("name, fmt", [
+    ("a.png", "PNG"), ("a.gif", "GIF"), ("a.jpg", "JPEG"), ("a.webp", "WEBP"),
+])
+def test_raster_sizes(tmp_path, name, fmt):
+    assert probe_image(_save(tmp_path, name)) == {"format": fmt, "width": 40, "height": 20}
+
+
+def test_ico_reports_the_largest_entry(tmp_path):
+    path = _save(tmp_path, "favicon.ico", size=(48, 48), sizes=[(16, 16), (32, 32), (48, 48)])
+    assert probe_image(path)["width"] == 48
+
+
+@pytest.mark.parametrize("orientation, size", [
+    (1, (40, 20)), (3, (40, 20)),
+    # 5-8 rotate by 90 degrees: browsers swap width and height
+    (6, (20, 40)), (8, (20, 40)),
+])
+def test_jpeg_exif_orientation(tmp_path, orientation, size):
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    path = _save(tmp_path, f"o{orientation}.jpg", exif=exif.tobytes())
+    result = probe_image(path)
+    assert (result["width"], result["height"]) == size
+
+
+def _svg(tmp_path, attributes):
+    path = os.path.join(str(tmp_path), "a.svg")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0"?>\n<!DOCTYPE svg>\n'
+                f'<svg xmlns="http://www.w3.org/2000/svg" {attributes}><rect/></svg>')
+    return path
+
+
+@pytest.mark.parametrize("attributes, size", [
+    ('width="100" height="50"', (100, 50)),
+    ('width="100px" height="50px"', (100, 50)),
+    ('width="465pt" height="538pt"', (620, 717)),
+    ('width="1in" height="2.54cm"', (96, 96)),
+    ('width="25.4mm" height="6pc"', (96, 96)),
+    ('width="2em" height="1.5e1px"', (32, 15)),
+    # Relative sizes fall back to the viewBox
+    ('width="100%" height="100%" viewBox="0 0 30 10"', (30, 10)),
+    ('width="50vw" height="3" viewBox="0,0,12,8"', (12, 8)),
+    ('viewBox="0 0 24 24"', (24, 24)),
+    ('', (None, None)),
+])
+def test_svg_sizes(tmp_path, attributes, size):
+    result = probe_image(_svg(tmp_path, attributes))
+    assert result["format"] == "SVG"
+    assert (result["width"], result["height"]) == size
+
+
+def test_unknown_and_missing_files(tmp_path):
+    path = os.path.join(str(tmp_path), "a.txt")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("not an image")
+    assert probe_image(path) is None
+    assert probe_image(os.path.join(str(tmp_path), "missing.png")) is None
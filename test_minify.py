@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Minifier Tests
+Round trips through the JavaScript tokenizer and the CSS and HTML minifiers
+"""
+
+import pytest
+
+from css_minify import minify as minify_css, rewrite_urls
+from html_minify import minify_html
+from js_minify import JSSyntaxError, minify as minify_js, tokenize
+
+
+# JavaScript
+
+def _kinds(source):
+    return [kind for kind, _ in tokenize(source) if kind not in ("space", "newline")]
+
+
+@pytest.mark.parametrize("source", [
+    "a++ / 2 / c",
+    "b-- / 3",
+    "(a) / 2 / b",
+    "x[0] / 2 / y",
+    "1 / 2 / 3",
+])
+def test_js_slash_after_operand_is_division(source):
+    assert "regex" not in _kinds(source)
+
+
+@pytest.mark.parametrize("source", [
+    "/a+/g.test(s)",
+    "x = /a\\/b/",
+    "f(/[/]/)",
+    "return /x/",
+    "a && /y/.exec(b)",
+])
+def test_js_slash_before_operand_is_regex(source):
+    assert "regex" in _kinds(source)
+
+
+@pytest.mark.parametrize("source, expected", [
+    ("function f(a) {\n  // c\n  return /x+/g.test(a) ? \"a  b\" : `t ${ a }`;\n}",
+     'function f(a){return/x+/g.test(a)?"a  b":`t ${ a }`;}'),
+    ("x = a++ / 2 / c; y = b-- / 3;", "x=a++/2/c;y=b--/3;"),
+    # Line breaks stay where automatic semicolon insertion may depend on them
+    ("let b = a\n++c\n", "let b=a\n++c"),
+    ("a = b + +c; d = e - -f;", "a=b+ +c;d=e- -f;"),
+    ("x = 1 .toString()", "x=1 .toString()"),
+    ("/* license */ var a = 1;", "var a=1;"),
+])
+def test_js_minify(source, expected):
+    assert minify_js(source) == expected
+
+
+def test_js_unterminated_input_raises():
+    for source in ('"abc', "/* abc", "x = /abc"):
+        with pytest.raises(JSSyntaxError):
+            minify_js(source)
+
+
+# CSS
+
+@pytest.mark.parametrize("source, expected", [
+    ("/* c */ a { color : red ; margin: 0px }", "a{color:red;margin:0px}"),
+    # Rules with the same declarations are merged
+    ("a { color: red } b { color: red; }", "a,b{color:red}"),
+    ("@media (max-width: 600px) { .x { color: blue } }", "@media (max-width:600px){.x{color:blue}}"),
+    # Strings and url()s are copied untouched
+    ('p { content: "a  /* b */" }', 'p{content:"a  /* b */"}'),
+    ('.x { background: url("a b.png") }', '.x{background:url("a b.png")}'),
+    ("a{background:url(data:image/svg+xml;charset=utf8,%3Csvg%3E)}",
+     "a{background:url(data:image/svg+xml;charset=utf8,%3Csvg%3E)}"),
+])
+def test_css_minify(source, expected):
+    assert minify_css(source) == expected
+
+
+def test_css_merge_keeps_cascade_order():
+    # b sits between the two a rules, so merging them would change which color wins
+    css = "a { color: red } b { color: blue } a { color: blue }"
+    result = minify_css(css)
+    assert result.index("color:red") < result.rindex("color:blue")
+    assert minify_css(result) == result
+
+
+def test_css_rewrite_urls_skips_strings_and_comments():
+    css = '/* url(x.png) */ a { background: url(img/a.png) } b::after { content: "url(y.png)" }'
+    assert rewrite_urls(css, lambda value: "../" + value) == (
+        '/* url(x.png) */ a { background: url(../img/a.png) } b::after { content: "url(y.png)" }')
+
+
+# HTML
+
+PAGE = """<!DOCTYPE html>
+<html>
+  <head>
+    <!-- comment -->
+    <!--[if IE]><p>x</p><![endif]-->
+    <script type="text/javascript">var a  =  1;</script>
+    <style> p { color : red } </style>
+  </head>
+  <body>
+    <p>a   <b>b</b>  c</p>
+    <pre>  x
+   y </pre>
+    <textarea> t  </textarea>
+  </body>
+</html>
+"""
+
+
+def test_html_minify():
+    html, _ = minify_html(PAGE)
+    assert html == ('<!DOCTYPE html><html><head><!--[if IE]><p>x</p><![endif]-->'
+                    '<script>var a  =  1;</script><style>p{color:red}</style></head>'
+                    '<body><p>a <b>b</b> c</p><pre>  x\n   y </pre><textarea> t  </textarea></body></html>')
+
+
+def test_html_minify_is_idempotent():
+    html, _ = minify_html(PAGE)
+    assert minify_html(html)[0] == html
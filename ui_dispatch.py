@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+UI Dispatcher and Background Tasks
+Tk is not thread-safe, so worker threads never touch widgets directly.
+They hand callables to a UIDispatcher, whose queue is drained on the Tk
+main thread with after(). TaskRunner runs long editor operations on a
+thread pool with progress reporting and cooperative cancellation.
+"""
+
+import queue
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+DRAIN_INTERVAL_MS = 50
+MAX_CALLS_PER_DRAIN = 200
+PROGRESS_INTERVAL = 0.05
+
+logger = logging.getLogger(__name__)
+
+
+class TaskCancelled(Exception):
+    """Raised inside a worker when its task has been cancelled"""
+
+
+class UIDispatcher:
+    """Thread-safe queue of callables executed on the Tk main thread"""
+
+    def __init__(self, root, interval_ms: int = DRAIN_INTERVAL_MS,
+                 on_error: Optional[Callable[[str], None]] = None):
+        self.root = root
+        self.interval_ms = interval_ms
+        # Where failing callbacks are reported besides the logger, e.g. the log console
+        self.on_error = on_error
+        self.calls: "queue.Queue" = queue.Queue()
+        self.main_thread = threading.current_thread()
+        self.running = True
+        self.after_id = self.root.after(self.interval_ms, self._drain)
+
+    def in_main_thread(self) -> bool:
+        return threading.current_thread() is self.main_thread
+
+    def call(self, func: Callable, *args, **kwargs):
+        """Run func on the Tk thread: immediately if already there, else queued"""
+        if self.in_main_thread():
+            func(*args, **kwargs)
+        else:
+            self.calls.put((func, args, kwargs))
+
+    def post(self, func: Callable, *args, **kwargs):
+        """Always queue func for the next drain, even from the Tk thread"""
+        self.calls.put((func, args, kwargs))
+
+    def _drain(self):
+        """Execute queued calls, bounded per tick to keep the UI responsive"""
+        for _ in range(MAX_CALLS_PER_DRAIN):
+            try:
+                func, args, kwargs = self.calls.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                name = getattr(func, '__name__', func)
+                logger.exception("UI callback error in %s", name)
+                if self.on_error is not None:
+                    try:
+                        self.on_error(f"UI callback error in {name}: {e}")
+                    except Exception:
+                        logger.exception("UI error handler failed")
+        if self.running:
+            self.after_id = self.root.after(self.interval_ms, self._drain)
+
+    def stop(self):
+        """Stop draining (pending calls are dropped)"""
+        self.running = False
+        try:
+            self.root.after_cancel(self.after_id)
+        except Exception:
+            pass
+
+
+class Task:
+    """Handle for a background operation: progress, cancellation and result"""
+
+    def __init__(self, runner: "TaskRunner", name: str, description: str):
+        self.runner = runner
+        self.name = name
+        self.description = description
+        self.done = 0
+        self.total = 0
+        self.message = ""
+        self.future = None
+        self._cancel_event = threading.Event()
+        self._last_report = 0.0
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """Request cancellation; the worker stops at its next check"""
+        self._cancel_event.set()
+
+    def check_cancelled(self):
+        """Raise TaskCancelled if cancellation was requested"""
+        if self._cancel_event.is_set():
+            raise TaskCancelled(self.description)
+
+    def report(self, done: int, total: Optional[int] = None, message: Optional[str] = None):
+        """Record progress and forward it to the UI (throttled)"""
+        self.done = done
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+        now = time.monotonic()
+        if now - self._last_report >= PROGRESS_INTERVAL or (self.total and done >= self.total):
+            self._last_report = now
+            self.runner._notify(self)
+
+
+class TaskRunner:
+    """Thread pool for editor I/O that reports back through a UIDispatcher"""
+
+    def __init__(self, dispatcher: UIDispatcher, max_workers: int = 2,
+                 on_progress: Optional[Callable[[Task], None]] = None):
+        self.dispatcher = dispatcher
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="editor-worker")
+        self.on_progress = on_progress
+        self.tasks: Dict[str, Task] = {}
+        self.lock = threading.Lock()
+
+    def submit(self, name: str, func: Callable, *args,
+               on_done: Optional[Callable] = None,
+               on_error: Optional[Callable[[Exception], None]] = None,
+               on_cancel: Optional[Callable[[], None]] = None,
+               description: Optional[str] = None, **kwargs) -> Optional[Task]:
+        """Run func(task, *args, **kwargs) in the pool.
+
+        Callbacks run on the Tk thread. Returns None if a task with the
+        same name is still running.
+        """
+        with self.lock:
+            if name in self.tasks:
+                return None
+            task = Task(self, name, description or name)
+            self.tasks[name] = task
+
+        def run():
+            try:
+                result = func(task, *args, **kwargs)
+            except TaskCancelled:
+                self._finish(task, on_cancel)
+            except Exception as e:
+                self._finish(task, on_error, e)
+            else:
+                self._finish(task, on_done, result)
+
+        self._notify(task)
+        task.future = self.executor.submit(run)
+        return task
+
+    def _finish(self, task: Task, callback: Optional[Callable], *args):
+        with self.lock:
+            self.tasks.pop(task.name, None)
+        self._notify(task)
+        if callback is not None:
+            self.dispatcher.call(callback, *args)
+
+    def _notify(self, task: Task):
+        if self.on_progress is not None:
+            self.dispatcher.call(self.on_progress, task)
+
+    def is_running(self, name: str) -> bool:
+        with self.lock:
+            return name in self.tasks
+
+    def active_tasks(self):
+        with self.lock:
+            return list(self.tasks.values())
+
+    def cancel_all(self):
+        """Request cancellation of every running task"""
+        for task in self.active_tasks():
+            task.cancel()
+
+    def shutdown(self):
+        """Cancel running tasks and stop accepting new ones"""
+        self.cancel_all()
+        self.executor.shutdown(wait=False, cancel_futures=True)
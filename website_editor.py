@@ -8,17 +8,25 @@ Supports text editing, color customization, image management, responsive design,
 import os
 import json
 import shutil
-import re
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 import tkinter as tk
 from tkinter import ttk, filedialog, colorchooser, messagebox, scrolledtext
-from PIL import Image, ImageTk
+from PIL import ImageTk
 import webbrowser
 import threading
-import http.server
-import socketserver
 from pathlib import Path
+from file_index import get_file_index
+from image_cache import get_image_cache
+from ui_dispatch import UIDispatcher, TaskRunner
+from log_console import LogConsole, load_log_settings
+from site_export import describe_export, DEPLOY_PROFILES, DEFAULT_PROFILE, ARCHIVE_FORMATS
+from preview_server import PreviewServer
+from site_builder import SiteBuilder, default_config, merge_config
+from export_pipeline import describe_stages
+from image_optimize import optimize_images, restore_originals, describe_report
+from icon_set import generate_icons, describe_icons
+from asset_gc import collect_garbage, disk_usage, describe_gc, describe_usage
 
 class WebsiteEditor:
     def __init__(self):
@@ -30,43 +38,28 @@ class WebsiteEditor:
         self.template_path = None
         self.config_file = "editor_config.json"
         self.preview_port = 8090
-        self.server_thread = None
+        self.preview_server = None
+        self.file_index = None
         
         # Website configuration data
-        self.website_config = {
-            "meta": {
-                "title": "Hamid Haghmoradi | Quantum Force Metrology",
-                "description": "Doctoral Researcher in Quantum Force Metrology",
-                "author": "Hamid Haghmoradi",
-                "version": "1.0.0"
-            },
-            "colors": {
-                "primary": "#007AFF",
-                "secondary": "#5856D6",
-                "accent": "#FF9F0A",
-                "background": "#FFFFFF",
-                "text": "#000000"
-            },
-            "logo": {
-                "src": "images/logo.svg",
-                "width": "6rem",
-                "height": "6rem",
-                "alt": "HH Logo"
-            },
-            "navigation": {
-                "title": "Hamid Haghmoradi",
-                "menu_items": ["Home", "Research", "Publications", "Contact"]
-            },
-            "sections": [],
-            "images": {},
-            "tiles": []
-        }
+        self.website_config = default_config()
+        
+        # Background work: widgets are only touched from the Tk thread
+        self.dispatcher = UIDispatcher(self.root)
+        self.tasks = TaskRunner(self.dispatcher, on_progress=self.update_task_status)
+        self.render_lock = threading.RLock()
+        # (config, custom CSS, rendered file state) of the last render, to re-render only what changed
+        self.last_render = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         self.setup_ui()
         self.load_template()
     
     def setup_ui(self):
         """Create the main user interface"""
+        # Status bar for background tasks (packed first so it keeps its space)
+        self.create_status_bar()
+        
         # Create main notebook for tabs
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -106,7 +99,7 @@ class WebsiteEditor:
         file_menu.add_separator()
         file_menu.add_command(label="Export Website", command=self.export_website)
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=self.root.quit)
+        file_menu.add_command(label="Exit", command=self.on_close)
         
         # Tools menu
         tools_menu = tk.Menu(menubar, tearoff=0)
@@ -115,6 +108,39 @@ class WebsiteEditor:
         tools_menu.add_command(label="Stop Preview Server", command=self.stop_preview_server)
         tools_menu.add_command(label="Open in Browser", command=self.open_preview)
     
+    def create_status_bar(self):
+        """Create background task status bar"""
+        status_frame = ttk.Frame(self.root)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=(0, 5))
+        
+        self.task_label = ttk.Label(status_frame, text="Ready")
+        self.task_label.pack(side=tk.LEFT, padx=5)
+        
+        self.cancel_button = ttk.Button(status_frame, text="Cancel", command=self.tasks.cancel_all, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.RIGHT, padx=5)
+        
+        self.task_progress = ttk.Progressbar(status_frame, length=250, mode="determinate", maximum=100)
+        self.task_progress.pack(side=tk.RIGHT, padx=5)
+    
+    def update_task_status(self, task):
+        """Reflect background task progress in the status bar"""
+        active = self.tasks.active_tasks()
+        if not active:
+            self.task_label.config(text="Ready")
+            self.task_progress.config(value=0)
+            self.cancel_button.config(state=tk.DISABLED)
+            return
+        
+        current = task if task in active else active[0]
+        text = current.description
+        if current.message:
+            text += f": {current.message}"
+        if len(active) > 1:
+            text += f" (+{len(active) - 1} more)"
+        self.task_label.config(text=text)
+        self.task_progress.config(value=100 * current.done / current.total if current.total else 0)
+        self.cancel_button.config(state=tk.NORMAL)
+    
     def create_template_tab(self):
         """Create template management tab"""
         frame = ttk.Frame(self.notebook)
@@ -222,6 +248,7 @@ class WebsiteEditor:
         self.logo_src_var = tk.StringVar(value=self.website_config["logo"]["src"])
         ttk.Entry(logo_frame, textvariable=self.logo_src_var, width=40).grid(row=0, column=1, padx=5, pady=2)
         ttk.Button(logo_frame, text="Browse", command=self.browse_logo).grid(row=0, column=2, padx=5, pady=2)
+        ttk.Button(logo_frame, text="Generate Icons", command=self.generate_icon_set).grid(row=0, column=3, padx=5, pady=2)
         
         ttk.Label(logo_frame, text="Width:").grid(row=1, column=0, sticky=tk.W, padx=5, pady=2)
         self.logo_width_var = tk.StringVar(value=self.website_config["logo"]["width"])
@@ -265,6 +292,9 @@ class WebsiteEditor:
         ttk.Button(controls_frame, text="Add Image", command=self.add_image).pack(side=tk.LEFT, padx=5)
         ttk.Button(controls_frame, text="Remove Image", command=self.remove_image).pack(side=tk.LEFT, padx=5)
         ttk.Button(controls_frame, text="Edit Properties", command=self.edit_image_properties).pack(side=tk.LEFT, padx=5)
+        ttk.Button(controls_frame, text="Optimize Images", command=self.optimize_images).pack(side=tk.LEFT, padx=5)
+        ttk.Button(controls_frame, text="Restore Originals", command=self.restore_original_images).pack(side=tk.LEFT, padx=5)
+        ttk.Button(controls_frame, text="Clean Up Unused", command=self.clean_up_assets).pack(side=tk.LEFT, padx=5)
         
         # Image preview
         preview_frame = ttk.LabelFrame(frame, text="Image Preview")
@@ -327,12 +357,27 @@ class WebsiteEditor:
         ttk.Button(export_frame, text="Export Website", 
                   command=self.export_website).grid(row=0, column=2, padx=5, pady=5)
         
+        ttk.Label(export_frame, text="Profile:").grid(row=0, column=3, sticky=tk.W, padx=5, pady=5)
+        self.profile_var = tk.StringVar(value=DEFAULT_PROFILE)
+        ttk.Combobox(export_frame, textvariable=self.profile_var, values=list(DEPLOY_PROFILES),
+                     state="readonly", width=14).grid(row=0, column=4, padx=5, pady=5)
+        
+        ttk.Label(export_frame, text="Format:").grid(row=0, column=5, sticky=tk.W, padx=5, pady=5)
+        self.export_format_var = tk.StringVar(value="folder")
+        ttk.Combobox(export_frame, textvariable=self.export_format_var, values=["folder"] + list(ARCHIVE_FORMATS),
+                     state="readonly", width=8).grid(row=0, column=6, padx=5, pady=5)
+        
         # Export log
         log_frame = ttk.LabelFrame(frame, text="Export Log")
         log_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
         
         self.export_log = scrolledtext.ScrolledText(log_frame, height=20, width=80)
         self.export_log.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        # Batched, line-capped log sink (settings from the "log" section of editor_config.json)
+        log_settings = load_log_settings(os.path.join(os.path.dirname(os.path.abspath(__file__)), self.config_file))
+        self.log_console = LogConsole(self.export_log, self.dispatcher, **log_settings)
+        self.dispatcher.on_error = self.log_message
     
     def load_template_dialog(self):
         """Load template from folder"""
@@ -347,6 +392,8 @@ class WebsiteEditor:
         if not self.template_path:
             self.template_path = os.path.dirname(os.path.abspath(__file__))
             self.template_label.config(text=f"Template: {os.path.basename(self.template_path)}")
+        with self.render_lock:
+            self.last_render = None
         self.analyze_template()
     
     def analyze_template(self):
@@ -354,30 +401,30 @@ class WebsiteEditor:
         if not self.template_path:
             return
         
+        self.tasks.submit("analyze", self.scan_template, self.template_path,
+                          on_done=self.show_template_analysis,
+                          on_error=lambda e: self.log_message(f"Template analysis error: {e}"),
+                          description="Analyzing template")
+    
+    def scan_template(self, task, template_path):
+        """Refresh the template file index (worker thread)"""
+        return get_file_index(template_path)
+    
+    def show_template_analysis(self, file_index):
+        """Display analysis results from the file index"""
+        self.file_index = file_index
+        
         info = []
         info.append(f"Template Path: {self.template_path}")
         info.append(f"Analysis Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         info.append("")
         
-        # Analyze files
-        html_files = []
-        css_files = []
-        js_files = []
-        image_files = []
-        
-        for root, dirs, files in os.walk(self.template_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                rel_path = os.path.relpath(file_path, self.template_path)
-                
-                if file.endswith(('.html', '.htm')):
-                    html_files.append(rel_path)
-                elif file.endswith('.css'):
-                    css_files.append(rel_path)
-                elif file.endswith('.js'):
-                    js_files.append(rel_path)
-                elif file.endswith(('.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp')):
-                    image_files.append(rel_path)
+        # Analyze files (incremental, excludes backups/.git/exports)
+        files_by_type = self.file_index.by_type()
+        html_files = files_by_type.get("html", [])
+        css_files = files_by_type.get("css", [])
+        js_files = files_by_type.get("js", [])
+        image_files = files_by_type.get("image", [])
         
         info.append(f"HTML Files ({len(html_files)}):")
         for file in html_files:
@@ -435,6 +482,32 @@ class WebsiteEditor:
             
             self.logo_src_var.set(rel_path)
     
+    def generate_icon_set(self):
+        """Render favicons and manifest icons from the logo in the background"""
+        if not self.template_path:
+            messagebox.showerror("Error", "No template loaded")
+            return
+        source = self.logo_src_var.get().strip()
+        task = self.tasks.submit("icons", self.run_icon_generation, source,
+                                 on_done=self.icons_generated,
+                                 on_error=lambda e: self.log_message(f"Icon generation error: {e}"),
+                                 description="Generating icons")
+        if task is None:
+            self.log_message("Icon generation is already running")
+    
+    def run_icon_generation(self, task, source):
+        """Render or relink the icon set and rewrite manifest.json and icon links (worker thread)"""
+        return generate_icons(self.template_path, source, task=task)
+    
+    def icons_generated(self, report):
+        """Log the icon report and refresh the gallery"""
+        image_cache = get_image_cache(self.template_path)
+        for rel_path in report["written"]:
+            image_cache.invalidate(rel_path)
+        for line in describe_icons(report):
+            self.log_message(line)
+        self.analyze_template()
+    
     def add_section(self):
         """Add new content section"""
         self.section_dialog()
@@ -558,19 +631,129 @@ class WebsiteEditor:
         )
         
         if file_path and self.template_path:
-            # Copy to images directory
+            # Copy to images directory in the background
             images_dir = os.path.join(self.template_path, 'images')
-            os.makedirs(images_dir, exist_ok=True)
-            
-            dest_path = os.path.join(images_dir, os.path.basename(file_path))
-            shutil.copy2(file_path, dest_path)
-            
-            # Add to list
-            rel_path = f"images/{os.path.basename(file_path)}"
+            self.tasks.submit("add_images", self.copy_images, [file_path], images_dir,
+                              on_done=self.images_added,
+                              on_error=lambda e: self.log_message(f"Error adding image: {e}"),
+                              on_cancel=self.analyze_template,
+                              description="Adding image")
+    
+    def copy_images(self, task, file_paths, images_dir):
+        """Copy image files into the template (worker thread)"""
+        os.makedirs(images_dir, exist_ok=True)
+        added, errors = [], []
+        for i, file_path in enumerate(file_paths):
+            task.check_cancelled()
+            task.report(i, len(file_paths), os.path.basename(file_path))
+            try:
+                shutil.copy2(file_path, os.path.join(images_dir, os.path.basename(file_path)))
+                added.append(f"images/{os.path.basename(file_path)}")
+            except Exception as e:
+                errors.append(f"Error adding {file_path}: {e}")
+        task.report(len(file_paths), len(file_paths))
+        return added, errors
+    
+    def images_added(self, result):
+        """Add copied images to the gallery"""
+        added, errors = result
+        for error in errors:
+            self.log_message(error)
+        for rel_path in added:
             self.image_listbox.insert(tk.END, rel_path)
-            
             self.log_message(f"Added image: {rel_path}")
     
+    def optimize_images(self):
+        """Recompress referenced images and write WebP siblings in the background"""
+        if not self.template_path:
+            messagebox.showerror("Error", "No template loaded")
+            return
+        
+        task = self.tasks.submit("optimize_images", self.run_image_optimization,
+                                 on_done=self.images_optimized,
+                                 on_error=lambda e: self.log_message(f"Image optimization error: {e}"),
+                                 on_cancel=lambda: self.log_message("Image optimization cancelled"),
+                                 description="Optimizing images")
+        if task is None:
+            self.log_message("Image optimization is already running")
+    
+    def run_image_optimization(self, task):
+        """Optimize images in a process pool and drop their cached metadata (worker thread)"""
+        report = optimize_images(self.template_path, task=task)
+        image_cache = get_image_cache(self.template_path)
+        for entry in report["images"]:
+            image_cache.invalidate(entry["path"])
+        return report
+    
+    def images_optimized(self, report):
+        """Log the byte-savings report and refresh the gallery"""
+        for line in describe_report(report):
+            self.log_message(line)
+        self.analyze_template()
+    
+    def restore_original_images(self):
+        """Undo image optimization from the originals sidecar"""
+        if not self.template_path:
+            return
+        if not messagebox.askyesno("Restore Originals", "Put the original images back and remove WebP copies?"):
+            return
+        try:
+            restored = restore_originals(self.template_path)
+            image_cache = get_image_cache(self.template_path)
+            for rel_path in restored:
+                image_cache.invalidate(rel_path)
+            self.log_message(f"Restored {len(restored)} original images")
+            self.analyze_template()
+        except Exception as e:
+            self.log_message(f"Could not restore images: {e}")
+            messagebox.showerror("Error", f"Could not restore images: {e}")
+    
+    def clean_up_assets(self):
+        """Show the disk usage breakdown and offer to quarantine unused assets"""
+        if not self.template_path:
+            messagebox.showerror("Error", "No template loaded")
+            return
+        config, _ = self.snapshot_config()
+        task = self.tasks.submit("clean_up", self.scan_storage, config,
+                                 on_done=self.confirm_clean_up,
+                                 on_error=lambda e: self.log_message(f"Disk usage error: {e}"),
+                                 description="Analyzing disk usage")
+        if task is None:
+            self.log_message("Clean up is already running")
+    
+    def scan_storage(self, task, config):
+        """Disk usage and a dry run of the garbage collector (worker thread)"""
+        return config, disk_usage(self.template_path, config), collect_garbage(self.template_path, config, dry_run=True)
+    
+    def confirm_clean_up(self, result):
+        """Log the breakdown, then quarantine unused files if the user agrees"""
+        config, usage, preview = result
+        self.log_message("Disk usage:")
+        for line in describe_usage(usage):
+            self.log_message(f"  {line}")
+        if not (preview["quarantined"] or preview["restored"] or preview["purged"]):
+            self.log_message("No unused files")
+            return
+        lines = describe_gc(preview)
+        if len(lines) > 15:
+            lines = lines[:15] + ["  ..."]
+        if not messagebox.askyesno("Clean Up Unused", "\n".join(lines) + "\n\nContinue?"):
+            return
+        self.tasks.submit("clean_up", self.run_clean_up, config,
+                          on_done=self.clean_up_finished,
+                          on_error=lambda e: self.log_message(f"Clean up error: {e}"),
+                          description="Cleaning up unused files")
+    
+    def run_clean_up(self, task, config):
+        """Quarantine unused assets and old backups, purge expired ones (worker thread)"""
+        return collect_garbage(self.template_path, config)
+    
+    def clean_up_finished(self, report):
+        """Log what was moved and refresh the gallery"""
+        for line in describe_gc(report):
+            self.log_message(line)
+        self.analyze_template()
+    
     def remove_image(self):
         """Remove selected image"""
         selection = self.image_listbox.curselection()
@@ -603,11 +786,17 @@ class WebsiteEditor:
         dialog.geometry("500x400")
         dialog.grab_set()
         
+        # Intrinsic size from the image header (no pixel decode)
+        image_cache = get_image_cache(self.template_path)
+        meta = image_cache.get_metadata(image_path)
+        image_cache.save_metadata()
+        intrinsic = meta if meta and meta.get("width") else None
+        
         # Current properties
         current_props = self.website_config["images"].get(image_path, {
             "alt": "",
-            "width": "auto",
-            "height": "auto",
+            "width": f"{intrinsic['width']}px" if intrinsic else "auto",
+            "height": f"{intrinsic['height']}px" if intrinsic else "auto",
             "frame": "none",
             "position": "center"
         })
@@ -640,9 +829,13 @@ class WebsiteEditor:
                                      values=["left", "center", "right", "float-left", "float-right"])
         position_combo.grid(row=4, column=1, sticky=tk.W, padx=5, pady=5)
         
+        # File info from the metadata index
+        ttk.Label(dialog, text="File:").grid(row=5, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Label(dialog, text=self.format_image_meta(meta)).grid(row=5, column=1, sticky=tk.W, padx=5, pady=5)
+        
         # Buttons
         button_frame = ttk.Frame(dialog)
-        button_frame.grid(row=5, column=0, columnspan=2, pady=20)
+        button_frame.grid(row=6, column=0, columnspan=2, pady=20)
         
         def save_properties():
             self.website_config["images"][image_path] = {
@@ -669,11 +862,9 @@ class WebsiteEditor:
     def show_image_preview(self, image_path):
         """Show image preview"""
         try:
-            full_path = os.path.join(self.template_path, image_path)
-            if os.path.exists(full_path) and not image_path.endswith('.svg'):
-                # Load and resize image for preview
-                image = Image.open(full_path)
-                image.thumbnail((200, 200), Image.Resampling.LANCZOS)
+            # Cached thumbnail (memory LRU, then disk, then a draft-mode decode)
+            image = get_image_cache(self.template_path).thumbnail(image_path)
+            if image is not None:
                 photo = ImageTk.PhotoImage(image)
                 
                 self.image_preview_label.config(image=photo, text="")
@@ -683,6 +874,13 @@ class WebsiteEditor:
         except Exception as e:
             self.image_preview_label.config(image="", text=f"Error loading preview: {e}")
     
+    def format_image_meta(self, meta):
+        """Format image metadata for display"""
+        if not meta:
+            return "Unavailable"
+        size = f"{meta['width']} x {meta['height']} px" if meta.get("width") else "Unknown size"
+        return f"{size} | {meta.get('format') or '?'} | {meta['bytes'] / 1024:.1f} KB"
+    
     def add_tile(self):
         """Add new tile"""
         self.tile_dialog()
@@ -817,35 +1015,39 @@ class WebsiteEditor:
     
     def start_preview_server(self):
         """Start preview server"""
-        if self.server_thread and self.server_thread.is_alive():
+        if self.preview_server and self.preview_server.running:
             self.log_message("Preview server is already running")
             return
         
         self.generate_preview()
         
-        def run_server():
-            try:
-                os.chdir(self.template_path)
-                handler = http.server.SimpleHTTPRequestHandler
-                with socketserver.TCPServer(("", self.preview_port), handler) as httpd:
-                    self.log_message(f"Preview server started at http://localhost:{self.preview_port}")
-                    self.preview_status.config(text=f"Server running on port {self.preview_port}")
-                    httpd.serve_forever()
-            except Exception as e:
-                self.log_message(f"Server error: {e}")
-        
-        self.server_thread = threading.Thread(target=run_server, daemon=True)
-        self.server_thread.start()
+        try:
+            # Threaded server bound to the template folder; falls back to a free port
+            self.preview_server = PreviewServer(self.template_path, self.preview_port)
+            url = self.preview_server.start()
+            self.log_message(f"Preview server started at {url}")
+            self.preview_status.config(text=f"Server running on port {self.preview_server.port}")
+        except Exception as e:
+            self.preview_server = None
+            self.log_message(f"Server error: {e}")
     
     def stop_preview_server(self):
         """Stop preview server"""
-        # Note: This is a simplified stop - in production you'd want proper server shutdown
+        if self.preview_server:
+            self.preview_server.stop()
+            self.preview_server = None
         self.preview_status.config(text="Preview server stopped")
         self.log_message("Preview server stopped")
     
+    def preview_url(self):
+        """URL of the running preview server (or the configured port)"""
+        if self.preview_server and self.preview_server.running:
+            return self.preview_server.url
+        return f"http://localhost:{self.preview_port}"
+    
     def open_preview(self):
         """Open preview in browser"""
-        webbrowser.open(f"http://localhost:{self.preview_port}")
+        webbrowser.open(self.preview_url())
     
     def generate_preview(self):
         """Generate preview files"""
@@ -855,11 +1057,28 @@ class WebsiteEditor:
         
         try:
             self.update_config_from_ui()
-            self.apply_config_to_files()
-            self.log_message("Preview generated successfully")
         except Exception as e:
-            self.log_message(f"Error generating preview: {e}")
-            messagebox.showerror("Error", f"Could not generate preview: {e}")
+            self.preview_failed(e)
+            return
+        
+        config, custom_css = self.snapshot_config()
+        self.tasks.submit("preview", self.render_preview, config, custom_css,
+                          on_done=lambda changed: self.log_message(f"Preview generated successfully ({len(changed)} files updated)"),
+                          on_error=self.preview_failed,
+                          description="Generating preview")
+    
+    def render_preview(self, task, config, custom_css):
+        """Write configuration to the template files (worker thread)"""
+        return self.apply_config_to_files(config, custom_css, incremental=True)
+    
+    def preview_failed(self, error):
+        """Report a preview generation error"""
+        self.log_message(f"Error generating preview: {error}")
+        messagebox.showerror("Error", f"Could not generate preview: {error}")
+    
+    def snapshot_config(self):
+        """Copy configuration and custom CSS for use off the Tk thread"""
+        return json.loads(json.dumps(self.website_config)), self.custom_css.get(1.0, tk.END)
     
     def update_config_from_ui(self):
         """Update configuration from UI elements"""
@@ -879,73 +1098,29 @@ class WebsiteEditor:
         self.website_config["logo"]["width"] = self.logo_width_var.get()
         self.website_config["logo"]["height"] = self.logo_height_var.get()
     
-    def apply_config_to_files(self):
-        """Apply configuration to template files"""
-        # Update HTML file
-        html_file = os.path.join(self.template_path, "index.html")
-        if os.path.exists(html_file):
-            with open(html_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Update meta information
-            content = re.sub(r'<title>.*?</title>', 
-                           f'<title>{self.website_config["meta"]["title"]}</title>', content)
-            content = re.sub(r'<meta name="description" content=".*?"', 
-                           f'<meta name="description" content="{self.website_config["meta"]["description"]}"', content)
-            
-            # Update logo
-            content = re.sub(r'<img src="[^"]*" alt="[^"]*" class="logo-icon">', 
-                           f'<img src="{self.website_config["logo"]["src"]}" alt="{self.website_config["logo"]["alt"]}" class="logo-icon">', content)
-            
-            # Update brand name
-            content = re.sub(r'<span class="logo-text">.*?</span>', 
-                           f'<span class="logo-text">{self.website_config["navigation"]["title"]}</span>', content)
-            
-            with open(html_file, 'w', encoding='utf-8') as f:
-                f.write(content)
-        
-        # Update CSS file with custom styles
-        self.update_css_file()
-    
-    def update_css_file(self):
-        """Update CSS file with custom styles"""
-        css_file = os.path.join(self.template_path, "custom_styles.css")
-        
-        css_content = f"""
-/* Generated Custom Styles */
-:root {{
-    --primary-color: {self.website_config["colors"]["primary"]};
-    --secondary-color: {self.website_config["colors"]["secondary"]};
-    --accent-color: {self.website_config["colors"]["accent"]};
-    --background-color: {self.website_config["colors"]["background"]};
-    --text-color: {self.website_config["colors"]["text"]};
-}}
-
-.logo-icon {{
-    width: {self.website_config["logo"]["width"]} !important;
-    height: {self.website_config["logo"]["height"]} !important;
-}}
-
-/* Custom CSS from editor */
-{self.custom_css.get(1.0, tk.END)}
-"""
-        
-        with open(css_file, 'w', encoding='utf-8') as f:
-            f.write(css_content)
-        
-        # Add link to HTML if not present
-        html_file = os.path.join(self.template_path, "index.html")
-        if os.path.exists(html_file):
-            with open(html_file, 'r', encoding='utf-8') as f:
-                content = f.read()
+    def site_builder(self, config, custom_css):
+        """Headless build engine for the loaded template"""
+        return SiteBuilder(self.template_path, config, custom_css, style="basic", lock=self.render_lock)
+    
+    def apply_config_to_files(self, config=None, custom_css=None, incremental=False):
+        """Apply configuration to template files in one transaction; returns changed files"""
+        if config is None:
+            config, custom_css = self.website_config, self.custom_css.get(1.0, tk.END)
+        
+        builder = self.site_builder(config, custom_css)
+        with self.render_lock:
+            # Only outputs consuming a changed configuration key are rendered again
+            outputs = None
+            # Files edited on disk since the last render are rendered again in full
+            if (incremental and self.last_render is not None and
+                    self.last_render[2] == builder.rendered_state()):
+                outputs = builder.changed_outputs(*self.last_render[:2])
             
-            if 'custom_styles.css' not in content:
-                # Add custom CSS link before closing head tag
-                content = content.replace('</head>', 
-                                        '    <link rel="stylesheet" href="custom_styles.css">\\n</head>')
-                
-                with open(html_file, 'w', encoding='utf-8') as f:
-                    f.write(content)
+            # index.html and the generated stylesheet are read once, edited in memory
+            # and only written when their content actually changed
+            changed = builder.build(outputs) if outputs is None or outputs else []
+            self.last_render = (config, custom_css, builder.rendered_state())
+        return changed
     
     def export_website(self):
         """Export website with version control"""
@@ -954,33 +1129,50 @@ class WebsiteEditor:
             return
         
         try:
-            # Generate preview first
-            self.generate_preview()
-            
-            # Create export directory
-            version = self.version_var.get()
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            export_name = f"{version}_{timestamp}"
-            
-            export_dir = os.path.join(os.path.dirname(self.template_path), export_name)
-            
-            # Copy template to export directory
-            shutil.copytree(self.template_path, export_dir)
-            
-            # Save configuration
-            config_file = os.path.join(export_dir, "website_config.json")
-            with open(config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.website_config, f, indent=2)
-            
-            self.log_message(f"Website exported to: {export_dir}")
-            self.log_message(f"Version: {version}")
-            self.log_message(f"Timestamp: {timestamp}")
-            
-            messagebox.showinfo("Export Complete", f"Website exported to:\\n{export_dir}")
-            
+            self.update_config_from_ui()
         except Exception as e:
-            self.log_message(f"Export error: {e}")
-            messagebox.showerror("Export Error", f"Could not export website: {e}")
+            self.export_failed(e)
+            return
+        
+        config, custom_css = self.snapshot_config()
+        version = self.version_var.get()
+        profile = self.profile_var.get()
+        export_format = self.export_format_var.get()
+        task = self.tasks.submit("export", self.build_export, config, custom_css, version, profile, export_format,
+                                 on_done=self.export_finished,
+                                 on_error=self.export_failed,
+                                 on_cancel=lambda: self.log_message("Export cancelled"),
+                                 description="Exporting website")
+        if task is None:
+            self.log_message("An export is already running")
+    
+    def build_export(self, task, config, custom_css, version, profile=DEFAULT_PROFILE, export_format="folder"):
+        """Generate files and export deployable files to a versioned folder or archive (worker thread)"""
+        builder = self.site_builder(config, custom_css)
+        export_dir, timestamp, summary = builder.export(version, profile, export_format,
+                                                        include_info=False, task=task)
+        # last_render is shared with the incremental apply, which may run on another worker
+        with self.render_lock:
+            self.last_render = (config, custom_css, builder.rendered_state())
+        return export_dir, version, timestamp, summary
+    
+    def export_finished(self, result):
+        """Report a completed export"""
+        export_dir, version, timestamp, summary = result
+        self.log_message("Preview generated successfully")
+        self.log_message(f"Website exported to: {export_dir}")
+        self.log_message(f"Version: {version}")
+        self.log_message(f"Timestamp: {timestamp}")
+        self.log_message(describe_export(summary))
+        for line in describe_stages(summary.get("stages", {})):
+            self.log_message(line)
+        
+        messagebox.showinfo("Export Complete", f"Website exported to:\\n{export_dir}")
+    
+    def export_failed(self, error):
+        """Report an export error"""
+        self.log_message(f"Export error: {error}")
+        messagebox.showerror("Export Error", f"Could not export website: {error}")
     
     def save_config(self):
         """Save configuration to file"""
@@ -1010,7 +1202,8 @@ class WebsiteEditor:
         if file_path:
             try:
                 with open(file_path, 'r', encoding='utf-8') as f:
-                    self.website_config = json.load(f)
+                    # Configs saved by older versions lack newer sections such as "build"
+                    self.website_config = merge_config(default_config(), json.load(f))
                 
                 self.update_ui_from_config()
                 self.log_message(f"Configuration loaded from: {file_path}")
@@ -1041,12 +1234,17 @@ class WebsiteEditor:
         self.update_tiles_list()
     
     def log_message(self, message):
-        """Add message to export log"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        log_entry = f"[{timestamp}] {message}\\n"
-        self.export_log.insert(tk.END, log_entry)
-        self.export_log.see(tk.END)
-        self.root.update()
+        """Add message to export log (thread-safe, flushed in batches)"""
+        self.log_console.write(message)
+    
+    def on_close(self):
+        """Cancel background work, stop the preview server and close the window"""
+        if self.preview_server:
+            self.preview_server.stop()
+        self.tasks.shutdown()
+        self.log_console.close()
+        self.dispatcher.stop()
+        self.root.destroy()
     
     def run(self):
         """Start the application"""
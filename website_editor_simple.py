@@ -7,16 +7,21 @@ A comprehensive Python interface for editing website templates with real-time pr
 import os
 import json
 import shutil
-import re
-from datetime import datetime
 from typing import Dict, List, Any, Optional
 import tkinter as tk
 from tkinter import ttk, filedialog, colorchooser, messagebox, scrolledtext
 import webbrowser
 import threading
-import http.server
-import socketserver
 from pathlib import Path
+from file_index import get_file_index
+from image_cache import get_image_cache
+from ui_dispatch import UIDispatcher, TaskRunner
+from log_console import LogConsole, load_log_settings
+from site_export import describe_export, open_in_file_manager, DEPLOY_PROFILES, DEFAULT_PROFILE, ARCHIVE_FORMATS
+from preview_server import PreviewServer
+from site_builder import SiteBuilder, default_config, merge_config
+from export_pipeline import describe_stages
+from image_optimize import optimize_images, restore_originals, describe_report
 
 class WebsiteEditor:
     def __init__(self):
@@ -28,43 +33,28 @@ class WebsiteEditor:
         self.template_path = None
         self.config_file = "editor_config.json"
         self.preview_port = 8090
-        self.server_thread = None
+        self.preview_server = None
+        self.file_index = None
         
         # Website configuration data
-        self.website_config = {
-            "meta": {
-                "title": "Hamid Haghmoradi | Quantum Force Metrology",
-                "description": "Doctoral Researcher in Quantum Force Metrology",
-                "author": "Hamid Haghmoradi",
-                "version": "1.0.0"
-            },
-            "colors": {
-                "primary": "#007AFF",
-                "secondary": "#5856D6",
-                "accent": "#FF9F0A",
-                "background": "#FFFFFF",
-                "text": "#000000"
-            },
-            "logo": {
-                "src": "images/logo.svg",
-                "width": "6rem",
-                "height": "6rem",
-                "alt": "HH Logo"
-            },
-            "navigation": {
-                "title": "Hamid Haghmoradi",
-                "menu_items": ["Home", "Research", "Publications", "Contact"]
-            },
-            "sections": [],
-            "images": {},
-            "tiles": []
-        }
+        self.website_config = default_config()
+        
+        # Background work: widgets are only touched from the Tk thread
+        self.dispatcher = UIDispatcher(self.root)
+        self.tasks = TaskRunner(self.dispatcher, on_progress=self.update_task_status)
+        self.render_lock = threading.RLock()
+        # (config, custom CSS, rendered file state) of the last render, to re-render only what changed
+        self.last_render = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         self.setup_ui()
         self.load_template()
     
     def setup_ui(self):
         """Create the main user interface"""
+        # Status bar for background tasks (packed first so it keeps its space)
+        self.create_status_bar()
+        
         # Create main notebook for tabs
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -101,7 +91,7 @@ class WebsiteEditor:
         file_menu.add_separator()
         file_menu.add_command(label="Export Website", command=self.export_website)
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=self.root.quit)
+        file_menu.add_command(label="Exit", command=self.on_close)
         
         # Tools menu
         tools_menu = tk.Menu(menubar, tearoff=0)
@@ -110,6 +100,39 @@ class WebsiteEditor:
         tools_menu.add_command(label="Stop Preview Server", command=self.stop_preview_server)
         tools_menu.add_command(label="Open in Browser", command=self.open_preview)
     
+    def create_status_bar(self):
+        """Create background task status bar"""
+        status_frame = ttk.Frame(self.root)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=(0, 5))
+        
+        self.task_label = ttk.Label(status_frame, text="Ready", font=("Arial", 10))
+        self.task_label.pack(side=tk.LEFT, padx=5)
+        
+        self.cancel_button = ttk.Button(status_frame, text="⏹️ Cancel", command=self.tasks.cancel_all, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.RIGHT, padx=5)
+        
+        self.task_progress = ttk.Progressbar(status_frame, length=250, mode="determinate", maximum=100)
+        self.task_progress.pack(side=tk.RIGHT, padx=5)
+    
+    def update_task_status(self, task):
+        """Reflect background task progress in the status bar"""
+        active = self.tasks.active_tasks()
+        if not active:
+            self.task_label.config(text="Ready")
+            self.task_progress.config(value=0)
+            self.cancel_button.config(state=tk.DISABLED)
+            return
+        
+        current = task if task in active else active[0]
+        text = f"⏳ {current.description}"
+        if current.message:
+            text += f": {current.message}"
+        if len(active) > 1:
+            text += f" (+{len(active) - 1} more)"
+        self.task_label.config(text=text)
+        self.task_progress.config(value=100 * current.done / current.total if current.total else 0)
+        self.cancel_button.config(state=tk.NORMAL)
+    
     def create_template_tab(self):
         """Create template management tab"""
         frame = ttk.Frame(self.notebook)
@@ -361,6 +384,8 @@ Supported formats: JPG, PNG, SVG, GIF, WebP | Frame styles: None, Rounded, Circl
         ttk.Button(controls_frame, text="📁 Add Images", command=self.add_image).pack(side=tk.LEFT, padx=2)
         ttk.Button(controls_frame, text="🗑️ Remove", command=self.remove_image).pack(side=tk.LEFT, padx=2)
         ttk.Button(controls_frame, text="⚙️ Properties", command=self.edit_image_properties).pack(side=tk.LEFT, padx=2)
+        ttk.Button(controls_frame, text="⚡ Optimize", command=self.optimize_images).pack(side=tk.LEFT, padx=2)
+        ttk.Button(controls_frame, text="↩️ Restore", command=self.restore_original_images).pack(side=tk.LEFT, padx=2)
         
         # Right side - Properties
         right_frame = ttk.LabelFrame(main_container, text="Image Properties")
@@ -422,6 +447,16 @@ Supported formats: JPG, PNG, SVG, GIF, WebP | Frame styles: None, Rounded, Circl
         ttk.Button(export_controls, text="📦 Export Website", 
                   command=self.export_website).grid(row=0, column=2, padx=10, pady=5)
         
+        ttk.Label(export_controls, text="Profile:", font=("Arial", 10, "bold")).grid(row=0, column=3, sticky=tk.W, padx=5, pady=5)
+        self.profile_var = tk.StringVar(value=DEFAULT_PROFILE)
+        ttk.Combobox(export_controls, textvariable=self.profile_var, values=list(DEPLOY_PROFILES),
+                     state="readonly", width=14).grid(row=0, column=4, padx=5, pady=5)
+        
+        ttk.Label(export_controls, text="Format:", font=("Arial", 10, "bold")).grid(row=0, column=5, sticky=tk.W, padx=5, pady=5)
+        self.export_format_var = tk.StringVar(value="folder")
+        ttk.Combobox(export_controls, textvariable=self.export_format_var, values=["folder"] + list(ARCHIVE_FORMATS),
+                     state="readonly", width=8).grid(row=0, column=6, padx=5, pady=5)
+        
         # Current stats
         stats_frame = ttk.Frame(export_frame)
         stats_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -436,6 +471,11 @@ Supported formats: JPG, PNG, SVG, GIF, WebP | Frame styles: None, Rounded, Circl
         self.export_log = scrolledtext.ScrolledText(log_frame, height=20, width=100, font=("Courier", 9))
         self.export_log.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
+        # Batched, line-capped log sink (settings from the "log" section of editor_config.json)
+        log_settings = load_log_settings(os.path.join(os.path.dirname(os.path.abspath(__file__)), self.config_file))
+        self.log_console = LogConsole(self.export_log, self.dispatcher, **log_settings)
+        self.dispatcher.on_error = self.log_message
+        
         # Initialize log
         self.log_message("Website Template Editor initialized")
         self.log_message("Ready to load template and start editing")
@@ -454,6 +494,8 @@ Supported formats: JPG, PNG, SVG, GIF, WebP | Frame styles: None, Rounded, Circl
         if not self.template_path:
             self.template_path = os.path.dirname(os.path.abspath(__file__))
             self.template_label.config(text=f"Template: {os.path.basename(self.template_path)}")
+        with self.render_lock:
+            self.last_render = None
         self.analyze_template()
     
     def analyze_template(self):
@@ -461,14 +503,20 @@ Supported formats: JPG, PNG, SVG, GIF, WebP | Frame styles: None, Rounded, Circl
         if not self.template_path:
             return
         
-        # Find and load current images
-        image_files = []
-        for root, dirs, files in os.walk(self.template_path):
-            for file in files:
-                if file.endswith(('.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp')):
-                    file_path = os.path.join(root, file)
-                    rel_path = os.path.relpath(file_path, self.template_path)
-                    image_files.append(rel_path)
+        self.tasks.submit("analyze", self.scan_template, self.template_path,
+                          on_done=self.show_template_analysis,
+                          on_error=lambda e: self.log_message(f"❌ Template analysis error: {e}"),
+                          description="Analyzing template")
+    
+    def scan_template(self, task, template_path):
+        """Refresh the template file index (worker thread)"""
+        return get_file_index(template_path)
+    
+    def show_template_analysis(self, file_index):
+        """Load image list from the file index"""
+        # Find and load current images (incremental, excludes backups/.git/exports)
+        self.file_index = file_index
+        image_files = self.file_index.paths("image")
         
         self.update_image_list(image_files)
         self.log_message(f"Found {len(image_files)} images in template")
@@ -577,24 +625,90 @@ Supported formats: JPG, PNG, SVG, GIF, WebP | Frame styles: None, Rounded, Circl
         )
         
         if file_paths and self.template_path:
+            # Copy to images directory in the background
             images_dir = os.path.join(self.template_path, 'images')
-            os.makedirs(images_dir, exist_ok=True)
-            
-            added_count = 0
-            for file_path in file_paths:
-                try:
-                    dest_path = os.path.join(images_dir, os.path.basename(file_path))
-                    shutil.copy2(file_path, dest_path)
-                    
-                    rel_path = f"images/{os.path.basename(file_path)}"
-                    self.image_listbox.insert(tk.END, rel_path)
-                    added_count += 1
-                except Exception as e:
-                    self.log_message(f"Error adding {file_path}: {e}")
-            
-            self.log_message(f"Added {added_count} images to gallery")
-            if added_count > 0:
-                messagebox.showinfo("Success", f"Added {added_count} images successfully!")
+            self.tasks.submit("add_images", self.copy_images, list(file_paths), images_dir,
+                              on_done=self.images_added,
+                              on_error=lambda e: self.log_message(f"❌ Error adding images: {e}"),
+                              on_cancel=self.images_cancelled,
+                              description="Adding images")
+    
+    def copy_images(self, task, file_paths, images_dir):
+        """Copy image files into the template (worker thread)"""
+        os.makedirs(images_dir, exist_ok=True)
+        added, errors = [], []
+        for i, file_path in enumerate(file_paths):
+            task.check_cancelled()
+            task.report(i, len(file_paths), os.path.basename(file_path))
+            try:
+                shutil.copy2(file_path, os.path.join(images_dir, os.path.basename(file_path)))
+                added.append(f"images/{os.path.basename(file_path)}")
+            except Exception as e:
+                errors.append(f"Error adding {file_path}: {e}")
+        task.report(len(file_paths), len(file_paths))
+        return added, errors
+    
+    def images_added(self, result):
+        """Add copied images to the gallery"""
+        added, errors = result
+        for error in errors:
+            self.log_message(error)
+        for rel_path in added:
+            self.image_listbox.insert(tk.END, rel_path)
+        
+        self.log_message(f"Added {len(added)} images to gallery")
+        if added:
+            messagebox.showinfo("Success", f"Added {len(added)} images successfully!")
+    
+    def images_cancelled(self):
+        """Refresh the gallery after a cancelled import"""
+        self.log_message("🛑 Image import cancelled")
+        self.analyze_template()
+    
+    def optimize_images(self):
+        """Recompress referenced images and write WebP siblings in the background"""
+        if not self.template_path:
+            messagebox.showerror("Error", "No template loaded")
+            return
+        
+        task = self.tasks.submit("optimize_images", self.run_image_optimization,
+                                 on_done=self.images_optimized,
+                                 on_error=lambda e: self.log_message(f"❌ Image optimization error: {e}"),
+                                 on_cancel=lambda: self.log_message("🛑 Image optimization cancelled"),
+                                 description="Optimizing images")
+        if task is None:
+            self.log_message("Image optimization is already running")
+    
+    def run_image_optimization(self, task):
+        """Optimize images in a process pool and drop their cached metadata (worker thread)"""
+        report = optimize_images(self.template_path, task=task)
+        image_cache = get_image_cache(self.template_path)
+        for entry in report["images"]:
+            image_cache.invalidate(entry["path"])
+        return report
+    
+    def images_optimized(self, report):
+        """Log the byte-savings report and refresh the gallery"""
+        for line in describe_report(report):
+            self.log_message(line)
+        self.analyze_template()
+    
+    def restore_original_images(self):
+        """Undo image optimization from the originals sidecar"""
+        if not self.template_path:
+            return
+        if not messagebox.askyesno("Restore Originals", "Put the original images back and remove WebP copies?"):
+            return
+        try:
+            restored = restore_originals(self.template_path)
+            image_cache = get_image_cache(self.template_path)
+            for rel_path in restored:
+                image_cache.invalidate(rel_path)
+            self.log_message(f"↩️ Restored {len(restored)} original images")
+            self.analyze_template()
+        except Exception as e:
+            self.log_message(f"Could not restore images: {e}")
+            messagebox.showerror("Error", f"Could not restore images: {e}")
     
     def remove_image(self):
         """Remove selected image"""
@@ -630,11 +744,17 @@ Supported formats: JPG, PNG, SVG, GIF, WebP | Frame styles: None, Rounded, Circl
         dialog.geometry("600x500")
         dialog.grab_set()
         
+        # Intrinsic size from the image header (no pixel decode)
+        image_cache = get_image_cache(self.template_path)
+        meta = image_cache.get_metadata(image_path)
+        image_cache.save_metadata()
+        intrinsic = meta if meta and meta.get("width") else None
+        
         # Current properties
         current_props = self.website_config["images"].get(image_path, {
             "alt": os.path.splitext(os.path.basename(image_path))[0],
-            "width": "auto",
-            "height": "auto",
+            "width": f"{intrinsic['width']}px" if intrinsic else "auto",
+            "height": f"{intrinsic['height']}px" if intrinsic else "auto",
             "frame": "none",
             "position": "center"
         })
@@ -644,7 +764,8 @@ Supported formats: JPG, PNG, SVG, GIF, WebP | Frame styles: None, Rounded, Circl
         main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
         
         # Image info
-        ttk.Label(main_frame, text=f"Configuring: {image_path}", font=("Arial", 12, "bold")).pack(pady=(0, 10))
+        ttk.Label(main_frame, text=f"Configuring: {image_path}", font=("Arial", 12, "bold")).pack(pady=(0, 5))
+        ttk.Label(main_frame, text=self.format_image_meta(meta), font=("Arial", 10)).pack(pady=(0, 10))
         
         # Properties frame
         props_frame = ttk.LabelFrame(main_frame, text="Image Properties")
@@ -742,9 +863,11 @@ img[src="{image_path}"] {{
     def show_image_properties(self, image_path):
         """Show image properties in the properties panel"""
         props = self.website_config["images"].get(image_path, {})
+        meta = get_image_cache(self.template_path).get_metadata(image_path)
         
         info_text = f"""
 📁 FILE: {image_path}
+📐 INTRINSIC: {self.format_image_meta(meta)}
 📏 SIZE: {props.get('width', 'auto')} x {props.get('height', 'auto')}
 🖼️ FRAME: {props.get('frame', 'none')}
 📍 POSITION: {props.get('position', 'center')}
@@ -768,38 +891,50 @@ img[src="{image_path}"] {{
         # Update preview label
         self.image_preview_label.config(text=f"Selected:\\n{os.path.basename(image_path)}")
     
+    def format_image_meta(self, meta):
+        """Format image metadata for display"""
+        if not meta:
+            return "Unavailable"
+        size = f"{meta['width']} x {meta['height']} px" if meta.get("width") else "Unknown size"
+        return f"{size} | {meta.get('format') or '?'} | {meta['bytes'] / 1024:.1f} KB"
+    
     def start_preview_server(self):
         """Start preview server"""
-        if self.server_thread and self.server_thread.is_alive():
+        if self.preview_server and self.preview_server.running:
             self.log_message("Preview server is already running")
             return
         
         self.generate_preview()
         
-        def run_server():
-            try:
-                os.chdir(self.template_path)
-                handler = http.server.SimpleHTTPRequestHandler
-                with socketserver.TCPServer(("", self.preview_port), handler) as httpd:
-                    self.log_message(f"🚀 Preview server started at http://localhost:{self.preview_port}")
-                    self.preview_status.config(text=f"✅ Server running on port {self.preview_port}", foreground="green")
-                    httpd.serve_forever()
-            except Exception as e:
-                self.log_message(f"❌ Server error: {e}")
-                self.preview_status.config(text="❌ Server error", foreground="red")
-        
-        self.server_thread = threading.Thread(target=run_server, daemon=True)
-        self.server_thread.start()
+        try:
+            # Threaded server bound to the template folder; falls back to a free port
+            self.preview_server = PreviewServer(self.template_path, self.preview_port)
+            url = self.preview_server.start()
+            self.log_message(f"🚀 Preview server started at {url}")
+            self.preview_status.config(text=f"✅ Server running on port {self.preview_server.port}", foreground="green")
+        except Exception as e:
+            self.preview_server = None
+            self.log_message(f"❌ Server error: {e}")
+            self.preview_status.config(text="❌ Server error", foreground="red")
     
     def stop_preview_server(self):
         """Stop preview server"""
+        if self.preview_server:
+            self.preview_server.stop()
+            self.preview_server = None
         self.preview_status.config(text="🛑 Preview server stopped", foreground="red")
         self.log_message("🛑 Preview server stopped")
     
+    def preview_url(self):
+        """URL of the running preview server (or the configured port)"""
+        if self.preview_server and self.preview_server.running:
+            return self.preview_server.url
+        return f"http://localhost:{self.preview_port}"
+    
     def open_preview(self):
         """Open preview in browser"""
         try:
-            webbrowser.open(f"http://localhost:{self.preview_port}")
+            webbrowser.open(self.preview_url())
             self.log_message("🌐 Opened preview in browser")
         except Exception as e:
             self.log_message(f"Error opening browser: {e}")
@@ -812,29 +947,55 @@ img[src="{image_path}"] {{
         
         try:
             self.update_config_from_ui()
-            self.apply_config_to_files()
-            self.log_message("✅ Preview generated successfully")
-            
-            # Update stats
-            stats = self.get_website_stats()
-            self.stats_label.config(text=stats)
-            
         except Exception as e:
-            self.log_message(f"❌ Error generating preview: {e}")
-            messagebox.showerror("Error", f"Could not generate preview: {e}")
+            self.preview_failed(e)
+            return
+        
+        config, custom_css = self.snapshot_config()
+        self.tasks.submit("preview", self.render_preview, config, custom_css,
+                          on_done=self.preview_finished,
+                          on_error=self.preview_failed,
+                          description="Generating preview")
+    
+    def render_preview(self, task, config, custom_css):
+        """Write configuration to the template files and collect stats (worker thread)"""
+        changed = self.apply_config_to_files(config, custom_css, incremental=True)
+        return changed, self.get_website_stats()
+    
+    def preview_finished(self, result):
+        """Report a generated preview"""
+        changed, stats = result
+        self.log_message(f"✅ Preview generated successfully ({len(changed)} files updated)")
+        
+        # Update stats
+        self.stats_label.config(text=stats)
+    
+    def preview_failed(self, error):
+        """Report a preview generation error"""
+        self.log_message(f"❌ Error generating preview: {error}")
+        messagebox.showerror("Error", f"Could not generate preview: {error}")
+    
+    def snapshot_config(self):
+        """Copy configuration and custom CSS for use off the Tk thread"""
+        return json.loads(json.dumps(self.website_config)), self.custom_css.get(1.0, tk.END)
     
     def get_website_stats(self):
-        """Get website statistics"""
+        """Page weight of the start page and budget status (cached by content hash)"""
         try:
-            html_file = os.path.join(self.template_path, "index.html")
-            if os.path.exists(html_file):
-                with open(html_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                image_count = len([f for f in os.listdir(os.path.join(self.template_path, 'images')) 
-                                 if f.endswith(('.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp'))])
-                
-                return f"📄 HTML: {len(content)} chars | 🖼️ Images: {image_count} | 🎨 Colors: {len(self.color_vars)}"
+            stats = self.site_builder(self.website_config, "").stats()
+            if stats["pages"]:
+                page = "index.html" if "index.html" in stats["pages"] else next(iter(stats["pages"]))
+                report = stats["pages"][page]
+                images = report["types"].get("image", {})
+                text = (f"📄 {page}: {report['gzip'] / 1024:.0f} KB ({report['requests']} requests, "
+                        f"{len(report['render_blocking'])} render-blocking) | 🖼️ Images: "
+                        f"{images.get('requests', 0)} ({images.get('bytes', 0) / 1024:.0f} KB")
+                if report["oversized_bytes"]:
+                    text += f", {report['oversized_bytes'] / 1024:.0f} KB oversized"
+                text += f") | 🎨 Colors: {len(self.color_vars)}"
+                if stats["violations"]:
+                    text += f" | ⚠️ {len(stats['violations'])} over budget"
+                return text
         except:
             pass
         return "Stats unavailable"
@@ -857,119 +1018,29 @@ img[src="{image_path}"] {{
         self.website_config["logo"]["width"] = self.logo_width_var.get()
         self.website_config["logo"]["height"] = self.logo_height_var.get()
     
-    def apply_config_to_files(self):
-        """Apply configuration to template files"""
-        # Update HTML file
-        html_file = os.path.join(self.template_path, "index.html")
-        if os.path.exists(html_file):
-            with open(html_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Update meta information
-            content = re.sub(r'<title>.*?</title>', 
-                           f'<title>{self.website_config["meta"]["title"]}</title>', content)
-            content = re.sub(r'<meta name="description" content=".*?"', 
-                           f'<meta name="description" content="{self.website_config["meta"]["description"]}"', content)
-            
-            # Update logo source
-            content = re.sub(r'<img src="[^"]*" alt="[^"]*" class="logo-icon">', 
-                           f'<img src="{self.website_config["logo"]["src"]}" alt="{self.website_config["logo"].get("alt", "Logo")}" class="logo-icon">', content)
-            
-            # Update brand name
-            content = re.sub(r'<span class="logo-text">.*?</span>', 
-                           f'<span class="logo-text">{self.website_config["navigation"]["title"]}</span>', content)
-            
-            with open(html_file, 'w', encoding='utf-8') as f:
-                f.write(content)
-        
-        # Update CSS file with custom styles
-        self.update_css_file()
+    def site_builder(self, config, custom_css):
+        """Headless build engine for the loaded template"""
+        return SiteBuilder(self.template_path, config, custom_css, style="custom", lock=self.render_lock)
     
-    def update_css_file(self):
-        """Update CSS file with custom styles"""
-        css_file = os.path.join(self.template_path, "custom_editor_styles.css")
-        
-        css_content = f"""
-/* Generated by Website Template Editor */
-/* Last updated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} */
-
-:root {{
-    --primary-color: {self.website_config["colors"]["primary"]} !important;
-    --secondary-color: {self.website_config["colors"]["secondary"]} !important;
-    --accent-color: {self.website_config["colors"]["accent"]} !important;
-    --background-color: {self.website_config["colors"]["background"]} !important;
-    --text-color: {self.website_config["colors"]["text"]} !important;
-}}
-
-/* Logo customization */
-.logo-icon,
-.nav .logo-icon,
-.nav-container .logo-icon,
-.nav-logo .logo-icon {{
-    width: {self.website_config["logo"]["width"]} !important;
-    height: {self.website_config["logo"]["height"]} !important;
-}}
-
-/* Image customizations */
-"""
-        
-        # Add image-specific CSS
-        for image_path, props in self.website_config["images"].items():
-            css_content += f"""
-/* Styles for {image_path} */
-img[src="{image_path}"] {{
-    width: {props.get('width', 'auto')} !important;
-    height: {props.get('height', 'auto')} !important;
-"""
-            
-            # Add frame styles
-            frame_style = props.get('frame', 'none')
-            if frame_style == 'rounded':
-                css_content += "    border-radius: 12px !important;\\n"
-            elif frame_style == 'circle':
-                css_content += "    border-radius: 50% !important;\\n"
-            elif frame_style == 'shadow':
-                css_content += "    box-shadow: 0 8px 25px rgba(0, 0, 0, 0.15) !important;\\n"
-            elif frame_style == 'border':
-                css_content += "    border: 2px solid var(--primary-color) !important;\\n"
+    def apply_config_to_files(self, config=None, custom_css=None, incremental=False):
+        """Apply configuration to template files in one transaction; returns changed files"""
+        if config is None:
+            config, custom_css = self.website_config, self.custom_css.get(1.0, tk.END)
+        
+        builder = self.site_builder(config, custom_css)
+        with self.render_lock:
+            # Only outputs consuming a changed configuration key are rendered again
+            outputs = None
+            # Files edited on disk since the last render are rendered again in full
+            if (incremental and self.last_render is not None and
+                    self.last_render[2] == builder.rendered_state()):
+                outputs = builder.changed_outputs(*self.last_render[:2])
             
-            # Add position styles
-            position = props.get('position', 'center')
-            if position == 'left':
-                css_content += "    margin-right: auto !important;\\n"
-            elif position == 'right':
-                css_content += "    margin-left: auto !important;\\n"
-            elif position == 'center':
-                css_content += "    margin: 0 auto !important;\\n"
-            elif position == 'float-left':
-                css_content += "    float: left !important; margin-right: 1rem !important;\\n"
-            elif position == 'float-right':
-                css_content += "    float: right !important; margin-left: 1rem !important;\\n"
-            
-            css_content += "}\\n\\n"
-        
-        # Add custom CSS from editor
-        css_content += f"""
-/* Custom CSS from editor */
-{self.custom_css.get(1.0, tk.END)}
-"""
-        
-        with open(css_file, 'w', encoding='utf-8') as f:
-            f.write(css_content)
-        
-        # Add link to HTML if not present
-        html_file = os.path.join(self.template_path, "index.html")
-        if os.path.exists(html_file):
-            with open(html_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            if 'custom_editor_styles.css' not in content:
-                # Add custom CSS link before closing head tag
-                content = content.replace('</head>', 
-                                        '    <link rel="stylesheet" href="custom_editor_styles.css">\\n</head>')
-                
-                with open(html_file, 'w', encoding='utf-8') as f:
-                    f.write(content)
+            # index.html and the generated stylesheet are read once, edited in memory
+            # and only written when their content actually changed
+            changed = builder.build(outputs) if outputs is None or outputs else []
+            self.last_render = (config, custom_css, builder.rendered_state())
+        return changed
     
     def export_website(self):
         """Export website with version control"""
@@ -978,81 +1049,67 @@ img[src="{image_path}"] {{
             return
         
         try:
-            # Generate preview first
-            self.generate_preview()
-            
-            # Create export directory
-            version = self.version_var.get()
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            export_name = f"{version}_{timestamp}"
-            
-            export_dir = os.path.join(os.path.dirname(self.template_path), export_name)
-            
-            # Copy template to export directory
-            shutil.copytree(self.template_path, export_dir)
-            
-            # Save configuration
-            config_file = os.path.join(export_dir, "website_config.json")
-            with open(config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.website_config, f, indent=2)
-            
-            # Create export info file
-            info_file = os.path.join(export_dir, "EXPORT_INFO.txt")
-            with open(info_file, 'w', encoding='utf-8') as f:
-                f.write(f"""
-Website Export Information
-=========================
-
-Export Version: {version}
-Export Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-Original Template: {self.template_path}
-
-Configuration Summary:
-- Title: {self.website_config["meta"]["title"]}
-- Description: {self.website_config["meta"]["description"]}
-- Brand: {self.website_config["navigation"]["title"]}
-- Primary Color: {self.website_config["colors"]["primary"]}
-- Logo: {self.website_config["logo"]["src"]}
-
-Files Included:
-- index.html (main website file)
-- All original template files
-- custom_editor_styles.css (your customizations)
-- website_config.json (complete configuration backup)
-- EXPORT_INFO.txt (this file)
-
-To use this website:
-1. Upload all files to your web server
-2. Point your domain to index.html
-3. Ensure all file permissions are correct
-
-Generated by Website Template Editor v1.0
-""")
-            
-            self.log_message(f"📦 Website exported to: {export_dir}")
-            self.log_message(f"🏷️ Version: {version}")
-            self.log_message(f"⏰ Timestamp: {timestamp}")
-            
-            # Update version for next export
-            try:
-                version_num = float(version.replace('v', ''))
-                next_version = f"v{version_num + 0.1:.1f}"
-                self.version_var.set(next_version)
-            except:
-                pass
-            
-            # Show success dialog with options
-            result = messagebox.askyesno("Export Complete", 
-                                       f"Website exported successfully to:\\n{export_dir}\\n\\nWould you like to open the export folder?")
-            
-            if result:
-                # Open export folder in file manager
-                import subprocess
-                subprocess.call(["open", export_dir])  # macOS
-            
+            self.update_config_from_ui()
         except Exception as e:
-            self.log_message(f"❌ Export error: {e}")
-            messagebox.showerror("Export Error", f"Could not export website: {e}")
+            self.export_failed(e)
+            return
+        
+        config, custom_css = self.snapshot_config()
+        version = self.version_var.get()
+        profile = self.profile_var.get()
+        export_format = self.export_format_var.get()
+        task = self.tasks.submit("export", self.build_export, config, custom_css, version, profile, export_format,
+                                 on_done=self.export_finished,
+                                 on_error=self.export_failed,
+                                 on_cancel=lambda: self.log_message("🛑 Export cancelled"),
+                                 description="Exporting website")
+        if task is None:
+            self.log_message("An export is already running")
+    
+    def build_export(self, task, config, custom_css, version, profile=DEFAULT_PROFILE, export_format="folder"):
+        """Generate files and export deployable files to a versioned folder or archive (worker thread)"""
+        builder = self.site_builder(config, custom_css)
+        export_dir, timestamp, summary = builder.export(version, profile, export_format,
+                                                        include_info=True, task=task)
+        # last_render is shared with the incremental apply, which may run on another worker
+        with self.render_lock:
+            self.last_render = (config, custom_css, builder.rendered_state())
+        return export_dir, version, timestamp, summary
+    
+    def export_finished(self, result):
+        """Report a completed export"""
+        export_dir, version, timestamp, summary = result
+        self.log_message("✅ Preview generated successfully")
+        self.log_message(f"📦 Website exported to: {export_dir}")
+        self.log_message(f"🏷️ Version: {version}")
+        self.log_message(f"⏰ Timestamp: {timestamp}")
+        self.log_message(f"📊 {describe_export(summary)}")
+        for line in describe_stages(summary.get("stages", {})):
+            self.log_message(f"📊 {line}")
+        
+        # Update version for next export
+        try:
+            version_num = float(version.replace('v', ''))
+            next_version = f"v{version_num + 0.1:.1f}"
+            self.version_var.set(next_version)
+        except:
+            pass
+        
+        # Show success dialog with options
+        result = messagebox.askyesno("Export Complete", 
+                                   f"Website exported successfully to:\\n{export_dir}\\n\\nWould you like to open the export folder?")
+        
+        if result:
+            # Open export folder in file manager
+            try:
+                open_in_file_manager(export_dir)
+            except Exception as e:
+                self.log_message(f"Could not open export folder: {e}")
+    
+    def export_failed(self, error):
+        """Report an export error"""
+        self.log_message(f"❌ Export error: {error}")
+        messagebox.showerror("Export Error", f"Could not export website: {error}")
     
     def save_config(self):
         """Save configuration to file"""
@@ -1082,7 +1139,8 @@ Generated by Website Template Editor v1.0
         if file_path:
             try:
                 with open(file_path, 'r', encoding='utf-8') as f:
-                    self.website_config = json.load(f)
+                    # Configs saved by older versions lack newer sections such as "build"
+                    self.website_config = merge_config(default_config(), json.load(f))
                 
                 self.update_ui_from_config()
                 self.log_message(f"📁 Configuration loaded from: {file_path}")
@@ -1111,12 +1169,17 @@ Generated by Website Template Editor v1.0
         self.logo_height_var.set(self.website_config["logo"]["height"])
     
     def log_message(self, message):
-        """Add message to export log"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        log_entry = f"[{timestamp}] {message}\\n"
-        self.export_log.insert(tk.END, log_entry)
-        self.export_log.see(tk.END)
-        self.root.update()
+        """Add message to export log (thread-safe, flushed in batches)"""
+        self.log_console.write(message)
+    
+    def on_close(self):
+        """Cancel background work, stop the preview server and close the window"""
+        if self.preview_server:
+            self.preview_server.stop()
+        self.tasks.shutdown()
+        self.log_console.close()
+        self.dispatcher.stop()
+        self.root.destroy()
     
     def run(self):
         """Start the application"""